@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Anzahl der letzten Wartezeiten, aus denen Perzentile berechnet werden
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """Anfrage abgewiesen (Warteschlange voll oder Wartezeit abgelaufen); retry_after in Sekunden"""
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Extraktion abgewiesen ({reason}), erneut versuchen in {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Zulassung zur Extraktion: begrenzte Parallelität und begrenzte Warteschlange mit Zeitlimit
+
+    Höchstens max_concurrent Extraktionen laufen gleichzeitig, bis zu max_queue weitere
+    warten in Ankunftsreihenfolge höchstens queue_timeout Sekunden. Ist die Warteschlange
+    voll, wird sofort abgewiesen, statt die Maschine mit weiteren tabula-Läufen zu überlasten.
+    """
+    def __init__(self, max_concurrent=2, max_queue=8, queue_timeout=30):
+        self.max_concurrent = max(int(max_concurrent), 1)
+        self.max_queue = max(int(max_queue), 0)
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self._changed = threading.Condition(self.lock)
+        self._waiting = deque()
+        self._active = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.counters = {
+            'admitted': 0,
+            'completed': 0,
+            'rejected_full': 0,
+            'rejected_timeout': 0,
+            'max_queue_depth': 0,
+            'wait_ms_total': 0.0,
+            'max_wait_ms': 0.0,
+            'service_ms_total': 0.0,
+        }
+
+    def _retry_after(self):
+        """Geschätzte Sekunden, bis wieder ein Platz frei ist (mittlere Laufzeit × Wartende je Slot)"""
+        completed = self.counters['completed']
+        service = self.counters['service_ms_total'] / completed / 1000 if completed else self.queue_timeout
+        estimate = service * (len(self._waiting) + 1) / self.max_concurrent
+        return max(1, math.ceil(min(estimate, self.queue_timeout)))
+
+    def _record_wait(self, waited_ms):
+        self._waits.append(waited_ms)
+        self.counters['admitted'] += 1
+        self.counters['wait_ms_total'] += waited_ms
+        self.counters['max_wait_ms'] = max(self.counters['max_wait_ms'], waited_ms)
+
+    def acquire(self):
+        """Wartet auf einen freien Platz; löst AdmissionRejected aus, wenn keiner frei wird"""
+        started = time.perf_counter()
+        with self.lock:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                self._record_wait(0.0)
+                return
+            if len(self._waiting) >= self.max_queue:
+                self.counters['rejected_full'] += 1
+                raise AdmissionRejected('Warteschlange voll', self._retry_after())
+            ticket = object()
+            self._waiting.append(ticket)
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], len(self._waiting))
+            # Reihenfolge der Ankunft einhalten, damit einzelne Anfragen nicht beliebig lange warten
+            admitted = self._changed.wait_for(
+                lambda: self._waiting[0] is ticket and self._active < self.max_concurrent, self.queue_timeout
+            )
+            self._waiting.remove(ticket)
+            if not admitted:
+                self.counters['rejected_timeout'] += 1
+                self._changed.notify_all()
+                raise AdmissionRejected('Wartezeit abgelaufen', self._retry_after())
+            self._active += 1
+            self._record_wait((time.perf_counter() - started) * 1000)
+            self._changed.notify_all()
+
+    def release(self, service_ms=0.0):
+        with self.lock:
+            self._active -= 1
+            self.counters['completed'] += 1
+            self.counters['service_ms_total'] += service_ms
+            self._changed.notify_all()
+
+    def acquire_patiently(self):
+        """Für Hintergrundaufträge: nach einer Abweisung Retry-After abwarten und erneut anstellen"""
+        while True:
+            try:
+                return self.acquire()
+            except AdmissionRejected as e:
+                time.sleep(e.retry_after)
+
+    @contextmanager
+    def admit(self, patient=False):
+        """Hält für die Dauer des Blocks einen Extraktionsplatz (patient: warten statt abweisen)"""
+        if patient:
+            self.acquire_patiently()
+        else:
+            self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release((time.perf_counter() - started) * 1000)
+
+    def stats(self):
+        """Warteschlangenlänge, Abweisungen und Wartezeiten (Mittel, p50/p99 der letzten Anfragen)"""
+        with self.lock:
+            stats = dict(self.counters)
+            waits = sorted(self._waits)
+            stats.update({'active': self._active, 'queue_depth': len(self._waiting)})
+        admitted = stats['admitted']
+        completed = stats['completed']
+        stats.update({
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'queue_timeout_s': self.queue_timeout,
+            'rejected': stats['rejected_full'] + stats['rejected_timeout'],
+            'avg_wait_ms': round(stats['wait_ms_total'] / admitted, 1) if admitted else 0.0,
+            'p50_wait_ms': round(waits[len(waits) // 2], 1) if waits else 0.0,
+            'p99_wait_ms': round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 1) if waits else 0.0,
+            'avg_service_ms': round(stats['service_ms_total'] / completed, 1) if completed else 0.0,
+        })
+        for name in ('wait_ms_total', 'max_wait_ms', 'service_ms_total'):
+            stats[name] = round(stats[name], 1)
+        return stats
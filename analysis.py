@@ -0,0 +1,130 @@
+import json
+import hashlib
+import threading
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from extensions import db
+from models import AnalysisResult
+from utils import DocumentLRUCache
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 einer Datei (blockweise gelesen)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentNotFound(FileNotFoundError):
+    """Weder die PDF noch ihre gespeicherte Extraktion ist vorhanden"""
+
+
+class AnalysisStore:
+    """Speichert Analyse-Ergebnisse je (PDF-Hash, Code-Version) in der DB und berechnet jedes nur einmal
+
+    Parallele Anfragen für denselben Schlüssel warten auf die laufende Berechnung,
+    statt sie zu wiederholen (z.B. Klick auf "KI-Analyse" während der Hintergrund-Analyse).
+    """
+    def __init__(self, app, logger=None, max_entries=64, writer=None):
+        self.app = app
+        # Optionale WriteBehindQueue: Ergebnisse werden dann gebündelt im Hintergrund gespeichert
+        self.writer = writer
+        self.logger = logger
+        self.memo = DocumentLRUCache(max_entries)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self._table_ready = False
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def _ensure_table(self):
+        # init_db() läuft nur beim direkten Start von app.py
+        with self.lock:
+            if not self._table_ready:
+                AnalysisResult.__table__.create(db.engine, checkfirst=True)
+                self._table_ready = True
+
+    def _load(self, key):
+        try:
+            self._ensure_table()
+            stored = AnalysisResult.query.filter_by(document_hash=key[0], codes_version=key[1]).first()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            self._log('warning', f"Analyse-Ergebnis konnte nicht gelesen werden: {e}")
+            return None
+        return json.loads(stored.result) if stored else None
+
+    def _save(self, key, pdf_file, result):
+        if self.writer is not None:
+            self.writer.enqueue_analysis(key, pdf_file, result)
+            return
+        try:
+            db.session.add(AnalysisResult(
+                document_hash=key[0], codes_version=key[1], pdf_file=pdf_file, result=json.dumps(result)
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Ein anderer Prozess hat dasselbe Ergebnis bereits gespeichert
+            db.session.rollback()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            self._log('warning', f"Analyse-Ergebnis konnte nicht gespeichert werden: {e}")
+
+    def get(self, key):
+        """Gespeichertes Ergebnis oder None (App-Kontext nötig)"""
+        result = self.memo.get(key)
+        if result is None:
+            result = self._load(key)
+            if result is not None:
+                self.memo.put(key, result)
+        return result
+
+    def get_or_compute(self, key, pdf_file, compute):
+        """Liefert das Ergebnis für key; compute() wird höchstens einmal gleichzeitig ausgeführt"""
+        while True:
+            result = self.get(key)
+            if result is not None:
+                return result
+            with self.lock:
+                running = self.pending.get(key)
+                if running is None:
+                    running = self.pending[key] = threading.Event()
+                    break
+            # Läuft bereits: abwarten und danach erneut nachsehen
+            running.wait()
+
+        try:
+            result = compute()
+            self._save(key, pdf_file, result)
+            self.memo.put(key, result)
+            return result
+        finally:
+            with self.lock:
+                self.pending.pop(key).set()
+
+    def schedule(self, pdf_file, key_func, compute, wait_for=None, wait_timeout=60):
+        """Berechnet das Ergebnis im Hintergrund; key_func() läuft bereits im App-Kontext des Threads
+
+        wait_for (z.B. WriteBehindQueue.barrier()) verzögert Schlüssel und Berechnung, bis die
+        Codes und Tabellen des Dokuments geschrieben sind; sonst entstünde das Ergebnis gegen
+        einen veralteten Stand und läge unter einem Schlüssel, den niemand mehr abfragt.
+        """
+        def run():
+            if wait_for is not None and not wait_for.wait(wait_timeout):
+                self._log('warning', f"Hintergrund-Analyse für {pdf_file} übersprungen: Schreibvorgänge nicht abgeschlossen")
+                return
+            with self.app.app_context():
+                try:
+                    self.get_or_compute(key_func(), pdf_file, compute)
+                    self._log('info', f"Analyse für {pdf_file} vorberechnet")
+                except Exception as e:
+                    self._log('error', f"Hintergrund-Analyse für {pdf_file} fehlgeschlagen: {e}")
+
+        thread = threading.Thread(target=run, name=f"analysis-{pdf_file}", daemon=True)
+        thread.start()
+        return thread
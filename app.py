@@ -10,8 +10,14 @@ import numpy as np
 import logging
 from werkzeug.utils import secure_filename
 import traceback
+import io
+import json
+import time
+import hashlib
+import atexit
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import lru_cache
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, render_template, request, send_file, jsonify, Response, stream_with_context, url_for, g
 import tabula
 import pdfplumber
 from flask_sqlalchemy import SQLAlchemy
@@ -20,8 +26,31 @@ from models import AuflagenCode
 from utils import (
     TemporaryStorage, check_and_install_packages, AUFLAGEN_CODES, AUFLAGEN_TEXTE,
     convert_table_to_html, extract_vehicle_info, extract_wheel_tire_info,
-    save_to_database, find_condition_codes, analyze_freedom, is_valid_table
+    save_to_database, find_condition_codes, analyze_freedom, is_valid_table,
+    build_search_pattern, highlight_matches, paginate_matches, load_document_tables,
+    list_document_ids, list_table_files, DocumentLRUCache
+)
+from fuzzy_index import FuzzyIndexRegistry
+from typed_index import TypedLookupIndex
+from code_matcher import get_code_matcher, get_codes_version
+from code_store import fetch_codes, code_cache, upsert_codes
+from code_catalog import (
+    iter_csv_rows, iter_json_rows, validate_code, import_codes, export_csv, export_json, query_codes
 )
+from write_behind import WriteBehindQueue, configure_sqlite
+from runtime_probe import RuntimeProbe
+from tabula_runtime import TabulaRuntime
+from extraction_sandbox import ExtractionSandbox
+from deadline import Deadline
+from admission import AdmissionController, AdmissionRejected
+from upload_stream import CHUNK_SIZE, UploadWriter, UploadTooLarge, UploadJobs
+from analysis import AnalysisStore, DocumentNotFound, file_sha256
+from rules_engine import get_rule_set
+from row_analysis import analyze_rows
+from column_roles import ALL_ROLES, columns_with_role, classifier_cache_info
+from wheel_specs import SPEC_DTYPE, build_spec_array, filter_specs, specs_to_records
+from document_store import table_payload, get_document, load_tables, load_specs, table_names, document_codes, list_documents
+from fitment_index import FitmentIndex, parse_rim_query, parse_bolt_query, parse_range_query
 # Importiere die PDF-Extraktionsfunktionen
 from pdf_extractor import (
     process_pdf_with_encoding, process_pdf_without_java,
@@ -46,6 +75,28 @@ app.config.update({
     'TEMPLATES_AUTO_RELOAD': True,
     'SQLALCHEMY_DATABASE_URI': 'sqlite:///auflagen.db',
     'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SEARCH_PAGE_SIZE': 50,  # Treffer pro Seite in /search
+    'SEARCH_MAX_PAGE_SIZE': 500,  # Obergrenze für vom Client angeforderte Seitengröße
+    'FUZZY_SEARCH_THRESHOLD': 0.3,  # Mindest-Ähnlichkeit (Jaccard über Trigramme) für unscharfe Suche
+    'SEARCH_CACHE_SIZE': 256,  # Anzahl gecachter Suchergebnis-Seiten (LRU)
+    'BATCH_ANALYSIS_WORKERS': 4,  # Parallele Extraktionen/Analysen in /api/analyze_batch
+    'UPLOAD_JOB_WORKERS': 2,  # Extraktionsaufträge gestreamter Uploads (/upload/stream)
+    'BATCH_ANALYSIS_MAX_DOCUMENTS': 100,  # Obergrenze Dokumente pro Batch-Anfrage
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,  # Wartezeit bei gesperrter SQLite-Datenbank (andere Worker)
+    'WRITE_BEHIND_INTERVAL': 0.5,  # Sekunden, die der Schreiber Aufträge zu einer Transaktion sammelt
+    'WRITE_BEHIND_MAX_BATCH': 500,  # Höchstzahl Aufträge pro Transaktion
+    'TABULA_MAX_CONCURRENCY': 1,  # Gleichzeitige tabula-Aufrufe in der Prozess-JVM (1 = nacheinander)
+    'EXTRACTION_SANDBOX': True,  # Extraktion in überwachten Kindprozessen statt im Web-Prozess
+    'EXTRACTION_WORKERS': 2,  # Anzahl Extraktions-Kindprozesse
+    'EXTRACTION_TIMEOUT': 120,  # Sekunden bis ein hängender Extraktionsprozess beendet wird
+    'EXTRACTION_MEMORY_LIMIT_MB': 2048,  # RSS-Grenze je Extraktionsprozess
+    'EXTRACTION_RETRIES': 1,  # Wiederholungen nach Abbruch (ohne Java)
+    'EXTRACTION_MAX_CONCURRENT': 2,  # Gleichzeitig zugelassene Extraktionsanfragen
+    'EXTRACTION_QUEUE_SIZE': 8,  # Wartende Anfragen, darüber wird sofort mit 429 abgewiesen
+    'EXTRACTION_QUEUE_TIMEOUT': 30,  # Sekunden Wartezeit in der Warteschlange bis zur Abweisung
+    'EXTRACTION_BUDGET': 60,  # Standard-Zeitbudget (Sekunden) der Fallback-Kette, None = unbegrenzt
+    'JAVA_PROBE_INTERVAL': 300,  # Sekunden zwischen den Java-Prüfungen im Hintergrund
+    'WARMUP_PDF': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'warmup.pdf'),
 })
 app.jinja_env.auto_reload = True
 
@@ -54,23 +105,31 @@ logger.info(f"Temporäres Verzeichnis erstellt: {app.config['UPLOAD_FOLDER']}")
 
 # Initialize the db with the Flask app
 db.init_app(app)
+with app.app_context():
+    configure_sqlite(db.engine, app.config['SQLITE_BUSY_TIMEOUT_MS'])
+    # Tabellen vor dem ersten Schreibzugriff anlegen, auch ohne init_db() (z.B. Start über asgi.py);
+    # CREATE TABLE über eine zweite Verbindung scheitert sonst an der Schreibsperre des Write-Behind-Schreibers
+    db.create_all()
 
 # Ensure the upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # Initialize managers
 temp_storage = TemporaryStorage(app.config['UPLOAD_FOLDER'])
+fuzzy_indexes = FuzzyIndexRegistry()
+search_cache = DocumentLRUCache(app.config['SEARCH_CACHE_SIZE'])
+typed_lookup = TypedLookupIndex()
+fitment_index = FitmentIndex()
+write_queue = WriteBehindQueue(
+    app, logger, interval=app.config['WRITE_BEHIND_INTERVAL'], max_batch=app.config['WRITE_BEHIND_MAX_BATCH']
+)
+atexit.register(write_queue.stop)
+analysis_store = AnalysisStore(app, logger, writer=write_queue)
 
 # Utility Functions
 def check_java():
-    """Überprüft die Java-Installation und gibt den Status zurück"""
-    try:
-        subprocess.check_output(['java', '-version'], stderr=subprocess.STDOUT)
-        logger.info("Java ist installiert und funktioniert")
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        logger.error("Java ist nicht installiert oder der 'java' Befehl ist nicht im PATH.")
-        return False
+    """Java-Status aus der Laufzeit-Probe (wird im Hintergrund aktualisiert, kein Prozessstart pro Anfrage)"""
+    return runtime_probe.java_available
 
 def install_java():
     """Versucht, Java automatisch zu installieren"""
@@ -108,20 +167,20 @@ def install_java():
         logger.error(f"Fehler bei der Java-Installation: {str(e)}")
         return False
 
+# Eine JVM pro Prozess, tabula-java läuft darin (statt als "java"-Unterprozess). Bedient nur den Pfad mit
+# EXTRACTION_SANDBOX=False; in der Sandbox hat jeder Kindprozess seine eigene TabulaRuntime
+tabula_runtime = TabulaRuntime(logger, max_concurrency=app.config['TABULA_MAX_CONCURRENCY'])
+
 # JVM Manager Klasse definieren
 class JVMManager:
     def __init__(self):
         self.jvm_started = False
         
     def initialize(self):
-        if not jpype.isJVMStarted():
-            try:
-                jvm_path = jpype.getDefaultJVMPath()
-                jpype.startJVM(jvm_path, convertStrings=False)
-                self.jvm_started = True
-                logger.info("JVM erfolgreich initialisiert")
-            except Exception as e:
-                logger.error(f"Fehler beim Initialisieren der JVM: {str(e)}")
+        # Start und Backend-Installation laufen unter der Sperre der Laufzeit (genau einmal, auch bei parallelen Anfragen)
+        if not tabula_runtime.start():
+            logger.error(f"Fehler beim Initialisieren der JVM: {tabula_runtime.error}")
+        self.jvm_started = jpype.isJVMStarted()
                 
     def shutdown(self):
         if jpype.isJVMStarted():
@@ -135,6 +194,74 @@ class JVMManager:
 # JVM Manager instanziieren
 jvm_manager = JVMManager()
 
+# Überwachte Kindprozesse für die Extraktion (Zeit- und Speicherlimit, Abbruch und Wiederholung)
+extraction_sandbox = ExtractionSandbox(
+    logger,
+    workers=app.config['EXTRACTION_WORKERS'],
+    timeout=app.config['EXTRACTION_TIMEOUT'],
+    memory_limit_mb=app.config['EXTRACTION_MEMORY_LIMIT_MB'],
+    retries=app.config['EXTRACTION_RETRIES'],
+)
+atexit.register(extraction_sandbox.stop)
+
+# Zulassung zur Extraktion: bei Lastspitzen warten oder sofort abweisen statt alle parallel zu starten
+extraction_admission = AdmissionController(
+    max_concurrent=app.config['EXTRACTION_MAX_CONCURRENT'],
+    max_queue=app.config['EXTRACTION_QUEUE_SIZE'],
+    queue_timeout=app.config['EXTRACTION_QUEUE_TIMEOUT'],
+)
+
+def acquire_extraction_slot():
+    """Extraktionsplatz für den Rest der Anfrage belegen, erst nach dem Upload; wirft AdmissionRejected
+
+    Freigegeben wird in release_extraction_slot() am Ende der Anfrage.
+    """
+    extraction_admission.acquire()
+    g.extraction_slot_started = time.perf_counter()
+
+@app.teardown_request
+def release_extraction_slot(exception=None):
+    started = g.pop('extraction_slot_started', None)
+    if started is not None:
+        extraction_admission.release((time.perf_counter() - started) * 1000)
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    """Warteschlange voll oder Wartezeit abgelaufen: 429 mit Retry-After"""
+    logger.warning(f"{request.path}: {e}")
+    return (f"Server ausgelastet, bitte in {e.retry_after} Sekunden erneut versuchen.", 429,
+            {'Retry-After': str(e.retry_after)})
+
+def extract_pdf_tables(pdf_path, output_format='csv', deadline=None):
+    """Extrahiert die Tabellen einer PDF, standardmäßig in der Sandbox statt im Web-Prozess"""
+    deadline = deadline or Deadline(app.config['EXTRACTION_BUDGET'])
+    try:
+        if not app.config['EXTRACTION_SANDBOX']:
+            return process_pdf_with_encoding(pdf_path, output_format, logger, check_java, jvm_manager, deadline)
+        if not check_java():
+            logger.warning("Java nicht gefunden. Verwende Fallback-Methode.")
+        return extraction_sandbox.extract(pdf_path, output_format, use_java=check_java(), deadline=deadline)
+    finally:
+        logger.info(f"Extraktionsstufen {os.path.basename(pdf_path)}: {deadline.summary() or '-'}"
+                    f"{' (Teilergebnis)' if deadline.partial else ''}")
+
+def request_deadline():
+    """Zeitbudget aus dem Parameter "budget" (Sekunden), begrenzt auf das Zeitlimit der Sandbox"""
+    budget = request.values.get('budget', type=float)
+    if budget is None or budget <= 0:
+        budget = app.config['EXTRACTION_BUDGET']
+    if budget is not None:
+        budget = min(budget, app.config['EXTRACTION_TIMEOUT'])
+    return Deadline(budget)
+
+# Java einmal beim Start prüfen, JVM im Hintergrund aufwärmen
+runtime_probe = RuntimeProbe(
+    logger, interval=app.config['JAVA_PROBE_INTERVAL'], warmup_pdf=app.config['WARMUP_PDF'], jvm_manager=jvm_manager,
+    sandbox=extraction_sandbox if app.config['EXTRACTION_SANDBOX'] else None
+)
+runtime_probe.start()
+atexit.register(runtime_probe.stop)
+
 @app.route('/', methods=['GET'])
 def index():
     java_installed = check_java()
@@ -143,7 +270,7 @@ def index():
 @app.route('/', methods=['POST'], endpoint='index_post')
 def index_post():
     """Endpunkt zum Versuch der Java-Installation"""
-    if install_java():
+    if install_java() and runtime_probe.refresh():
         return jsonify({
             'success': True,
             'message': 'Java wurde erfolgreich installiert. Sie können die Anwendung jetzt nutzen.'
@@ -264,11 +391,15 @@ def extract():
         # Speichere die Original-PDF-ID für die Suche
         pdf_id = os.path.splitext(filename)[0]
         
+        # Platz erst nach dem Upload belegen: langsame Clients blockieren keine Extraktion
+        acquire_extraction_slot()
         logger.info(f"Starte Extraktion aus PDF: {pdf_path}")
+        started = time.perf_counter()
         
         # Erhöhe die Wahrscheinlichkeit, dass Tabellen gefunden werden
         # Übergebe die benötigten Funktionen und Objekte an die PDF-Extraktionsfunktionen
-        tables = process_pdf_with_encoding(pdf_path, output_format, logger, check_java, jvm_manager)
+        deadline = request_deadline()
+        tables = extract_pdf_tables(pdf_path, output_format, deadline)
         
         # Sicherstellen, dass immer ein Ergebnis zurückgegeben wird
         if not tables:
@@ -301,6 +432,7 @@ def extract():
         
         results = []
         table_htmls = []
+        indexed_tables = []
         
         for i, table in enumerate(tables):
             table = table.fillna('')
@@ -325,14 +457,22 @@ def extract():
                     
             temp_storage.add_file(output_filename)  # Markiere Tabelle als aktiv
             results.append(output_filename)
+            indexed_tables.append((output_filename, table))
+        
+        # Suchindizes der PDF sind nach neuer Extraktion veraltet
+        fuzzy_indexes.invalidate(pdf_id)
+        search_cache.invalidate(pdf_id)
+        typed_lookup.index_document(pdf_id, indexed_tables, get_code_matcher())
+        specs = store_wheel_specs(pdf_id, indexed_tables)
         
         # Extrahiere Auflagen-Codes und deren Texte 
         # Auch wenn keine Tabellen gefunden wurden, versuchen wir, Codes direkt aus der PDF zu extrahieren
         auflagen_codes = []
         try:
             # Übergebe die notwendigen Parameter an die verschobene Funktion
-            auflagen_codes = extract_auflagen_codes(tables, app, pdf_path, logger) 
+            # Texte nur einmal aus der PDF lesen und an die Code-Extraktion weitergeben
             extracted_texts = extract_auflagen_with_text(pdf_path, app, logger)
+            auflagen_codes = extract_auflagen_codes(tables, app, pdf_path, logger, extracted_texts, writer=write_queue)
         except Exception as e:
             logger.error(f"Fehler bei der Auflagen-Extraktion: {str(e)}")
             extracted_texts = {}
@@ -345,6 +485,14 @@ def extract():
             )
             for code in auflagen_codes
         ]
+        
+        # Metadaten gebündelt im Hintergrund speichern, die Antwort wartet nicht auf SQLite
+        write_queue.enqueue_extraction(filename, len(results), len(auflagen_codes), 'upload',
+                                       round((time.perf_counter() - started) * 1000))
+        persist_document(filename, indexed_tables, auflagen_codes, specs=specs)
+
+        # KI-Analyse im Hintergrund vorberechnen, damit /analyze sofort antwortet
+        schedule_analysis(filename)
             
         # Automatische Bereinigung nach 1 Stunde
         def delayed_cleanup():
@@ -359,9 +507,12 @@ def extract():
             files=results, 
             tables=table_htmls,
             condition_codes=condition_codes,
-            pdf_file=filename
-        )
+            pdf_file=filename,
+            extraction=deadline.report()
+        ), 200, {'X-Extraction-Stages': deadline.summary()}
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -380,7 +531,12 @@ def download_file(filename):
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     try:
         if not os.path.exists(filepath):
-            return "Datei nicht mehr verfügbar", 404
+            # Nach Neustart oder Bereinigung: Tabelle aus der Datenbank als CSV ausliefern
+            table = dict(load_tables(filename.rsplit('_table_', 1)[0])).get(filename) if filename.endswith('.csv') and '_table_' in filename else None
+            if table is None:
+                return "Datei nicht mehr verfügbar", 404
+            content = table.to_csv(index=False, sep=';').encode('utf-8-sig')
+            return send_file(io.BytesIO(content), as_attachment=True, download_name=filename, mimetype='text/csv')
             
         return send_file(filepath, as_attachment=True, download_name=filename)
     finally:
@@ -407,9 +563,13 @@ def reprocess_file(filename):
 
     output_format = 'csv'  # Standardformat
     try:
-        tables = process_pdf_with_encoding(filepath, output_format)
+        acquire_extraction_slot()
+        started = time.perf_counter()
+        deadline = request_deadline()
+        tables = extract_pdf_tables(filepath, output_format, deadline)
         results = []
         table_htmls = []
+        indexed_tables = []
 
         for i, table in enumerate(tables):
             table = table.fillna('')
@@ -435,12 +595,27 @@ def reprocess_file(filename):
                     table.to_excel(output_path, index=False, engine='openpyxl')
 
             results.append(output_filename)
+            indexed_tables.append((output_filename, table))
+
+        # Suchindizes der PDF sind nach neuer Extraktion veraltet
+        fuzzy_indexes.invalidate(os.path.splitext(filename)[0])
+        search_cache.invalidate(os.path.splitext(filename)[0])
+        typed_lookup.index_document(os.path.splitext(filename)[0], indexed_tables, get_code_matcher())
+        specs = store_wheel_specs(os.path.splitext(filename)[0], indexed_tables)
 
         if not results:
             return "Keine Tabellen in der PDF-Datei gefunden.", 400
 
-        return render_template('results.html', files=results, tables=table_htmls)
+        write_queue.enqueue_extraction(filename, len(results), method='reprocess',
+                                       elapsed_ms=round((time.perf_counter() - started) * 1000))
+        persist_document(filename, indexed_tables, specs=specs)
+        schedule_analysis(filename)
 
+        return render_template('results.html', files=results, tables=table_htmls, extraction=deadline.report()), \
+            200, {'X-Extraction-Stages': deadline.summary()}
+
+    except AdmissionRejected:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -454,7 +629,7 @@ def reprocess_file(filename):
 
 @app.route('/search', methods=['POST'])
 def search_vehicles():
-    """Verbesserte Fahrzeugsuche mit PDF-ID"""
+    """Verbesserte Fahrzeugsuche mit PDF-ID und serverseitiger Paginierung"""
     try:
         data = request.get_json()
         print("Received search request")
@@ -469,83 +644,51 @@ def search_vehicles():
                 'status': 'error'
             })
 
-        # Suche nach CSV-Dateien mit der PDF-ID
-        csv_pattern = f"{pdf_id}_table_*.csv"
-        table_files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            if filename.startswith(f"{pdf_id}_table_") and filename.endswith('.csv'):
-                table_files.append(filename)
-        
-        print(f"Found table files: {table_files}")
+        # Paginierung: offset/limit mit serverseitiger Obergrenze
+        try:
+            offset = max(int(data.get('offset', 0)), 0)
+            limit = int(data.get('limit', app.config['SEARCH_PAGE_SIZE']))
+        except (TypeError, ValueError):
+            return jsonify({
+                'html': '<div class="alert alert-warning">Ungültige Paginierungsparameter.</div>',
+                'status': 'error'
+            }), 400
+        limit = min(max(limit, 1), app.config['SEARCH_MAX_PAGE_SIZE'])
 
-        # Rest der Suchlogik bleibt gleich
-        all_results = []
-        for table_file in table_files:
+        # Unscharfe Suche über den Trigramm-Index (z.B. "Golf 7" findet "GOLF VII")
+        fuzzy = bool(data.get('fuzzy'))
+        threshold = None
+        if fuzzy:
             try:
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], table_file)
-                if not os.path.exists(filepath):
-                    print(f"File not found: {filepath}")
-                    continue
-                
-                print(f"Reading file: {filepath}")
-                df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
-                df = df.fillna('').astype(str)  # Konvertiere zu String
-                
-                # Suche in allen Spalten
-                mask = pd.Series(False, index=df.index)
-                for col in df.columns:
-                    col_values = df[col].str.lower().str.strip()
-                    mask |= col_values.str.contains(search_term, case=False, na=False, regex=False)
-                
-                if mask.any():
-                    results = df[mask].copy()
-                    print(f"Found {len(results)} matches in {table_file}")
-                    
-                    # Markiere Treffer
-                    for col in results.columns:
-                        results[col] = results[col].apply(
-                            lambda x: f'<mark>{x}</mark>' if search_term in str(x).lower() else x
-                        )
-                    all_results.append((table_file, results))
-            
-            except Exception as e:
-                print(f"Error processing {table_file}: {str(e)}")
-                continue
-
-        if all_results:
-            result_htmls = []
-            total_count = 0
-            for table_file, result_df in all_results:
-                total_count += len(result_df)
-                result_htmls.append(f"""
-                    <div class="card mb-3">
-                        <div class="card-header">
-                            <h6 class="mb-0">Ergebnisse aus {table_file}</h6>
-                        </div>
-                        <div class="card-body">
-                            <div class="table-responsive">
-                                {convert_table_to_html(result_df)}
-                            </div>
-                        </div>
-                    </div>
-                """)
-            
-            return jsonify({
-                'html': f"""
-                    <div class="alert alert-success">
-                        {total_count} Treffer gefunden für "{search_term}"
-                    </div>
-                    {''.join(result_htmls)}
-                """,
-                'count': total_count,
-                'status': 'success'
-            })
-        else:
+                threshold = float(data.get('threshold', app.config['FUZZY_SEARCH_THRESHOLD']))
+            except (TypeError, ValueError):
+                threshold = app.config['FUZZY_SEARCH_THRESHOLD']
+            threshold = min(max(threshold, 0.0), 1.0)
+
+        # Optional nur Spalten bestimmter Rollen durchsuchen (z.B. roles=vehicle,type)
+        roles = data.get('roles') or ()
+        if isinstance(roles, str):
+            roles = roles.split(',')
+        roles = tuple(sorted({role.strip() for role in roles if role.strip()}))
+        unknown = [role for role in roles if role not in ALL_ROLES]
+        if unknown:
             return jsonify({
-                'html': f'<div class="alert alert-info">Keine Fahrzeuge gefunden für "{search_term}".</div>',
-                'count': 0,
-                'status': 'no_results'
-            })
+                'html': f'<div class="alert alert-warning">Unbekannte Spaltenrolle: {", ".join(unknown)}</div>',
+                'status': 'error'
+            }), 400
+
+        # Wiederholte Suchen (Tippen, Löschen, Tabwechsel) aus dem Cache beantworten;
+        # search_term ist bereits normalisiert (getrimmt, Kleinschreibung)
+        cache_key = (pdf_id, search_term, offset, limit, threshold, roles)
+        response = search_cache.get(cache_key)
+        if response is None:
+            generation = search_cache.generation(pdf_id)
+            if fuzzy:
+                response = fuzzy_search(pdf_id, search_term, threshold, offset, limit)
+            else:
+                response = text_search(pdf_id, search_term, offset, limit, roles)
+            search_cache.put(cache_key, response, generation)
+        return jsonify(response)
             
     except Exception as e:
         print(f"Search error: {str(e)}")
@@ -555,6 +698,299 @@ def search_vehicles():
             'status': 'error'
         }), 500
 
+def text_search(pdf_id, search_term, offset, limit, roles=()):
+    """Teilstring-Suche über alle Tabellen einer PDF und Rendern der angeforderten Seite"""
+    # Tabellen in stabiler Reihenfolge laden, damit Seiten reproduzierbar sind
+    tables = load_extracted_tables(pdf_id)
+    print(f"Found table files: {[table_file for table_file, _ in tables]}")
+
+    # Ein kompilierter, escapter Ausdruck für Maskierung und Markierung
+    pattern = build_search_pattern(search_term)
+
+    all_results = []
+    for table_file, df in tables:
+        # Suche in allen Spalten bzw. nur in den Spalten der gewünschten Rollen
+        mask = pd.Series(False, index=df.index)
+        for col in (columns_with_role(df, *roles) if roles else df.columns):
+            mask |= df[col].str.contains(pattern, na=False)
+        
+        if mask.any():
+            results = df[mask]
+            print(f"Found {len(results)} matches in {table_file}")
+            all_results.append((table_file, results))
+
+    total_count = sum(len(result_df) for _, result_df in all_results)
+
+    if not total_count:
+        return {
+            'html': f'<div class="alert alert-info">Keine Fahrzeuge gefunden für "{search_term}".</div>',
+            'count': 0,
+            'total': 0,
+            'offset': offset,
+            'limit': limit,
+            'returned': 0,
+            'has_more': False,
+            'status': 'no_results'
+        }
+
+    # Nur die angeforderte Seite markieren und rendern
+    page = paginate_matches(all_results, offset, limit)
+    returned = sum(len(result_df) for _, result_df in page)
+
+    result_htmls = []
+    for table_file, result_df in page:
+        result_htmls.append(f"""
+            <div class="card mb-3">
+                <div class="card-header">
+                    <h6 class="mb-0">Ergebnisse aus {table_file}</h6>
+                </div>
+                <div class="card-body">
+                    <div class="table-responsive">
+                        {convert_table_to_html(highlight_matches(result_df, pattern))}
+                    </div>
+                </div>
+            </div>
+        """)
+    
+    if returned:
+        range_info = f"(zeige {offset + 1}–{offset + returned})"
+    else:
+        range_info = "(keine Treffer auf dieser Seite)"
+
+    return {
+        'html': f"""
+            <div class="alert alert-success">
+                {total_count} Treffer gefunden für "{search_term}" {range_info}
+            </div>
+            {''.join(result_htmls)}
+        """,
+        'count': total_count,
+        'total': total_count,
+        'offset': offset,
+        'limit': limit,
+        'returned': returned,
+        'has_more': offset + returned < total_count,
+        'status': 'success'
+    }
+
+@app.route('/manage_codes', methods=['GET'])
+def manage_codes():
+    """Verwaltungsseite der Auflagen-Codes (Liste wird seitenweise über /manage_codes/data geladen)"""
+    return render_template('manage_codes.html')
+
+@app.route('/manage_codes', methods=['POST'], endpoint='manage_codes_post')
+def manage_codes_post():
+    """Legt einen einzelnen Code an oder aktualisiert seine Beschreibung"""
+    entry, error = validate_code(request.form.get('code'), request.form.get('description'))
+    if error:
+        return jsonify({'error': error, 'status': 'error'}), 400
+    try:
+        upsert_codes(dict([entry]))
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+    return jsonify({'code': entry[0], 'status': 'success'})
+
+@app.route('/manage_codes/data', methods=['GET'])
+def manage_codes_data():
+    """Serverseitige Paginierung, Suche und Sortierung für die DataTable der Verwaltungsseite"""
+    try:
+        draw = int(request.args.get('draw', 0))
+        offset = max(int(request.args.get('start', 0)), 0)
+        limit = int(request.args.get('length', app.config['SEARCH_PAGE_SIZE']))
+        order_column = int(request.args.get('order[0][column]', 0))
+    except ValueError:
+        return jsonify({'error': 'Ungültige Paginierungsparameter', 'status': 'error'}), 400
+    # length=-1 ("alle") wird auf die Obergrenze begrenzt
+    limit = app.config['SEARCH_MAX_PAGE_SIZE'] if limit < 1 else min(limit, app.config['SEARCH_MAX_PAGE_SIZE'])
+    total, filtered, codes = query_codes(
+        request.args.get('search[value]', ''), order_column,
+        request.args.get('order[0][dir]') == 'desc', offset, limit
+    )
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': total,
+        'recordsFiltered': filtered,
+        'data': [{
+            'code': code.code,
+            'description': code.description,
+            'updated_at': code.updated_at.strftime('%d.%m.%Y %H:%M') if code.updated_at else '',
+        } for code in codes],
+    })
+
+@app.route('/manage_codes/import', methods=['POST'])
+def manage_codes_import():
+    """Massenimport aus CSV (code;description) oder JSON (Array von Objekten bzw. JSON Lines)"""
+    started = time.perf_counter()
+    if request.form.get('source') == 'builtin':
+        # Mitgelieferte Standardtexte aus utils.AUFLAGEN_TEXTE
+        rows = ((number, code, text) for number, (code, text) in enumerate(AUFLAGEN_TEXTE.items(), 1))
+    else:
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            return jsonify({'error': 'Keine Datei ausgewählt', 'status': 'error'}), 400
+        file_format = request.form.get('format') or os.path.splitext(file.filename)[1].lstrip('.').lower()
+        if file_format in ('json', 'jsonl', 'ndjson'):
+            rows = iter_json_rows(file.stream)
+        elif file_format in ('csv', 'txt'):
+            rows = iter_csv_rows(file.stream)
+        else:
+            return jsonify({'error': f'Nicht unterstütztes Format: {file_format}', 'status': 'error'}), 400
+    try:
+        stats = import_codes(rows)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+    except Exception as e:
+        logger.error(f"Code-Import fehlgeschlagen: {e}")
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+    stats['elapsed_ms'] = round((time.perf_counter() - started) * 1000)
+    logger.info(f"Code-Import: {stats['imported']} Codes in {stats['batches']} Transaktionen, "
+                f"{stats['invalid']} ungültig ({stats['elapsed_ms']} ms)")
+    stats['status'] = 'success'
+    return jsonify(stats)
+
+@app.route('/manage_codes/export', methods=['GET'])
+def manage_codes_export():
+    """Exportiert alle Codes als CSV oder JSON (?format=json), gestreamt"""
+    file_format = request.args.get('format', 'csv').lower()
+    if file_format not in ('csv', 'json'):
+        return jsonify({'error': f'Nicht unterstütztes Format: {file_format}', 'status': 'error'}), 400
+    generator = export_json() if file_format == 'json' else export_csv()
+    mimetype = 'application/json' if file_format == 'json' else 'text/csv'
+    return Response(
+        stream_with_context(generator),
+        mimetype=f'{mimetype}; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename=auflagen_codes.{file_format}'}
+    )
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Bereitschaftsprüfung: 200, sobald Java geprüft und die JVM aufgewärmt ist (ohne Java: Fallback-Modus)"""
+    status = runtime_probe.snapshot()
+    status['mode'] = 'tabula' if status['java_available'] else 'fallback'
+    status['sandbox'] = app.config['EXTRACTION_SANDBOX']
+    status['tabula'] = extraction_sandbox.stats() if app.config['EXTRACTION_SANDBOX'] else tabula_runtime.stats()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/sandbox/stats', methods=['GET'])
+def sandbox_stats():
+    """Zähler der Extraktions-Sandbox (abgebrochene Aufträge, Wiederholungen, Laufzeiten)"""
+    return jsonify(extraction_sandbox.stats())
+
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    """Zulassung zur Extraktion: Warteschlangenlänge, Wartezeiten (p50/p99) und Abweisungen"""
+    return jsonify(extraction_admission.stats())
+
+@app.route('/write_queue/stats', methods=['GET'])
+def write_queue_stats():
+    """Durchsatz-Zähler des Write-Behind-Schreibers (Aufträge, Transaktionen, Batch-Größen)"""
+    return jsonify(write_queue.stats())
+
+@app.route('/search/cache_stats', methods=['GET'])
+def search_cache_stats():
+    """Trefferquote des Such-Caches (zur Dimensionierung von SEARCH_CACHE_SIZE)"""
+    stats = search_cache.stats()
+    stats['column_roles'] = {name: info._asdict() for name, info in classifier_cache_info().items()}
+    return jsonify(stats)
+
+def fuzzy_search(pdf_id, search_term, threshold, offset, limit):
+    """Rangiert Zellzeilen einer PDF nach Trigramm-Ähnlichkeit und rendert eine Ergebnisseite"""
+    index = fuzzy_indexes.get(pdf_id, lambda: load_extracted_tables(pdf_id))
+    hits, total_count = index.query(search_term, threshold=threshold, top_k=offset + limit)
+    hits = hits[offset:offset + limit]
+
+    response = {
+        'count': total_count,
+        'total': total_count,
+        'offset': offset,
+        'limit': limit,
+        'returned': len(hits),
+        'has_more': offset + len(hits) < total_count,
+        'threshold': threshold,
+        'matches': [],
+    }
+    if not total_count:
+        response.update({
+            'html': f'<div class="alert alert-info">Keine ähnlichen Fahrzeuge gefunden für "{search_term}".</div>',
+            'status': 'no_results'
+        })
+        return response
+
+    rows = []
+    for (table_file, row_idx, col, line), score in hits:
+        row = index.tables[table_file].loc[row_idx]
+        response['matches'].append({
+            'table': table_file, 'row': int(row_idx), 'column': col, 'text': line, 'score': round(score, 3)
+        })
+        rows.append({
+            'Ähnlichkeit': f"{score:.0%}",
+            'Tabelle': table_file,
+            'Treffer': f"<mark>{line}</mark>",
+            'Zeile': ' | '.join(value for value in row if value),
+        })
+
+    response.update({
+        'html': f"""
+            <div class="alert alert-success">
+                {total_count} ähnliche Treffer für "{search_term}" (Schwellwert {threshold:.0%})
+            </div>
+            <div class="table-responsive">
+                {convert_table_to_html(pd.DataFrame(rows))}
+            </div>
+        """,
+        'status': 'success'
+    })
+    return response
+
+@app.route('/lookup', methods=['GET'])
+def lookup_vehicles():
+    """Exakte oder Präfix-Suche nach Typgenehmigungsnummer bzw. Fahrzeug-Typ"""
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind', 'approval')
+    mode = request.args.get('mode', 'exact')
+    pdf_id = request.args.get('file_id')
+
+    if not query:
+        return jsonify({'error': 'Kein Suchbegriff angegeben', 'status': 'error'}), 400
+    if kind not in ('approval', 'type') or mode not in ('exact', 'prefix'):
+        return jsonify({'error': 'Ungültiger Suchtyp oder Modus', 'status': 'error'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', app.config['SEARCH_PAGE_SIZE'])), 1), app.config['SEARCH_MAX_PAGE_SIZE'])
+    except ValueError:
+        return jsonify({'error': 'Ungültiger Wert für limit', 'status': 'error'}), 400
+
+    # Dokumente, die vor dem Serverstart extrahiert wurden, bei Bedarf nachindizieren
+    # Nach Änderungen an der Code-Tabelle werden die Codes mit dem neuen Automaten neu bestimmt
+    code_matcher = get_code_matcher()
+    for doc_id in known_document_ids():
+        if not typed_lookup.is_current(doc_id, code_matcher) and (pdf_id is None or doc_id == pdf_id):
+            typed_lookup.index_document(doc_id, load_extracted_tables(doc_id), code_matcher)
+
+    key, records = typed_lookup.lookup(query, kind=kind, mode=mode)
+    if pdf_id:
+        records = [record for record in records if record['document'] == pdf_id]
+    total_count = len(records)
+    records = records[:limit]
+
+    return jsonify({
+        'query': query,
+        'key': key,
+        'kind': kind,
+        'mode': mode,
+        'count': total_count,
+        'returned': len(records),
+        'results': [{
+            'document': record['document'],
+            'table': record['table'],
+            'vehicle': record['vehicle'],
+            'types': record['types'],
+            'approvals': record['approvals'],
+            'codes': sorted({code for row in record['rows'] for code in row['codes']}),
+            'rows': record['rows'],
+        } for record in records],
+        'status': 'success' if total_count else 'no_results'
+    })
+
 # JVM-Handhabung verbessern
 def initialize_jvm():
     """Initialisiert die JVM mit Fehlerbehandlung"""
@@ -563,7 +999,9 @@ def initialize_jvm():
             jvm_path = jpype.getDefaultJVMPath()
             if not os.path.exists(jvm_path):
                 raise FileNotFoundError(f"JVM shared library file not found: {jvm_path}")
-            jpype.startJVM(jvm_path, convertStrings=False)  # Verhindert automatische String-Konvertierung
+            # Gleiche Sperre wie JVMManager: die JVM startet genau einmal, mit tabula-java im Klassenpfad
+            if not tabula_runtime.start():
+                raise RuntimeError(tabula_runtime.error)
     except Exception as e:
         print(f"JVM Initialisierungsfehler: {str(e)}")
         print("Verwende Fallback-Methode...")
@@ -581,7 +1019,8 @@ def shutdown_jvm():
 # Kontext-Handler anpassen
 @app.before_request
 def before_request():
-    if not jpype.isJVMStarted():
+    # Mit Sandbox extrahieren nur die Kindprozesse, der Web-Prozess braucht keine eigene JVM
+    if not app.config['EXTRACTION_SANDBOX'] and not jpype.isJVMStarted():
         initialize_jvm()
 
 @app.teardown_appcontext
@@ -625,6 +1064,160 @@ def cleanup_on_shutdown():
     finally:
         print("Shutdown-Prozess abgeschlossen.")
 
+def compute_analysis(filename):
+    """Führt die Eintragungsfreiheits-Analyse für eine extrahierte PDF aus (ohne Cache)"""
+    pdf_filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    pdf_id = os.path.splitext(filename)[0]
+        
+    # Analysiere Tabellendaten
+    vehicle_info = {}
+    wheel_tire_info = {}
+    
+    # Automat über bekannte Codes (wird nach Änderungen an der Code-Tabelle neu gebaut)
+    code_matcher = get_code_matcher()
+    
+    auflagencodes_found = []
+    loaded_tables = []
+    
+    # Analysiere alle Tabellen (nach Neustart oder Bereinigung aus der Datenbank)
+    for table_file, df in load_extracted_tables(pdf_id):
+        loaded_tables.append((table_file, df))
+        
+        # Fahrzeugdaten extrahieren
+        if vehicle_info == {}:
+            vehicle_info = extract_vehicle_info(df)
+            print(f"Extrahierte Fahrzeugdaten: {vehicle_info}")
+        
+        # Rad/Reifen-Informationen extrahieren
+        if wheel_tire_info == {}:
+            wheel_tire_info = extract_wheel_tire_info(df)
+            print(f"Extrahierte Rad/Reifen-Informationen: {wheel_tire_info}")
+        
+        # Auflagencodes finden
+        codes = code_matcher.find_in_frame(df)
+        auflagencodes_found.extend(codes)
+    
+    # Aus PDF erneut Codes extrahieren für maximale Sicherheit
+    try:
+        with pdfplumber.open(pdf_filepath) as pdf:
+            text = ""
+            for page in pdf.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    text += page_text
+            
+            # Suche nach bekannten Auflagen-Codes im Text
+            text_codes = code_matcher.find_codes(text)
+            auflagencodes_found.extend(text_codes)
+    except Exception as e:
+        print(f"Fehler beim PDF-Text extrahieren: {e}")
+    
+    # Deduplizieren und sortieren
+    auflagencodes_found = sorted(list(set(auflagencodes_found)))
+    print(f"Gefundene Auflagencodes: {auflagencodes_found}")
+    
+    # Beschreibungen aus dem versionierten Code-Cache (neu geladen nur nach Änderungen)
+    auflagen_db = code_cache.descriptions()
+    
+    # Analysiere die Eintragungsfreiheit
+    is_free, confidence, reasons, condition_codes, analysis_summary = analyze_freedom(
+        auflagencodes_found, auflagen_db, vehicle_info, wheel_tire_info)
+    
+    print(f"Analyse-Ergebnis: Eintragungsfrei={is_free}, Zuverlässigkeit={confidence}%")
+    
+    # Bewertung je Fahrzeugzeile (Tabellen in Dateireihenfolge)
+    loaded_tables.sort(key=lambda item: int(item[0].rsplit('_table_', 1)[1].split('.')[0]))
+    vehicle_rows = analyze_rows(loaded_tables, code_matcher, get_rule_set())
+    
+    return {
+        'is_free': is_free,
+        'confidence': confidence,
+        'vehicle_info': vehicle_info,
+        'wheel_tire_info': wheel_tire_info,
+        'codes_found': auflagencodes_found,
+        'condition_codes': condition_codes,
+        'analysis_reasons': reasons,
+        'analysis_summary': analysis_summary,
+        'vehicle_rows': vehicle_rows,
+    }
+
+def analysis_key(filename):
+    """Cache-Schlüssel der Analyse: (SHA-256 der PDF, gemeinsame Version von Code-Tabelle und Regelsatz)"""
+    version = hashlib.sha1(f"{get_codes_version()}:{get_rule_set().version}".encode('utf-8')).hexdigest()
+    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(pdf_path):
+        # PDF bereits bereinigt: Hash der gespeicherten Extraktion verwenden
+        document = get_document(os.path.splitext(filename)[0])
+        if document is None and write_queue.flush(timeout=5):
+            # Extraktion evtl. noch in der Write-Behind-Warteschlange
+            document = get_document(os.path.splitext(filename)[0])
+        if document is None or not document.document_hash:
+            raise DocumentNotFound(filename)
+        return (document.document_hash, version)
+    try:
+        return (file_sha256(pdf_path), version)
+    except FileNotFoundError:
+        # Zwischen Prüfung und Lesen bereinigt
+        return analysis_key(filename)
+
+def get_analysis(filename):
+    """Gespeicherte Analyse der PDF laden oder einmalig berechnen"""
+    return analysis_store.get_or_compute(analysis_key(filename), filename, lambda: compute_analysis(filename))
+
+def schedule_analysis(filename):
+    """Analyse im Hintergrund vorberechnen, sobald die Codes und Tabellen des Dokuments geschrieben sind"""
+    analysis_store.schedule(filename, lambda: analysis_key(filename), lambda: compute_analysis(filename),
+                            wait_for=write_queue.barrier())
+
+def extracted_table_names(pdf_id):
+    """Tabellendateien der PDF im Upload-Ordner; nach Neustart oder Bereinigung die Namen der gespeicherten Tabellen"""
+    return list_table_files(app.config['UPLOAD_FOLDER'], pdf_id, ('.csv', '.xlsx')) or table_names(pdf_id)
+
+def has_extracted_tables(pdf_id):
+    """Prüft, ob für die PDF Tabellen vorliegen (als Datei oder in der Datenbank)"""
+    return bool(extracted_table_names(pdf_id))
+
+def has_document(filename):
+    """PDF liegt im Upload-Ordner oder ihre Extraktion ist in der Datenbank gespeichert"""
+    if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+        return True
+    return get_document(os.path.splitext(filename)[0]) is not None
+
+def persist_document(filename, indexed_tables, codes=(), document_hash=None, specs=None):
+    """Tabellen, Zeilen, gefundene Auflagen-Codes und Rad/Reifen-Daten der PDF im Hintergrund speichern"""
+    try:
+        code_matcher = get_code_matcher()
+        found = set(codes)
+        for _, df in indexed_tables:
+            found.update(code_matcher.find_in_frame(df))
+        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        if document_hash is None and os.path.exists(pdf_path):
+            document_hash = file_sha256(pdf_path)
+        write_queue.enqueue_document(filename, table_payload(indexed_tables), found, document_hash, specs)
+    except Exception as e:
+        logger.error(f"Dokument {filename} konnte nicht vorgemerkt werden: {e}")
+
+def load_extracted_tables(pdf_id):
+    """Tabellen einer PDF als Liste von (Dateiname, DataFrame); fehlen die CSVs, direkt aus der Datenbank"""
+    return load_document_tables(app.config['UPLOAD_FOLDER'], pdf_id) or load_tables(pdf_id)
+
+# (Stand von fuzzy_indexes.corpus_generation, PDF-IDs) der letzten Abfrage
+known_documents = (None, [])
+
+def known_document_ids():
+    """PDF-IDs mit Tabellen im Upload-Ordner oder in der Datenbank (der Upload-Ordner ist nach einem Neustart leer)
+
+    Jede Extraktion invalidiert den Suchindex ihrer PDF; solange sich dessen Generation nicht
+    ändert, kommt die Liste aus dem Speicher statt aus Ordner und Datenbank.
+    """
+    global known_documents
+    generation = fuzzy_indexes.corpus_generation
+    cached_generation, doc_ids = known_documents
+    if cached_generation != generation:
+        doc_ids = sorted(set(list_document_ids(app.config['UPLOAD_FOLDER'])) | set(list_documents()))
+        known_documents = (generation, doc_ids)
+    return doc_ids
+
 # Neue Route für KI-Analyse
 @app.route('/analyze/<filename>')
 def analyze_registration_freedom(filename):
@@ -632,276 +1225,318 @@ def analyze_registration_freedom(filename):
     try:
         print(f"Analyse gestartet für: {filename}")
         pdf_filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(pdf_filepath):
+        if not has_document(filename):
             print(f"PDF nicht gefunden: {pdf_filepath}")
             return 'PDF Datei nicht gefunden', 404
         
-        # Sammle verfügbare Tabellendateien für diese PDF
-        pdf_id = os.path.splitext(filename)[0]
-        table_files = []
-        for file in os.listdir(app.config['UPLOAD_FOLDER']):
-            if file.startswith(f"{pdf_id}_table_") and (file.endswith('.csv') or file.endswith('.xlsx')):
-                table_files.append(file)
-                
-        if not table_files:
+        if not has_extracted_tables(os.path.splitext(filename)[0]):
             print(f"Keine Tabellen für PDF {filename} gefunden")
             return 'Keine extrahierten Tabellen gefunden', 404
-            
-        # Analysiere Tabellendaten
-        vehicle_info = {}
-        wheel_tire_info = {}
-        
-        # Auflagencodes aus Datenbank laden
-        with app.app_context():
-            auflagen_db = {code.code: code.description for code in AuflagenCode.query.all()}
-        
-        auflagencodes_found = []
-        
-        # Analysiere alle Tabellendateien
-        for table_file in table_files:
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], table_file)
-            if not os.path.exists(filepath):
-                continue
-                
-            if filepath.endswith('.csv'):
-                df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
-            else:  # Excel-Datei
-                df = pd.read_excel(filepath)
-                
-            df = df.fillna('')
-            df = df.astype(str)
-            
-            # Fahrzeugdaten extrahieren
-            if vehicle_info == {}:
-                vehicle_info = extract_vehicle_info(df)
-                print(f"Extrahierte Fahrzeugdaten: {vehicle_info}")
-            
-            # Rad/Reifen-Informationen extrahieren
-            if wheel_tire_info == {}:
-                wheel_tire_info = extract_wheel_tire_info(df)
-                print(f"Extrahierte Rad/Reifen-Informationen: {wheel_tire_info}")
-            
-            # Auflagencodes finden
-            codes = find_condition_codes(df)
-            auflagencodes_found.extend(codes)
-        
-        # Aus PDF erneut Codes extrahieren für maximale Sicherheit
-        try:
-            with pdfplumber.open(pdf_filepath) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text
-                
-                # Suche nach Auflagen-Codes im Text
-                code_pattern = re.compile(r"""
-                    (?:
-                        [A-Z][0-9]{1,3}[a-z]?|  # Bsp: A01, B123a
-                        [0-9]{2,3}[A-Z]?|        # Bsp: 155, 12A
-                        NoH|Lim                  # Spezielle Codes
-                    )
-                """, re.VERBOSE)
-                text_codes = code_pattern.findall(text)
-                auflagencodes_found.extend(text_codes)
-        except Exception as e:
-            print(f"Fehler beim PDF-Text extrahieren: {e}")
-        
-        # Deduplizieren und sortieren
-        auflagencodes_found = sorted(list(set(auflagencodes_found)))
-        print(f"Gefundene Auflagencodes: {auflagencodes_found}")
-        
-        # Analysiere die Eintragungsfreiheit
-        is_free, confidence, reasons, condition_codes, analysis_summary = analyze_freedom(
-            auflagencodes_found, auflagen_db, vehicle_info, wheel_tire_info)
         
-        print(f"Analyse-Ergebnis: Eintragungsfrei={is_free}, Zuverlässigkeit={confidence}%")
+        # Ergebnis wurde in der Regel schon nach der Extraktion im Hintergrund berechnet
+        analysis = get_analysis(filename)
         
         return render_template(
             'ai_analysis.html',
-            is_free=is_free,
-            confidence=confidence,
-            vehicle_info=vehicle_info,
-            wheel_tire_info=wheel_tire_info,
-            condition_codes=condition_codes,
-            analysis_reasons=reasons,
-            analysis_summary=analysis_summary,
+            is_free=analysis['is_free'],
+            confidence=analysis['confidence'],
+            vehicle_info=analysis['vehicle_info'],
+            wheel_tire_info=analysis['wheel_tire_info'],
+            condition_codes=analysis['condition_codes'],
+            analysis_reasons=analysis['analysis_reasons'],
+            analysis_summary=analysis['analysis_summary'],
+            vehicle_rows=analysis.get('vehicle_rows', []),
             pdf_file=filename
         )
         
+    except DocumentNotFound:
+        return 'PDF Datei nicht gefunden', 404
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f"Fehler bei KI-Analyse: {error_details}")
         return f"Fehler bei der KI-Analyse: {str(e)}<br/><pre>{error_details}</pre>", 500
 
-def extract_vehicle_info(df):
-    """Extrahiert Fahrzeuginformationen aus DataFrame"""
-    vehicle_info = {}
-    
-    # Typische Spalten und ihre normalisierte Form
-    key_columns = {
-        'fahrzeug': ['fzg', 'fahrzeugtyp', 'typ', 'modell', 'vehicle'],
-        'hersteller': ['manufacturer', 'marke', 'fabrikat'],
-        'typ': ['type', 'fahrzeugtyp', 'typen', 'modell']
-    }
-    
-    # Normalisiere Spaltennamen
-    normalized_columns = {col.lower().strip(): col for col in df.columns}
-    
-    # Suche nach relevanten Spalten
-    for target, alternatives in key_columns.items():
-        for alt in [target] + alternatives:
-            for col in normalized_columns:
-                if alt in col:
-                    # Versuche, einen sinnvollen Wert zu finden
-                    values = df[normalized_columns[col]].unique()
-                    for val in values:
-                        if isinstance(val, str) and len(val) > 2 and val.lower() != 'nan':
-                            vehicle_info[target.capitalize()] = val
-                            break
-    
-    return vehicle_info
+@app.route('/analyze/<filename>/rows')
+def analyze_vehicle_rows(filename):
+    """Eintragungsfreiheit je Fahrzeugzeile als JSON"""
+    if not has_document(filename):
+        return jsonify({'error': 'PDF Datei nicht gefunden', 'status': 'error'}), 404
+    if not has_extracted_tables(os.path.splitext(filename)[0]):
+        return jsonify({'error': 'Keine extrahierten Tabellen gefunden', 'status': 'error'}), 404
+    try:
+        rows = get_analysis(filename).get('vehicle_rows', [])
+    except DocumentNotFound:
+        return jsonify({'error': 'PDF Datei nicht gefunden', 'status': 'error'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+    return jsonify({'document': filename, 'count': len(rows), 'rows': rows, 'status': 'success'})
 
-def extract_wheel_tire_info(df):
-    """Extrahiert Rad/Reifen-Informationen aus DataFrame mit verbesserter Zuverlässigkeit"""
-    wheel_tire_info = {}
-    
-    # Erweiterte Erkennungsmuster für relevante Spalten
-    key_patterns = {
-        'Reifengröße': ['reifen', 'tire', 'dimension', 'größe', 'size', 'reifentyp'],
-        'Felgengröße': ['felge', 'rim', 'wheel', 'alufelge', 'räder', 'zoll'],
-        'Einpresstiefe': ['et', 'offset', 'einpress', 'einpresstiefe'],
-        'Hersteller': ['hersteller', 'manufacturer', 'producer', 'marke', 'brand'],
-        'Tragfähigkeit': ['load', 'traglast', 'tragfähigkeit', 'last', 'gewicht', 'kg'],
-        'Geschwindigkeitsindex': ['speed', 'geschwindigkeit', 'index', 'km/h', 'si']
-    }
-    
-    # Verbesserte Normalisierung von Spaltennamen
-    normalized_columns = {col.lower().strip().replace('-', '').replace('_', ''): col for col in df.columns}
-    
-    # Direkte Werterkennung durch Muster
-    patterns = {
-        'Reifengröße': r'(\d{3}/\d{2}[R]\d{2})', # z.B. 205/55R16
-        'Felgengröße': r'(\d{1,2}[,.]\d{1}[Jx]?\d{2})', # z.B. 7J16 oder 7,5x16
-        'Einpresstiefe': r'ET\s*(\d{1,2})', # z.B. ET35
-    }
-    
-    # Zuerst direkte Suche in den Werten aller Spalten
-    for key, pattern in patterns.items():
-        if key not in wheel_tire_info:
-            for col in df.columns:
-                for value in df[col].astype(str):
-                    match = re.search(pattern, value, re.IGNORECASE)
-                    if match:
-                        wheel_tire_info[key] = match.group(0)
-                        break
-                if key in wheel_tire_info:
-                    break
-    
-    # Dann Suche nach relevanten Spalten
-    for target, pats in key_patterns.items():
-        if target not in wheel_tire_info:  # Nur suchen wenn noch nicht gefunden
-            for pattern in pats:
-                for col in normalized_columns:
-                    if pattern in col:
-                        # Werte prüfen
-                        values = df[normalized_columns[col]].astype(str).unique()
-                        for val in values:
-                            if len(val) > 2 and val.lower() not in ['nan', '', 'none']:
-                                wheel_tire_info[target] = val
-                                break
-                        if target in wheel_tire_info:
-                            break
-                if target in wheel_tire_info:
-                    break
-    
-    # Nachbearbeitung: Formatierung standardisieren
-    if 'Einpresstiefe' in wheel_tire_info:
-        # Extrahiere nur die Zahl, wenn "ET" enthalten ist
-        et_val = wheel_tire_info['Einpresstiefe']
-        if 'et' in et_val.lower():
-            et_match = re.search(r'(?:et)\s*(\d+)', et_val.lower())
-            if et_match:
-                wheel_tire_info['Einpresstiefe'] = f"ET {et_match.group(1)}"
-    
-    return wheel_tire_info
-
-def find_condition_codes(df):
-    """Findet Auflagen-Codes in einem DataFrame"""
-    codes = set()
-    code_pattern = re.compile(r"""
-        (?:
-            [A-Z][0-9]{1,3}[a-z]?|    # Bsp: A01, B123a
-            [0-9]{2,3}[A-Z]?|          # Bsp: 155, 12A
-            NoH|Lim                     # Spezielle Codes
-        )
-    """, re.VERBOSE)
-    
-    # Suche in allen String-Spalten
-    for col in df.columns:
-        for value in df[col]:
-            if isinstance(value, str):
-                matches = code_pattern.findall(value)
-                codes.update(matches)
-    
-    return list(codes)
+def extract_document_tables(filename, document_hash=None):
+    """Extrahiert die Tabellen einer PDF im Upload-Ordner als CSV und aktualisiert die Suchindizes"""
+    pdf_id = os.path.splitext(filename)[0]
+    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    started = time.perf_counter()
+    # Auch Batch- und Upload-Aufträge belegen einen Platz; sie warten bei Abweisung, statt zu scheitern
+    with extraction_admission.admit(patient=True):
+        tables = extract_pdf_tables(pdf_path, 'csv')
+
+    indexed_tables = []
+    for i, table in enumerate(tables):
+        table = table.fillna('').astype(str)
+        output_filename = f"{pdf_id}_table_{i + 1}.csv"
+        table.to_csv(os.path.join(app.config['UPLOAD_FOLDER'], output_filename), index=False, encoding='utf-8-sig', sep=';')
+        temp_storage.add_file(output_filename)
+        indexed_tables.append((output_filename, table))
+
+    fuzzy_indexes.invalidate(pdf_id)
+    search_cache.invalidate(pdf_id)
+    typed_lookup.index_document(pdf_id, indexed_tables, get_code_matcher())
+    specs = store_wheel_specs(pdf_id, indexed_tables)
+    write_queue.enqueue_extraction(filename, len(indexed_tables), method='batch',
+                                   elapsed_ms=round((time.perf_counter() - started) * 1000))
+    persist_document(filename, indexed_tables, document_hash=document_hash, specs=specs)
+    return len(indexed_tables)
+
+def store_wheel_specs(pdf_id, indexed_tables):
+    """Erzeugt die typisierten Rad/Reifen-Daten der PDF und nimmt sie in den Freigabe-Index auf
+
+    Gespeichert wird das Array mit dem Dokument (persist_document, Tabelle extracted_specs).
+    """
+    try:
+        specs = build_spec_array(pdf_id, indexed_tables)
+        fitment_index.index_document(pdf_id, indexed_tables, specs, get_code_matcher())
+        return specs
+    except Exception as e:
+        logger.error(f"Rad/Reifen-Daten für {pdf_id} konnten nicht erzeugt werden: {e}")
+        return None
+
+def get_wheel_specs(pdf_id):
+    """Rad/Reifen-Daten einer PDF: aus dem Freigabe-Index, der Datenbank oder neu aus den Tabellen erzeugt"""
+    indexed = fitment_index.documents.get(pdf_id)
+    if indexed is not None:
+        return indexed['specs']
+    specs = load_specs(pdf_id)
+    if specs is None and has_extracted_tables(pdf_id):
+        specs = store_wheel_specs(pdf_id, load_extracted_tables(pdf_id))
+    return specs
+
+def ensure_fitment_index():
+    """Nimmt Dokumente, die vor dem Serverstart extrahiert wurden, in den Freigabe-Index auf"""
+    for doc_id in known_document_ids():
+        if doc_id in fitment_index.documents:
+            continue
+        tables = load_extracted_tables(doc_id)
+        specs = load_specs(doc_id)
+        if specs is None:
+            store_wheel_specs(doc_id, tables)
+        else:
+            fitment_index.index_document(doc_id, tables, specs, get_code_matcher())
+
+@app.route('/fitment', methods=['GET'])
+def fitment_query():
+    """Welche Gutachten erlauben Felge/ET/Lochbild auf Fahrzeug X, und unter welchen Auflagen?
+
+    Beispiel: /fitment?rim=8,5x19&et=35-45&bolt=5x112&type=8K&vehicle=audi
+    """
+    parsers = {'rim': parse_rim_query, 'et': parse_range_query, 'bolt': parse_bolt_query}
+    criteria = {}
+    for name, parser in parsers.items():
+        value = request.args.get(name, '').strip()
+        if value:
+            criteria[name] = parser(value)
+            if criteria[name] is None:
+                return jsonify({'error': f'Ungültiger Wert für {name}: {value}', 'status': 'error'}), 400
+    vehicle_type = request.args.get('type', '').strip()
+    vehicle = request.args.get('vehicle', '').strip()
+    if not criteria and not vehicle_type and not vehicle:
+        return jsonify({'error': 'Mindestens ein Suchkriterium angeben (rim, et, bolt, type, vehicle)', 'status': 'error'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', app.config['SEARCH_PAGE_SIZE'])), 1), app.config['SEARCH_MAX_PAGE_SIZE'])
+    except ValueError:
+        return jsonify({'error': 'Ungültiger Wert für limit', 'status': 'error'}), 400
+
+    ensure_fitment_index()
+    started = time.perf_counter()
+    total_count, results = fitment_index.query(
+        rim=criteria.get('rim'), offset=criteria.get('et'), bolt=criteria.get('bolt'),
+        vehicle_type=vehicle_type, vehicle=vehicle, limit=limit
+    )
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    for result in results:
+        filename = f"{result['document']}.pdf"
+        result['links'] = {
+            'document': url_for('results', filename=filename),
+            'rows': url_for('analyze_vehicle_rows', filename=filename),
+        }
+    return jsonify({
+        'count': total_count,
+        'returned': len(results),
+        'elapsed_ms': elapsed_ms,
+        'results': results,
+        'status': 'success'
+    })
+
+@app.route('/specs/<filename>', methods=['GET'])
+def wheel_specs(filename):
+    """Rad/Reifen-Daten einer PDF als JSON, optional gefiltert (z.B. ?offset=35:45&tire_width=225:)"""
+    pdf_id = os.path.splitext(filename)[0]
+    specs = get_wheel_specs(pdf_id)
+    if specs is None:
+        return jsonify({'error': 'Keine extrahierten Tabellen gefunden', 'status': 'error'}), 404
+
+    ranges = {}
+    for field, value in request.args.items():
+        if field not in SPEC_DTYPE.names or SPEC_DTYPE[field].kind != 'f':
+            return jsonify({'error': f'Unbekanntes Filterfeld: {field}', 'status': 'error'}), 400
+        low, _, high = value.partition(':') if ':' in value else (value, '', value)
+        try:
+            ranges[field] = (float(low) if low else None, float(high) if high else None)
+        except ValueError:
+            return jsonify({'error': f'Ungültiger Bereich für {field}: {value}', 'status': 'error'}), 400
+
+    matches = filter_specs(specs, **ranges)
+    return jsonify({'document': filename, 'count': len(matches), 'specs': specs_to_records(matches), 'status': 'success'})
+
+def analyze_batch_document(filename, document_hash=None):
+    """Extraktion (falls nötig) und Analyse eines Dokuments als JSON-fähiges Ergebnis"""
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+                return {'document': filename, 'status': 'error', 'error': 'PDF Datei nicht gefunden'}
+            if not has_extracted_tables(os.path.splitext(filename)[0]) and not extract_document_tables(filename, document_hash):
+                return {'document': filename, 'status': 'error', 'error': 'Keine Tabellen in der PDF-Datei gefunden'}
+
+            analysis = get_analysis(filename)
+            return {
+                'document': filename,
+                'status': 'success',
+                'eintragungsfrei': analysis['is_free'],
+                'confidence': analysis['confidence'],
+                'codes': analysis['codes_found'],
+                'condition_codes': analysis['condition_codes'],
+                'summary': analysis['analysis_summary'],
+                'elapsed_ms': round((time.perf_counter() - started) * 1000),
+            }
+        except Exception as e:
+            logger.error(f"Batch-Analyse für {filename} fehlgeschlagen: {e}")
+            return {'document': filename, 'status': 'error', 'error': str(e)}
+
+@app.route('/api/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """Analysiert viele Dokumente parallel und streamt je Dokument eine NDJSON-Zeile, sobald es fertig ist
+
+    Akzeptiert JSON {"documents": ["datei.pdf", ...]} (bereits hochgeladene PDFs) und/oder
+    hochgeladene PDFs im Multipart-Feld "files".
+    """
+    documents = []
+    data = request.get_json(silent=True) or {}
+    for document in data.get('documents', request.form.getlist('documents')):
+        # PDF-IDs ohne Endung akzeptieren
+        filename = secure_filename(str(document))
+        documents.append(filename if filename.lower().endswith('.pdf') else f"{filename}.pdf")
+
+    # Uploads vor dem Streamen speichern, danach ist der Request-Body nicht mehr lesbar
+    for file in request.files.getlist('files'):
+        if not file.filename:
+            continue
+        filename = secure_filename(file.filename)
+        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        temp_storage.add_file(filename)
+        documents.append(filename)
+
+    documents = list(dict.fromkeys(documents))
+    if not documents:
+        return jsonify({'error': 'Keine Dokumente angegeben', 'status': 'error'}), 400
+    if len(documents) > app.config['BATCH_ANALYSIS_MAX_DOCUMENTS']:
+        return jsonify({
+            'error': f"Maximal {app.config['BATCH_ANALYSIS_MAX_DOCUMENTS']} Dokumente pro Anfrage",
+            'status': 'error'
+        }), 400
+
+    def generate():
+        workers = min(app.config['BATCH_ANALYSIS_WORKERS'], len(documents))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-analysis')
+        try:
+            futures = [executor.submit(analyze_batch_document, filename) for filename in documents]
+            for future in as_completed(futures):
+                yield json.dumps(future.result(), ensure_ascii=False) + '\n'
+        finally:
+            # Bei Verbindungsabbruch noch nicht gestartete Dokumente verwerfen
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Extraktionsaufträge gestreamter Uploads, unabhängig von den Web-Workern
+upload_jobs = UploadJobs(workers=app.config['UPLOAD_JOB_WORKERS'])
+atexit.register(upload_jobs.stop)
+
+def upload_filename(name):
+    """Sicherer Dateiname eines gestreamten Uploads; None, wenn es keine PDF ist"""
+    filename = secure_filename(name or '')
+    return filename if filename.lower().endswith('.pdf') else None
+
+# Unterordner für laufende Uploads: cleanup_inactive() löscht nur Dateien direkt im Upload-Ordner
+UPLOAD_STAGING_FOLDER = os.path.join(app.config['UPLOAD_FOLDER'], '.incoming')
+os.makedirs(UPLOAD_STAGING_FOLDER, exist_ok=True)
+
+def open_upload(filename):
+    """UploadWriter für einen gestreamten Upload; die Ziel-PDF ist schon vor dem ersten Block als aktiv markiert"""
+    # Sonst könnte eine parallele Bereinigung die gerade umbenannte PDF vor der Extraktion löschen
+    temp_storage.add_file(filename)
+    return UploadWriter(app.config['UPLOAD_FOLDER'], filename, app.config['MAX_CONTENT_LENGTH'], UPLOAD_STAGING_FOLDER)
+
+def start_upload_job(filename, document_hash, size):
+    """Vollständig gespeicherte PDF zur Extraktion und Analyse einreihen"""
+    return upload_jobs.submit(filename, document_hash, size, lambda: analyze_batch_document(filename, document_hash))
+
+@app.route('/upload/stream', methods=['POST', 'PUT'])
+def upload_stream():
+    """Nimmt eine PDF als rohen Request-Body an, schreibt sie blockweise auf die Platte und antwortet mit 202
+
+    Dateiname über ?filename= oder den Header X-Filename. Unter ASGI (asgi.py) übernimmt
+    die asynchrone Variante diese Route, damit langsame Uploads keinen Worker belegen.
+    """
+    filename = upload_filename(request.args.get('filename') or request.headers.get('X-Filename'))
+    if not filename:
+        return jsonify({'error': 'Dateiname einer PDF erforderlich (?filename=...)', 'status': 'error'}), 400
+    writer = open_upload(filename)
+    try:
+        for chunk in iter(lambda: request.stream.read(CHUNK_SIZE), b''):
+            writer.write(chunk)
+        document_hash = writer.commit()
+    except UploadTooLarge as e:
+        writer.abort()
+        return jsonify({'error': str(e), 'status': 'error'}), 413
+    except Exception:
+        writer.abort()
+        raise
+    job = start_upload_job(filename, document_hash, writer.size)
+    job['status_url'] = url_for('upload_job_status', job_id=job['id'])
+    return jsonify(job), 202
+
+@app.route('/upload/jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    """Status eines Upload-Auftrags (queued, running, done, error) mit dem Analyse-Ergebnis"""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Auftrag nicht gefunden', 'status': 'error'}), 404
+    return jsonify(job)
+
+@app.route('/upload/stats', methods=['GET'])
+def upload_stats():
+    """Zähler der gestreamten Uploads (Aufträge, empfangene Bytes, wartend/laufend)"""
+    return jsonify(upload_jobs.stats())
 
 def analyze_freedom(codes, auflagen_db, vehicle_info, wheel_tire_info):
     """Analysiert, ob eine Rad/Reifenkombination eintragungsfrei ist"""
-    # Definiere Codes die auf Eintragungsfreiheit hindeuten
-    freedom_positive = ['A02', 'A08']  # Codes, die explizit Eintragungsfreiheit bestätigen
-    
-    # Codes die auf Eintragungspflicht hindeuten
-    freedom_negative = ['A01', 'A03']  # Codes, die explizit Eintragung erfordern
-    
-    # Codes die neutral sind oder von Bedingungen abhängen
-    freedom_conditional = ['A04', 'A05', 'A06', 'A07', 'A09', 'A10', 'A11', 'A14', 'A15']
-    
-    # Bewertungsmechanismus
-    reasons = []
-    rating = 0  # -100 bis 100, wobei >0 eintragungsfrei bedeutet
-    
-    # Analysiere gefundene Codes
-    condition_codes = []
+    # Kompilierter Regelsatz aus der Datenbank (Gewichte pro Code, Konfliktpaare)
+    rules = get_rule_set()
     
-    for code in codes:
-        impact = "neutral"
-        description = auflagen_db.get(code, "Keine Beschreibung verfügbar")
-        
-        if code in freedom_positive:
-            impact = "positive"
-            rating += 40
-            reasons.append({
-                "type": "positive", 
-                "text": f"Code {code} weist auf Eintragungsfreiheit hin: {description}"
-            })
-        elif code in freedom_negative:
-            impact = "negative"
-            rating -= 50
-            reasons.append({
-                "type": "negative", 
-                "text": f"Code {code} weist auf Eintragungspflicht hin: {description}"
-            })
-        elif code in freedom_conditional:
-            impact = "neutral"
-            # Kein Rating-Änderung, aber Hinweis
-            reasons.append({
-                "type": "neutral", 
-                "text": f"Code {code} benötigt weitere Bewertung: {description}"
-            })
-        else:
-            # Unbekannter Code
-            reasons.append({
-                "type": "neutral", 
-                "text": f"Code {code} konnte nicht bewertet werden: {description}"
-            })
-        
-        condition_codes.append({
-            "code": code,
-            "description": description,
-            "impact": impact
-        })
+    # Bewertungsmechanismus: Rating von -100 bis 100, wobei >0 eintragungsfrei bedeutet
+    rating, reasons, condition_codes = rules.evaluate_codes(codes, auflagen_db)
     
     # Weitere Analysen basierend auf Fahrzeugdaten
     if not codes:
@@ -911,12 +1546,18 @@ def analyze_freedom(codes, auflagen_db, vehicle_info, wheel_tire_info):
         })
         rating -= 10
     
+    # Widersprüchliche Codes laut Regel-Tabelle
+    conflicts = rules.find_conflicts(codes)
     if 'A02' in codes and 'A03' in codes:  # Lasse die zeile unverändert
+        # Konflikt kommt aus der Regel-Tabelle (beim ersten Start mit DEFAULT_CONFLICTS befüllt)
+        pass
+    
+    for _, _, rating_penalty, _, message in conflicts:
         reasons.append({
             "type": "negative",
-            "text": "Widersprüchliche Codes gefunden (A02 und A03) - im Zweifelsfall ist Eintragung erforderlich"
+            "text": message
         })
-        rating -= 30
+        rating -= rating_penalty
     
     # Berechne Zuverlässigkeit
     base_confidence = 70  # Basiswert
@@ -927,8 +1568,7 @@ def analyze_freedom(codes, auflagen_db, vehicle_info, wheel_tire_info):
     confidence = base_confidence + codes_factor
     
     # Bei widersprüchlichen Codes sinkt die Zuverlässigkeit
-    if 'A02' in codes and 'A03' in codes:
-        confidence -= 20
+    confidence -= sum(conflict[3] for conflict in conflicts)
     
     # Begrenze auf 0-100%
     confidence = max(0, min(confidence, 100))
@@ -958,60 +1598,26 @@ def export_analysis(filename):
     
     # Hier die gleiche Analyse wie in analyze_registration_freedom durchführen
     try:
-        pdf_filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(pdf_filepath):
+        if not has_document(filename):
             return 'PDF Datei nicht gefunden', 404
         
-        # Sammle verfügbare Tabellendateien für diese PDF
+        # Sammle verfügbare Tabellen für diese PDF (Dateien oder in der Datenbank gespeicherte)
         pdf_id = os.path.splitext(filename)[0]
         table_files = []
-        for file in os.listdir(app.config['UPLOAD_FOLDER']):
+        for file in extracted_table_names(pdf_id):
             if file.startswith(f"{pdf_id}_table_") and (file.endswith('.csv') or file.endswith('.xlsx')):  # lasse die zeile unverändert
                 table_files.append(file)
                 
         if not table_files:
             return 'Keine extrahierten Tabellen gefunden', 404
-            
-        # Analysiere Tabellendaten
-        vehicle_info = {}
-        wheel_tire_info = {}
-        
-        # Auflagencodes aus Datenbank laden
-        with app.app_context():
-            auflagen_db = {code.code: code.description for code in AuflagenCode.query.all()}
         
-        auflagencodes_found = []
-        
-        # Analysiere alle Tabellendateien
-        for table_file in table_files:
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], table_file)
-            if not os.path.exists(filepath):
-                continue
-                
-            if filepath.endswith('.csv'):
-                df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
-            else:  # Excel-Datei
-                df = pd.read_excel(filepath)
-                
-            df = df.fillna('')
-            df = df.astype(str)
-            
-            # Extrahiere Daten
-            if vehicle_info == {}:
-                vehicle_info = extract_vehicle_info(df)
-            
-            if wheel_tire_info == {}:
-                wheel_tire_info = extract_wheel_tire_info(df)
-            
-            codes = find_condition_codes(df)
-            auflagencodes_found.extend(codes)
-        
-        # Dedupliziere und sortiere Codes
-        auflagencodes_found = sorted(list(set(auflagencodes_found)))
-        
-        # Analyse durchführen
-        is_free, confidence, reasons, condition_codes, analysis_summary = analyze_freedom(
-            auflagencodes_found, auflagen_db, vehicle_info, wheel_tire_info)
+        # Gespeichertes Analyse-Ergebnis wiederverwenden
+        analysis = get_analysis(filename)
+        is_free = analysis['is_free']
+        confidence = analysis['confidence']
+        reasons = analysis['analysis_reasons']
+        condition_codes = analysis['condition_codes']
+        analysis_summary = analysis['analysis_summary']
         
         # PDF-Exportlogik hier, gekürzt um Platz zu sparen
         if format_type == 'pdf':
@@ -1028,6 +1634,8 @@ def export_analysis(filename):
         
         return "Format nicht unterstützt", 400
             
+    except DocumentNotFound:
+        return 'PDF Datei nicht gefunden', 404
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -1038,55 +1646,42 @@ def export_analysis(filename):
 def results(filename):
     """Rendert die Ergebnis-Seite für bereits extrahierte PDF-Dateien"""
     try:
-        pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if not os.path.exists(pdf_path):
+        if not has_document(filename):
             return 'PDF Datei nicht gefunden', 404
         
-        # Sammle verfügbare Tabellendateien für diese PDF
+        # Sammle verfügbare Tabellen für diese PDF (nach Neustart oder Bereinigung aus der Datenbank)
         pdf_id = os.path.splitext(filename)[0]
+        tables = dict(load_extracted_tables(pdf_id))
         results = []
         table_htmls = []
         
         # Finde alle generierten CSV/Excel-Dateien
-        for file in os.listdir(app.config['UPLOAD_FOLDER']):
+        for file in tables:
             if file.startswith(f"{pdf_id}_table_") and (file.endswith('.csv') or file.endswith('.xlsx')):   # lasse die zeile unverändert
                 results.append(file)
                 
-                # Lade den Inhalt für die Vorschau
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], file)
-                if filepath.endswith('.csv'):
-                    df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
-                else:  # Excel-Datei
-                    df = pd.read_excel(filepath)
-                    
-                df = df.fillna('')
-                df = df.astype(str)
-                table_htmls.append(convert_table_to_html(df))
+                # Vorschau aus der bereits geladenen Tabelle
+                table_htmls.append(convert_table_to_html(tables[file]))
         
         # Lade zugehörige Auflagencodes
         condition_codes = []
         with app.app_context():
-            # Suche nach Codes in den Tabellen
-            auflagencodes_found = []
-            for file in results:
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], file)
-                if filepath.endswith('.csv'):
-                    df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
-                else:  # Excel-Datei
-                    df = pd.read_excel(filepath)
-                df = df.fillna('')
-                df = df.astype(str)
-                codes = find_condition_codes(df)
-                auflagencodes_found.extend(codes)
+            # Bei der Extraktion gespeicherte Codes (indizierte Abfrage über document_id)
+            auflagencodes_found = document_codes(pdf_id)
+            if auflagencodes_found is None:
+                # Ältere Extraktion ohne Datenbankeintrag: nach bekannten Codes in den Tabellen suchen
+                code_matcher = get_code_matcher()
+                auflagencodes_found = []
+                for file in results:
+                    codes = code_matcher.find_in_frame(tables[file])
+                    auflagencodes_found.extend(codes)
             
             # Deduplizieren
             auflagencodes_found = sorted(list(set(auflagencodes_found)))
             
-            # Hole Beschreibungen
-            for code in auflagencodes_found:
-                db_code = AuflagenCode.query.filter_by(code=code).first()
-                if db_code:
-                    condition_codes.append(db_code)
+            # Hole Beschreibungen mit einem SELECT ... IN statt einer Abfrage pro Code
+            db_codes = fetch_codes(auflagencodes_found)
+            condition_codes = [db_codes[code] for code in auflagencodes_found if code in db_codes]
         
         return render_template('results.html', 
                             files=results, 
@@ -0,0 +1,83 @@
+"""ASGI-Einstieg: Flask-App über asgiref, gestreamte Uploads direkt im Event-Loop
+
+Start z.B. mit:
+    uvicorn asgi:application --host 0.0.0.0 --port 5050
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, logger, upload_filename, open_upload, start_upload_job
+from upload_stream import UploadTooLarge
+
+UPLOAD_PATH = '/upload/stream'
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class StreamingUploadApp:
+    """Leitet /upload/stream an einen asynchronen Handler, alle anderen Anfragen an die Flask-App
+
+    Der Request-Body wird blockweise geschrieben und gehasht, während er eintrifft; ein
+    langsamer Upload belegt dabei weder einen WSGI-Thread noch einen Extraktionsplatz.
+    Erst die vollständige PDF wird an die Extraktionsaufträge übergeben.
+    """
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == UPLOAD_PATH and scope['method'] in ('POST', 'PUT'):
+            await self.upload(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def upload(self, scope, receive, send):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        filename = upload_filename((query.get('filename') or [None])[0] or headers.get('x-filename'))
+        if not filename:
+            await send_json(send, 400, {'error': 'Dateiname einer PDF erforderlich (?filename=...)', 'status': 'error'})
+            return
+        max_bytes = self.flask_app.config['MAX_CONTENT_LENGTH']
+        if max_bytes and int(headers.get('content-length') or 0) > max_bytes:
+            await send_json(send, 413, {'error': f"Upload größer als {max_bytes // (1024 * 1024)} MB", 'status': 'error'})
+            return
+
+        writer = await asyncio.to_thread(open_upload, filename)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    logger.warning(f"Upload von {filename} abgebrochen ({writer.size} Bytes empfangen)")
+                    await asyncio.to_thread(writer.abort)
+                    return
+                # Schreiben im Thread, damit eine langsame Platte den Event-Loop nicht aufhält
+                await asyncio.to_thread(writer.write, message.get('body', b''))
+                if not message.get('more_body', False):
+                    break
+            document_hash = await asyncio.to_thread(writer.commit)
+        except UploadTooLarge as e:
+            await asyncio.to_thread(writer.abort)
+            await send_json(send, 413, {'error': str(e), 'status': 'error'})
+            return
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
+
+        job = start_upload_job(filename, document_hash, writer.size)
+        job['status_url'] = f"{scope.get('root_path', '')}/upload/jobs/{job['id']}"
+        await send_json(send, 202, job)
+
+
+application = StreamingUploadApp(app)
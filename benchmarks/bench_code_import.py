@@ -0,0 +1,65 @@
+"""Benchmark: Massenimport von Auflagen-Codes (CSV und JSON) in gebündelten Transaktionen
+
+Läuft gegen eine SQLite-Datenbank im Speicher, die produktive auflagen.db bleibt unberührt.
+Aufruf aus dem Projektverzeichnis:
+    python benchmarks/bench_code_import.py [--rows N] [--batch-size N]
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from extensions import db
+from models import AuflagenCode
+from code_catalog import iter_csv_rows, iter_json_rows, import_codes, export_csv
+
+
+def csv_file(rows):
+    lines = ['code;description\n'] + [f'C{i:06d};"Auflage {i}; Text"\n' for i in range(rows)]
+    return io.BytesIO(''.join(lines).encode('utf-8-sig'))
+
+
+def json_file(rows):
+    return io.BytesIO(json.dumps([{'code': f'J{i:06d}', 'description': f'Auflage {i}'} for i in range(rows)]).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000, help='Anzahl Einträge je Datei')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Codes pro Transaktion')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        for name, make_file, reader in (('CSV', csv_file, iter_csv_rows), ('JSON', json_file, iter_json_rows)):
+            stream = make_file(args.rows)
+            start = time.perf_counter()
+            stats = import_codes(reader(stream), args.batch_size)
+            elapsed = time.perf_counter() - start
+            assert stats['imported'] == args.rows and not stats['invalid'], stats
+            print(f"{name}:  {stats['imported']} Codes in {stats['batches']} Transaktionen, "
+                  f"{elapsed:.2f} s ({args.rows / elapsed:,.0f} Codes/s)")
+
+        # Zweiter Import derselben Datei ändert nichts (Beschreibungen unverändert)
+        start = time.perf_counter()
+        import_codes(iter_csv_rows(csv_file(args.rows)), args.batch_size)
+        print(f"CSV erneut: {time.perf_counter() - start:.2f} s")
+
+        start = time.perf_counter()
+        exported = sum(len(chunk) for chunk in export_csv())
+        total = db.session.query(AuflagenCode).count()
+        print(f"Export: {total} Codes, {exported / 1024:,.0f} KiB in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
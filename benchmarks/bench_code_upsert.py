@@ -0,0 +1,140 @@
+"""Benchmark: SQL-Anweisungen pro Extraktion, Einzelabfragen (alt) vs. Bulk-Upsert und IN-Abfrage (neu)
+
+Läuft gegen eine SQLite-Datenbank im Speicher, die produktive auflagen.db bleibt unberührt.
+Aufruf aus dem Projektverzeichnis:
+    python benchmarks/bench_code_upsert.py [PDF ...] [--seed N]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+
+from extensions import db
+from models import AuflagenCode
+from code_store import fetch_codes
+from pdf_extractor import process_pdf_without_java, extract_auflagen_codes
+from utils import AUFLAGEN_TEXTE, find_codes_in_columns
+from column_roles import columns_with_role, CONDITIONS, TIRE_CONDITIONS
+
+
+class StatementCounter:
+    """Zählt die an die Datenbank gesendeten Anweisungen (executemany zählt einmal)"""
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def measure(self, func, *args):
+        start_count = self.count
+        start = time.perf_counter()
+        result = func(*args)
+        return result, self.count - start_count, time.perf_counter() - start
+
+
+def legacy_extract_auflagen_codes(tables, app, extracted_texts):
+    """Bisherige Implementierung: alle Codes laden, einfügen, committen, dann filter_by pro Code"""
+    codes = set()
+    for table in tables:
+        table_str = table.astype(str)
+        codes.update(find_codes_in_columns(table_str, columns_with_role(table_str, CONDITIONS, TIRE_CONDITIONS)))
+    with app.app_context():
+        existing_codes = set(code.code for code in AuflagenCode.query.all())
+        for code in codes - existing_codes:
+            description = extracted_texts.get(code) or AUFLAGEN_TEXTE.get(code, "Keine Beschreibung verfügbar")
+            db.session.add(AuflagenCode(code=code, description=description))
+        db.session.commit()
+    codes_with_text = {
+        code: extracted_texts.get(code, AUFLAGEN_TEXTE.get(code, "Keine Beschreibung verfügbar")) for code in codes
+    }
+    with app.app_context():
+        for code, description in codes_with_text.items():
+            existing_code = AuflagenCode.query.filter_by(code=code).first()
+            if existing_code:
+                if existing_code.description != description:
+                    existing_code.description = description
+            else:
+                db.session.add(AuflagenCode(code=code, description=description))
+        db.session.commit()
+    return sorted(codes)
+
+
+def legacy_fetch(app, codes):
+    with app.app_context():
+        return [code for code in (AuflagenCode.query.filter_by(code=c).first() for c in codes) if code]
+
+
+def new_fetch(app, codes):
+    with app.app_context():
+        found = fetch_codes(codes)
+        return [found[code] for code in codes if code in found]
+
+
+def snapshot(app):
+    with app.app_context():
+        return dict(db.session.query(AuflagenCode.code, AuflagenCode.description))
+
+
+def reset(app, seed):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(AuflagenCode(code=f"Z{i:03d}", description=f"Seed {i}") for i in range(seed))
+        # Ein Teil der später gefundenen Codes existiert bereits mit abweichendem Text
+        db.session.add_all(AuflagenCode(code=code, description='veraltet') for code in ('A12', 'A14', 'T89'))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdfs', nargs='*', help='PDF-Dateien (Standard: uploads/*.pdf)')
+    parser.add_argument('--seed', type=int, default=350, help='Anzahl bereits gespeicherter Codes')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join('uploads', '*.pdf')))
+    extracted_texts = {'A12': 'Text aus dem Gutachten'}
+    for pdf in pdfs:
+        tables = process_pdf_without_java(pdf)
+
+        reset(app, args.seed)
+        legacy_codes, legacy_statements, legacy_time = counter.measure(
+            legacy_extract_auflagen_codes, tables, app, extracted_texts)
+        legacy_state = snapshot(app)
+
+        reset(app, args.seed)
+        new_codes, new_statements, new_time = counter.measure(
+            extract_auflagen_codes, tables, app, pdf, None, extracted_texts)
+        new_state = snapshot(app)
+
+        assert new_codes == legacy_codes, 'Unterschiedliche Codes'
+        assert new_state == legacy_state, 'Unterschiedlicher Datenbankinhalt'
+        # Bulk-Upsert: ein INSERT ... ON CONFLICT für alle Codes (executemany) plus
+        # Versionszeile der Code-Tabelle (Existenzprüfung, SELECT, UPDATE) - unabhängig von der Code-Anzahl
+        assert new_statements <= 5, f'Zu viele Anweisungen: {new_statements}'
+
+        legacy_rows, legacy_fetch_statements, _ = counter.measure(legacy_fetch, app, new_codes)
+        new_rows, new_fetch_statements, _ = counter.measure(new_fetch, app, new_codes)
+        assert [row.code for row in new_rows] == [row.code for row in legacy_rows]
+        assert new_fetch_statements == 1, f'Zu viele Anweisungen: {new_fetch_statements}'
+
+        print(f"{os.path.basename(pdf)}: {len(new_codes)} Codes")
+        print(f"  Extraktion: alt {legacy_statements:4d} Anweisungen ({legacy_time * 1000:7.1f} ms), "
+              f"neu {new_statements:4d} Anweisungen ({new_time * 1000:7.1f} ms)")
+        print(f"  /results:   alt {legacy_fetch_statements:4d} Anweisungen, neu {new_fetch_statements:4d} Anweisungen")
+
+
+if __name__ == '__main__':
+    main()
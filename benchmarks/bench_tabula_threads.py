@@ -0,0 +1,88 @@
+"""Benchmark: gleichzeitige tabula-Extraktionen aus 8-16 Threads, Prozess-JVM vs. "java"-Unterprozesse
+
+Benötigt Java. Aufruf aus dem Projektverzeichnis:
+    python benchmarks/bench_tabula_threads.py [PDF ...] [--threads 8 16] [--rounds N] [--max-concurrency N]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tabula
+
+from tabula_runtime import TabulaRuntime
+
+READ_OPTIONS = dict(pages='all', multiple_tables=True, lattice=True, guess=False, silent=True)
+
+
+def extract_in_process(runtime, pdf):
+    return runtime.read_pdf(pdf, **READ_OPTIONS)
+
+
+def extract_subprocess(runtime, pdf):
+    return tabula.read_pdf(pdf, force_subprocess=True, **READ_OPTIONS)
+
+
+def shapes(tables):
+    return [table.shape for table in tables]
+
+
+def run(extract, runtime, pdfs, threads, rounds):
+    """Führt rounds Extraktionen je PDF auf threads Threads aus; liefert (Sekunden, Ergebnisse, Threads)"""
+    jobs = [pdf for _ in range(rounds) for pdf in pdfs]
+    seen_threads = set()
+
+    def job(pdf):
+        seen_threads.add(threading.get_ident())
+        return pdf, shapes(extract(runtime, pdf))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(job, jobs))
+    return time.perf_counter() - start, results, len(seen_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdfs', nargs='*', help='PDF-Dateien (Standard: uploads/*.pdf)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[8, 16], help='Thread-Anzahlen')
+    parser.add_argument('--rounds', type=int, default=4, help='Extraktionen je PDF und Lauf')
+    parser.add_argument('--max-concurrency', type=int, default=1, help='Gleichzeitige tabula-Aufrufe in der JVM')
+    parser.add_argument('--skip-subprocess', action='store_true', help='Vergleich mit Unterprozessen auslassen')
+    args = parser.parse_args()
+
+    runtime = TabulaRuntime(max_concurrency=args.max_concurrency)
+    start = time.perf_counter()
+    if not runtime.start():
+        sys.exit(f"Prozess-JVM nicht verfügbar: {runtime.error}")
+    print(f"JVM-Start: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join('uploads', '*.pdf')))
+    # Referenz aus einem Thread; zugleich Aufwärmen der Klassen
+    reference = {pdf: shapes(extract_in_process(runtime, pdf)) for pdf in pdfs}
+
+    for threads in args.threads:
+        elapsed, results, used = run(extract_in_process, runtime, pdfs, threads, args.rounds)
+        assert all(result == reference[pdf] for pdf, result in results), 'Abweichende Tabellen bei paralleler Extraktion'
+        stats = runtime.stats()
+        print(f"{threads:2d} Threads, Prozess-JVM:     {len(results)} Extraktionen in {elapsed:6.2f} s "
+              f"({len(results) / elapsed:5.2f}/s), {used} Threads, max. parallel {stats['max_parallel']}, "
+              f"Fehler {stats['errors']}")
+    print(f"Angehängte Threads: {runtime.stats()['attached_threads']}")
+
+    # force_subprocess ersetzt das Backend von tabula-py, daher erst nach allen JVM-Läufen
+    if not args.skip_subprocess:
+        for threads in args.threads:
+            elapsed, results, _ = run(extract_subprocess, runtime, pdfs, threads, args.rounds)
+            assert all(result == reference[pdf] for pdf, result in results), 'Abweichende Tabellen im Unterprozess'
+            print(f"{threads:2d} Threads, java-Unterprozess: {len(results)} Extraktionen in {elapsed:6.2f} s "
+                  f"({len(results) / elapsed:5.2f}/s)")
+
+
+if __name__ == '__main__':
+    main()
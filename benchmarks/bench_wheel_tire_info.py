@@ -0,0 +1,141 @@
+"""Benchmark: Rad/Reifen- und Fahrzeugangaben mit Einzelsuchen (alt) vs. kombiniertem Durchlauf (neu)
+
+Aufruf aus dem Projektverzeichnis:
+    python benchmarks/bench_wheel_tire_info.py [PDF ...] [--repeat N] [--scale N]
+"""
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from pdf_extractor import process_pdf_without_java
+from utils import extract_vehicle_info, extract_wheel_tire_info
+
+
+def legacy_extract_vehicle_info(df):
+    """Bisherige Implementierung: unique() pro Spalte und Alternative"""
+    vehicle_info = {}
+    key_columns = {
+        'fahrzeug': ['fzg', 'fahrzeugtyp', 'typ', 'modell', 'vehicle'],
+        'hersteller': ['manufacturer', 'marke', 'fabrikat'],
+        'typ': ['type', 'fahrzeugtyp', 'typen', 'modell']
+    }
+    normalized_columns = {col.lower().strip(): col for col in df.columns}
+    for target, alternatives in key_columns.items():
+        for alt in [target] + alternatives:
+            for col in normalized_columns:
+                if alt in col:
+                    values = df[normalized_columns[col]].unique()
+                    for val in values:
+                        if isinstance(val, str) and len(val) > 2 and val.lower() != 'nan':
+                            vehicle_info[target.capitalize()] = val
+                            break
+    return vehicle_info
+
+
+def legacy_extract_wheel_tire_info(df):
+    """Bisherige Implementierung: re.search pro Muster × Spalte × Zelle"""
+    wheel_tire_info = {}
+    key_patterns = {
+        'Reifengröße': ['reifen', 'tire', 'dimension', 'größe', 'size', 'reifentyp'],
+        'Felgengröße': ['felge', 'rim', 'wheel', 'alufelge', 'räder', 'zoll'],
+        'Einpresstiefe': ['et', 'offset', 'einpress', 'einpresstiefe'],
+        'Hersteller': ['hersteller', 'manufacturer', 'producer', 'marke', 'brand'],
+        'Tragfähigkeit': ['load', 'traglast', 'tragfähigkeit', 'last', 'gewicht', 'kg'],
+        'Geschwindigkeitsindex': ['speed', 'geschwindigkeit', 'index', 'km/h', 'si']
+    }
+    normalized_columns = {col.lower().strip().replace('-', '').replace('_', ''): col for col in df.columns}
+    patterns = {
+        'Reifengröße': r'(\d{3}/\d{2}[R]\d{2})',
+        'Felgengröße': r'(\d{1,2}[,.]\d{1}[Jx]?\d{2})',
+        'Einpresstiefe': r'ET\s*(\d{1,2})',
+    }
+    for key, pattern in patterns.items():
+        if key not in wheel_tire_info:
+            for col in df.columns:
+                for value in df[col].astype(str):
+                    match = re.search(pattern, value, re.IGNORECASE)
+                    if match:
+                        wheel_tire_info[key] = match.group(0)
+                        break
+                if key in wheel_tire_info:
+                    break
+    for target, pats in key_patterns.items():
+        if target not in wheel_tire_info:
+            for pattern in pats:
+                for col in normalized_columns:
+                    if pattern in col:
+                        values = df[normalized_columns[col]].astype(str).unique()
+                        for val in values:
+                            if len(val) > 2 and val.lower() not in ['nan', '', 'none']:
+                                wheel_tire_info[target] = val
+                                break
+                        if target in wheel_tire_info:
+                            break
+                if target in wheel_tire_info:
+                    break
+    if 'Einpresstiefe' in wheel_tire_info:
+        et_val = wheel_tire_info['Einpresstiefe']
+        if 'et' in et_val.lower():
+            et_match = re.search(r'(?:et)\s*(\d+)', et_val.lower())
+            if et_match:
+                wheel_tire_info['Einpresstiefe'] = f"ET {et_match.group(1)}"
+    return wheel_tire_info
+
+
+def best_of(func, tables, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for df in tables:
+            func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdfs', nargs='*', help='PDF-Dateien (Standard: uploads/*.pdf)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=int, default=20, help='Zeilen-Vervielfachung für große Tabellen')
+    args = parser.parse_args()
+
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join('uploads', '*.pdf')))
+    tables = []
+    for pdf in pdfs:
+        extracted = process_pdf_without_java(pdf)
+        print(f"{pdf}: {len(extracted)} Tabellen")
+        tables.extend(df.fillna('').astype(str) for df in extracted)
+    if not tables:
+        print("Keine Tabellen gefunden")
+        return 1
+
+    # Ergebnisse müssen identisch sein (inkl. Schlüsselreihenfolge)
+    for df in tables:
+        assert list(legacy_extract_wheel_tire_info(df).items()) == list(extract_wheel_tire_info(df).items())
+        assert list(legacy_extract_vehicle_info(df).items()) == list(extract_vehicle_info(df).items())
+
+    # Große Tabellen: gesuchte Werte stehen erst am Ende (ungünstigster Fall für die Einzelsuche)
+    scaled = [pd.concat([df.iloc[::-1]] * args.scale + [df], ignore_index=True) for df in tables]
+    cells = sum(df.size for df in scaled)
+    print(f"{len(scaled)} Tabellen, {cells} Zellen (x{args.scale}), best of {args.repeat}")
+
+    for name, legacy, current in (
+        ('extract_wheel_tire_info', legacy_extract_wheel_tire_info, extract_wheel_tire_info),
+        ('extract_vehicle_info', legacy_extract_vehicle_info, extract_vehicle_info),
+    ):
+        for df in scaled:
+            assert list(legacy(df).items()) == list(current(df).items())
+        old = best_of(legacy, scaled, args.repeat)
+        new = best_of(current, scaled, args.repeat)
+        print(f"{name}: alt {old * 1000:8.1f} ms, neu {new * 1000:8.1f} ms, Speedup {old / new:5.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import codecs
+import csv
+import io
+import json
+import re
+
+from sqlalchemy import func, or_, select
+
+from extensions import db
+from models import AuflagenCode
+from code_store import write_codes
+
+# Spaltenbreite von auflagen_codes.code
+CODE_VALIDATION_PATTERN = re.compile(r'^[A-Za-z0-9]{1,10}$')
+IMPORT_BATCH_SIZE = 5000
+EXPORT_BATCH_SIZE = 2000
+# Mehr Fehlermeldungen helfen beim Korrigieren einer Datei nicht weiter
+MAX_REPORTED_ERRORS = 100
+READ_CHUNK_SIZE = 64 * 1024
+
+# Sortierbare Spalten der Verwaltungstabelle (DataTables-Spaltenindex)
+LISTING_COLUMNS = (AuflagenCode.code, AuflagenCode.description, AuflagenCode.updated_at)
+
+
+def _text_chunks(stream, encoding='utf-8-sig'):
+    """Liest einen Byte- oder Text-Stream blockweise als Text"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _text_lines(stream):
+    buffer = ''
+    for chunk in _text_chunks(stream):
+        buffer += chunk
+        lines = buffer.splitlines(keepends=True)
+        # Letzte Zeile kann unvollständig sein
+        buffer = lines.pop() if lines and not lines[-1].endswith(('\n', '\r')) else ''
+        yield from lines
+    if buffer:
+        yield buffer
+
+
+def iter_csv_rows(stream):
+    """Streamt (Zeilennummer, Code, Beschreibung) aus einer CSV mit Kopfzeile (Trennzeichen ; oder ,)
+
+    Ohne Kopfzeile "code;description" werden die ersten beiden Spalten verwendet.
+    """
+    lines = _text_lines(stream)
+    first = next(lines, None)
+    if first is None:
+        return
+    delimiter = ';' if first.count(';') >= first.count(',') else ','
+    header = [cell.strip().lower() for cell in next(csv.reader([first], delimiter=delimiter))]
+    if 'code' in header:
+        code_col = header.index('code')
+        desc_col = next((header.index(name) for name in ('description', 'beschreibung', 'text') if name in header), 1)
+        start = 2
+    else:
+        code_col, desc_col = 0, 1
+        lines = _chain_first(first, lines)
+        start = 1
+    for line_number, row in enumerate(csv.reader(lines, delimiter=delimiter), start):
+        if not any(cell.strip() for cell in row):
+            continue
+        code = row[code_col] if len(row) > code_col else ''
+        description = row[desc_col] if len(row) > desc_col else ''
+        yield line_number, code, description
+
+
+def _chain_first(first, lines):
+    yield first
+    yield from lines
+
+
+def iter_json_rows(stream):
+    """Streamt (Eintrag, Code, Beschreibung) aus einem JSON-Array von Objekten oder JSON Lines
+
+    Das Array wird Objekt für Objekt dekodiert, die Datei muss nicht vollständig in den Speicher.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _text_chunks(stream)
+    buffer = ''
+    position = 0
+    number = 0
+    exhausted = False
+    while True:
+        # Array-Klammern und Trennzeichen zwischen den Objekten überspringen
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        item = None
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise ValueError(f"Ungültiges JSON nach Eintrag {number}")
+        elif exhausted:
+            return
+        if item is None:
+            # Objekt unvollständig (oder Puffer leer): nächsten Block anhängen
+            chunk = next(chunks, None)
+            buffer = buffer[position:] + (chunk or '')
+            position = 0
+            exhausted = chunk is None
+            continue
+        position = end
+        number += 1
+        if not isinstance(item, dict):
+            raise ValueError(f"Eintrag {number} ist kein Objekt")
+        yield number, item.get('code', ''), item.get('description', item.get('beschreibung', ''))
+
+
+def validate_code(code, description):
+    """Bereinigt einen Eintrag; liefert (Code, Beschreibung) oder eine Fehlermeldung"""
+    code = str(code or '').strip()
+    description = str(description or '').strip()
+    if not CODE_VALIDATION_PATTERN.match(code):
+        return None, f"Ungültiger Code: {code[:20]!r}"
+    if not description:
+        return None, f"Code {code} ohne Beschreibung"
+    return (code, description), None
+
+
+def import_codes(rows, batch_size=IMPORT_BATCH_SIZE):
+    """Validiert und schreibt Einträge (Nummer, Code, Beschreibung) blockweise in je einer Transaktion
+
+    Ein fehlerhafter Eintrag bricht den Import nicht ab, er wird gezählt und gemeldet.
+    Liefert die Statistik des Imports.
+    """
+    stats = {'rows': 0, 'imported': 0, 'invalid': 0, 'batches': 0, 'errors': []}
+    batch = {}
+
+    def flush():
+        if not batch:
+            return
+        try:
+            write_codes(batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        stats['imported'] += len(batch)
+        stats['batches'] += 1
+        batch.clear()
+
+    for number, code, description in rows:
+        stats['rows'] += 1
+        entry, error = validate_code(code, description)
+        if error:
+            stats['invalid'] += 1
+            if len(stats['errors']) < MAX_REPORTED_ERRORS:
+                stats['errors'].append(f"Eintrag {number}: {error}")
+            continue
+        # Doppelte Codes in der Datei: letzter Eintrag gewinnt
+        batch[entry[0]] = entry[1]
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return stats
+
+
+def _iter_all_codes():
+    statement = select(AuflagenCode.code, AuflagenCode.description).order_by(AuflagenCode.code)
+    yield from db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+
+def export_csv():
+    """Streamt alle Codes als CSV (code;description), blockweise aus der Datenbank gelesen"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(['code', 'description'])
+    for count, (code, description) in enumerate(_iter_all_codes(), 1):
+        writer.writerow([code, description])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_json():
+    """Streamt alle Codes als JSON-Array von Objekten"""
+    yield '['
+    for count, (code, description) in enumerate(_iter_all_codes()):
+        prefix = ',\n' if count else '\n'
+        yield prefix + json.dumps({'code': code, 'description': description}, ensure_ascii=False)
+    yield '\n]\n'
+
+
+def query_codes(search='', order_column=0, descending=False, offset=0, limit=25):
+    """Seite der Code-Liste für die Verwaltungstabelle; liefert (Gesamtzahl, gefilterte Anzahl, Einträge)"""
+    total = db.session.execute(select(func.count(AuflagenCode.id))).scalar()
+    statement = select(AuflagenCode)
+    search = (search or '').strip()
+    if search:
+        pattern = f"%{search.replace('%', '').replace('_', '')}%"
+        statement = statement.where(or_(AuflagenCode.code.ilike(pattern), AuflagenCode.description.ilike(pattern)))
+        filtered = db.session.execute(select(func.count()).select_from(statement.subquery())).scalar()
+    else:
+        filtered = total
+    column = LISTING_COLUMNS[order_column] if 0 <= order_column < len(LISTING_COLUMNS) else AuflagenCode.code
+    statement = statement.order_by(column.desc() if descending else column.asc(), AuflagenCode.id)
+    codes = db.session.execute(statement.offset(offset).limit(limit)).scalars().all()
+    return total, filtered, codes
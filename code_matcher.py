@@ -0,0 +1,107 @@
+import hashlib
+import threading
+from collections import deque
+
+from code_store import code_cache
+from utils import AUFLAGEN_TEXTE, join_cell_text
+
+# Zeichen, die einen Code begrenzen dürfen ("A01 A12", "(A01)", "A01, A02; Lim.").
+# "/", "*", "-" gehören bewusst nicht dazu, sonst würden Teile von "245/40R19",
+# "e1*2001/116*0430" oder "65-190" als Codes erkannt.
+LEFT_BOUNDARY = set(' \t\r\n(,;[')
+RIGHT_BOUNDARY = set(' \t\r\n),;.:]')
+
+
+class CodeMatcher:
+    """Aho-Corasick-Automat über bekannte Auflagen-Codes (ein linearer Durchlauf pro Text)"""
+    def __init__(self, codes):
+        self.codes = frozenset(code for code in codes if code)
+        self._build()
+
+    def _build(self):
+        goto = [{}]
+        outputs = [[]]
+        for code in sorted(self.codes):
+            state = 0
+            for ch in code:
+                if ch not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][ch] = len(goto) - 1
+                state = goto[state][ch]
+            outputs[state].append(code)
+
+        # Fehlerlinks per Breitensuche; Übergänge zu einem vollständigen DFA auflösen
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            transitions = dict(delta[fail[state]])
+            for ch, target in goto[state].items():
+                fail[target] = delta[fail[state]].get(ch, 0)
+                transitions[ch] = target
+                queue.append(target)
+            delta[state] = transitions
+
+        self._delta = delta
+        self._outputs = outputs
+
+    def scan(self, text):
+        """Liefert (Startposition, Code) für alle begrenzten Vorkommen bekannter Codes"""
+        delta = self._delta
+        outputs = self._outputs
+        length = len(text)
+        state = 0
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            if not outputs[state]:
+                continue
+            if i + 1 < length and text[i + 1] not in RIGHT_BOUNDARY:
+                continue
+            for code in outputs[state]:
+                start = i - len(code) + 1
+                if start == 0 or text[start - 1] in LEFT_BOUNDARY:
+                    yield start, code
+
+    def find_codes(self, text):
+        """Menge der bekannten Codes in einem Text"""
+        return {code for _, code in self.scan(str(text))}
+
+    def find_in_frame(self, df, columns=None):
+        """Menge der bekannten Codes in den Zellen eines DataFrames"""
+        return self.find_codes(join_cell_text(df, columns))
+
+
+# Automat und Prüfsumme gelten für eine Version des Code-Caches (Version liegt in der DB)
+_matcher = None
+_matcher_version = -1
+_digest = None
+_digest_version = -1
+_lock = threading.Lock()
+
+
+def get_code_matcher():
+    """Gibt den Automaten zurück und baut ihn nach Änderungen an der Code-Tabelle neu (App-Kontext nötig)"""
+    global _matcher, _matcher_version
+    snapshot = code_cache.get()
+    with _lock:
+        if _matcher is None or _matcher_version != snapshot.version:
+            _matcher = CodeMatcher(snapshot.codes | set(AUFLAGEN_TEXTE))
+            _matcher_version = snapshot.version
+        return _matcher
+
+
+def get_codes_version():
+    """Prüfsumme über Codes und Beschreibungen; ändert sich mit jedem Update der Code-Tabelle"""
+    global _digest, _digest_version
+    snapshot = code_cache.get()
+    with _lock:
+        if _digest is None or _digest_version != snapshot.version:
+            digest = hashlib.sha1()
+            for code in sorted(snapshot.descriptions):
+                digest.update(f"{code}\x1f{snapshot.descriptions[code]}\x1e".encode('utf-8'))
+            _digest = digest.hexdigest()
+            _digest_version = snapshot.version
+        return _digest
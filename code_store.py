@@ -0,0 +1,176 @@
+import threading
+from datetime import datetime
+from collections import namedtuple
+from types import MappingProxyType
+
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import AuflagenCode, TableVersion
+
+# SQLite begrenzt die Zahl der Parameter pro Anweisung (ältere Versionen: 999)
+IN_CHUNK_SIZE = 500
+
+# Schlüssel der Code-Tabelle in table_versions
+CODES_VERSION_NAME = AuflagenCode.__tablename__
+
+
+def _ensure_version_row(connection):
+    """Legt table_versions und die Zeile der Code-Tabelle an, falls sie fehlen"""
+    TableVersion.__table__.create(connection, checkfirst=True)
+    exists = connection.execute(
+        select(TableVersion.version).where(TableVersion.name == CODES_VERSION_NAME)
+    ).first()
+    if exists is None:
+        connection.execute(insert(TableVersion.__table__).values(name=CODES_VERSION_NAME, version=0))
+
+
+def bump_codes_version(connection):
+    """Erhöht die Version der Code-Tabelle auf der übergebenen Verbindung (also in deren Transaktion)"""
+    # Schreibzugriffe sind selten, die zusätzliche Existenzprüfung fällt nicht ins Gewicht
+    _ensure_version_row(connection)
+    connection.execute(
+        update(TableVersion.__table__)
+        .where(TableVersion.name == CODES_VERSION_NAME)
+        .values(version=TableVersion.version + 1)
+    )
+
+
+def _touches_codes(session):
+    return any(isinstance(obj, AuflagenCode) for obj in (*session.new, *session.dirty, *session.deleted))
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    # ORM-Schreiber (Verwaltung, Seed, Fallback-Pfad) erhöhen die Version im selben Flush
+    if _touches_codes(session):
+        bump_codes_version(session.connection())
+
+
+def insert_with_conflict(dialect_name):
+    """INSERT-Konstrukt mit ON CONFLICT für den verwendeten Datenbank-Dialekt (oder None)"""
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def write_codes(codes_with_text):
+    """Upsert aller Codes in der laufenden Transaktion, ohne Commit (App-Kontext nötig)
+
+    Eine INSERT ... ON CONFLICT(code) DO UPDATE-Anweisung für alle Codes; Beschreibungen
+    werden nur überschrieben, wenn sie sich geändert haben.
+    """
+    if not codes_with_text:
+        return 0
+    rows = [{'code': code, 'description': description} for code, description in sorted(codes_with_text.items())]
+    dialect_insert = insert_with_conflict(db.engine.dialect.name)
+    if dialect_insert is None:
+        # Andere Datenbanken: ein SELECT ... IN plus ORM-Änderungen
+        existing = fetch_codes(codes_with_text)
+        for row in rows:
+            code = existing.get(row['code'])
+            if code is None:
+                db.session.add(AuflagenCode(**row))
+            elif code.description != row['description']:
+                code.description = row['description']
+        return len(rows)
+    statement = dialect_insert(AuflagenCode.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=[AuflagenCode.code],
+        # ON CONFLICT wendet onupdate-Defaults nicht an
+        set_={'description': statement.excluded.description, 'updated_at': datetime.utcnow()},
+        where=AuflagenCode.description != statement.excluded.description,
+    )
+    result = db.session.execute(statement, rows)
+    # Core-Anweisungen lösen keinen ORM-Flush aus; Version nur bei echten Änderungen erhöhen
+    if result.rowcount:
+        bump_codes_version(db.session.connection())
+    return len(rows)
+
+
+def upsert_codes(codes_with_text):
+    """Schreibt alle Codes mit Beschreibung in einer eigenen Transaktion; liefert die Zahl der Codes"""
+    try:
+        count = write_codes(codes_with_text)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+def fetch_codes(codes):
+    """Lädt die angegebenen Codes mit einem SELECT ... WHERE code IN (...) je Block; liefert {Code: AuflagenCode}"""
+    codes = sorted(set(codes))
+    found = {}
+    for start in range(0, len(codes), IN_CHUNK_SIZE):
+        chunk = codes[start:start + IN_CHUNK_SIZE]
+        for code in AuflagenCode.query.filter(AuflagenCode.code.in_(chunk)):
+            found[code.code] = code
+    return found
+
+
+CodeSnapshot = namedtuple('CodeSnapshot', ['version', 'descriptions', 'codes'])
+
+
+class CodeCache:
+    """Prozessweiter Read-Through-Cache der Code-Tabelle
+
+    Jeder Zugriff liest nur die Versionszeile (Primärschlüssel-Abfrage); Codes und
+    Beschreibungen werden erst neu geladen, wenn ein Schreiber die Version erhöht hat.
+    Leser bekommen einen unveränderlichen Snapshot.
+    """
+    def __init__(self):
+        self._snapshot = None
+        self._table_ready = False
+        self.lock = threading.Lock()
+        self.reloads = 0
+
+    def _ensure_table(self):
+        # init_db() läuft nur beim direkten Start von app.py
+        if not self._table_ready:
+            with self.lock:
+                if not self._table_ready:
+                    with db.engine.begin() as connection:
+                        _ensure_version_row(connection)
+                    self._table_ready = True
+
+    def version(self):
+        """Aktuelle Version der Code-Tabelle laut Datenbank (App-Kontext nötig)"""
+        self._ensure_table()
+        version = db.session.execute(
+            select(TableVersion.version).where(TableVersion.name == CODES_VERSION_NAME)
+        ).scalar()
+        if version is None:
+            # Zeile wurde entfernt (z.B. Datenbank ersetzt); neu anlegen lassen
+            self._table_ready = False
+            return -1
+        return version
+
+    def get(self):
+        """Snapshot (Version, {Code: Beschreibung}, frozenset(Codes)); lädt nur nach Änderungen neu"""
+        version = self.version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self.lock:
+            if self._snapshot is None or self._snapshot.version != version:
+                rows = db.session.query(AuflagenCode.code, AuflagenCode.description).order_by(AuflagenCode.code)
+                descriptions = dict(rows.all())
+                self._snapshot = CodeSnapshot(version, MappingProxyType(descriptions), frozenset(descriptions))
+                self.reloads += 1
+            return self._snapshot
+
+    def descriptions(self):
+        return self.get().descriptions
+
+    def codes(self):
+        return self.get().codes
+
+
+code_cache = CodeCache()
@@ -0,0 +1,79 @@
+import re
+from functools import lru_cache
+
+# Semantische Rollen von Tabellenspalten
+VEHICLE = 'vehicle'  # Handelsbezeichnung
+VEHICLE_TYPE = 'type'  # Fahrzeug-Typ
+APPROVAL = 'approval'  # ABE/EWG-Nr.
+CONDITIONS = 'conditions'  # Auflagen und Hinweise (gelten für das ganze Fahrzeug)
+TIRE_CONDITIONS = 'tire_conditions'  # Reifenbezogene Auflagen und Hinweise
+TIRE_SIZE = 'tire_size'
+RIM_SIZE = 'rim_size'
+OFFSET = 'offset'  # Einpresstiefe (ET)
+BOLT_PATTERN = 'bolt_pattern'  # Lochzahl/Lochkreis
+CENTER_BORE = 'center_bore'  # Mittenloch
+LOAD = 'load'  # Radlast/Tragfähigkeit
+SPEED = 'speed'  # Geschwindigkeitsindex
+MANUFACTURER = 'manufacturer'
+POWER = 'power'  # kW-Bereich
+
+VEHICLE_ROLES = frozenset((VEHICLE, VEHICLE_TYPE, APPROVAL))
+CONDITION_ROLES = frozenset((CONDITIONS, TIRE_CONDITIONS))
+
+# Reihenfolge ist egal, ein Kopf kann mehrere Rollen haben ("Handelsbezeichnung Fahrzeug-Typ ABE/EWG-Nr.")
+ROLE_PATTERNS = {
+    VEHICLE: r'handelsbezeichnung|fahrzeug(?!-?typ)|\bfzg\b|modell|vehicle',
+    VEHICLE_TYPE: r'(?<!reifen)(?<!reifen-)typ(?!en)|\btype\b|\btypen\b',
+    APPROVAL: r'\babe\b|\bewg\b|\bkba\b|genehmigung|approval',
+    TIRE_SIZE: r'^reifen$|reifengr|reifentyp|\btire|dimension|\bsize\b',
+    RIM_SIZE: r'felge|\brim\b|wheel|räder|zoll',
+    OFFSET: r'\bet\b|offset|einpress',
+    BOLT_PATTERN: r'lochzahl|lochkreis|\bpcd\b|bolt',
+    CENTER_BORE: r'mittenloch|zentrier',
+    LOAD: r'radlast|traglast|tragfähigkeit|\bload\b',
+    SPEED: r'geschwindigkeit|\bspeed\b|km/h',
+    MANUFACTURER: r'hersteller|manufacturer|producer|\bmarke\b|\bbrand\b|fabrikat',
+    POWER: r'\bkw\b|leistung',
+}
+_COMPILED_ROLE_PATTERNS = {role: re.compile(pattern) for role, pattern in ROLE_PATTERNS.items()}
+ALL_ROLES = frozenset(ROLE_PATTERNS) | CONDITION_ROLES
+
+
+def normalize_header(header):
+    """Normalisiert einen Spaltenkopf (Kleinschreibung, Silbentrennung und Umbrüche entfernt)"""
+    text = str(header).lower().replace('-\n', '')
+    return re.sub(r'[\s_]+', ' ', text).strip()
+
+
+@lru_cache(maxsize=4096)
+def _roles_for_normalized(normalized):
+    if 'auflagen' in normalized:
+        # Auflagen-Spalten haben genau eine Rolle, auch wenn "reifen" im Kopf steht
+        return frozenset((TIRE_CONDITIONS if 'reifenbezogen' in normalized else CONDITIONS,))
+    return frozenset(role for role, pattern in _COMPILED_ROLE_PATTERNS.items() if pattern.search(normalized))
+
+
+@lru_cache(maxsize=4096)
+def classify_header(header):
+    """Menge der semantischen Rollen eines Spaltenkopfs (leer, wenn unbekannt)
+
+    Zweistufig gecacht: roher Kopf -> normalisierter Kopf -> Rollen, damit auch
+    unterschiedlich geschriebene Köpfe ("Reifen-\ntyp", "Reifentyp") den Eintrag teilen.
+    """
+    return _roles_for_normalized(normalize_header(header))
+
+
+def column_roles(df):
+    """Rollen aller Spalten eines DataFrames als {Spalte: frozenset(Rollen)}"""
+    return {col: classify_header(col) for col in df.columns}
+
+
+def columns_with_role(df, *roles):
+    """Spalten (in Tabellenreihenfolge), die mindestens eine der Rollen haben"""
+    wanted = set(roles)
+    return [col for col in df.columns if classify_header(col) & wanted]
+
+
+def classifier_cache_info():
+    """Trefferstatistik der Rollen-Caches (roh und normalisiert)"""
+    return {'headers': classify_header.cache_info(), 'normalized': _roles_for_normalized.cache_info()}
@@ -0,0 +1,89 @@
+import math
+import time
+from contextlib import contextmanager
+
+# Mindestbudget (Sekunden), unter dem eine Stufe gar nicht erst gestartet wird.
+# tabula-Aufrufe lassen sich nicht unterbrechen und laufen immer über das ganze Dokument,
+# die pdfplumber-Stufen prüfen das Budget zusätzlich nach jeder Seite.
+STAGE_MIN_SECONDS = {
+    'lattice': 2.0,
+    'stream': 2.0,
+    'guess': 3.0,
+    'pdfplumber': 0.5,
+    'text_structured': 0.3,
+    'text_simple': 0.0,
+}
+
+
+class Deadline:
+    """Zeitbudget einer Extraktion; protokolliert, welche Stufen wie lange liefen oder übersprungen wurden
+
+    budget=None bedeutet unbegrenzt (bisheriges Verhalten: alle Stufen laufen vollständig).
+    """
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.started = time.monotonic()
+        self.stages = []
+        self.partial = False
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        if self.budget is None:
+            return math.inf
+        return max(self.budget - self.elapsed(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def allows(self, stage):
+        """Reicht das Restbudget für die Stufe? Sonst wird sie als übersprungen vermerkt"""
+        needed = STAGE_MIN_SECONDS.get(stage, 0.0)
+        # Stufen ohne Mindestbudget (letzter Ausweg) laufen immer
+        if needed == 0.0 or self.remaining() > needed:
+            return True
+        self.stages.append({'stage': stage, 'status': 'skipped', 'ms': 0.0})
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        """Misst eine Stufe; der Eintrag kann über das gelieferte Dict ergänzt werden (z.B. Tabellenanzahl)"""
+        entry = {'stage': name, 'status': 'ok', 'ms': 0.0}
+        self.stages.append(entry)
+        started = time.perf_counter()
+        try:
+            yield entry
+        except Exception:
+            entry['status'] = 'error'
+            raise
+        finally:
+            entry['ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    def mark_partial(self, entry):
+        """Stufe wurde wegen des Budgets vorzeitig beendet, ihr Ergebnis ist unvollständig"""
+        entry['status'] = 'partial'
+        self.partial = True
+
+    def merge(self, report):
+        """Übernimmt die Stufen eines anderen Prozesses (z.B. aus der Extraktions-Sandbox)"""
+        self.stages.extend(report.get('stages', []))
+        self.partial = self.partial or report.get('partial', False)
+
+    def report(self):
+        return {
+            'budget_s': self.budget,
+            'elapsed_ms': round(self.elapsed() * 1000, 1),
+            'partial': self.partial,
+            'stages': list(self.stages),
+        }
+
+    def summary(self):
+        """Kompakte Form für einen Antwort-Header, z.B. "lattice=1830ms;stream=skipped" """
+        parts = []
+        for entry in self.stages:
+            value = 'skipped' if entry['status'] == 'skipped' else f"{round(entry['ms'])}ms"
+            if entry['status'] in ('partial', 'error'):
+                value += f"({entry['status']})"
+            parts.append(f"{entry['stage']}={value}")
+        return ';'.join(parts)
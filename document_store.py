@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import select, delete, update, insert
+
+from extensions import db
+from models import Document, ExtractedTable, TableRow, DocumentCode, ExtractedSpecs
+from wheel_specs import table_number, specs_from_bytes
+
+# Reihenfolge beachtet die Fremdschlüssel
+DOCUMENT_TABLES = (Document, ExtractedTable, TableRow, DocumentCode, ExtractedSpecs)
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def ensure_document_tables():
+    """Legt die Dokument-Tabellen an, falls sie fehlen (normalerweise schon beim Import von app.py geschehen)
+
+    Läuft auf der Verbindung der Session: Eine zweite Verbindung würde bei SQLite auf die
+    Schreibsperre warten, die die Session (z.B. im Write-Behind-Batch) bereits hält.
+    """
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            connection = db.session.connection()
+            for model in DOCUMENT_TABLES:
+                model.__table__.create(connection, checkfirst=True)
+            _tables_ready = True
+
+
+def table_payload(indexed_tables):
+    """Wandelt (Name, DataFrame)-Paare in reine Listen um, die der Schreib-Thread gefahrlos übernehmen kann"""
+    payload = []
+    for position, (name, df) in enumerate(indexed_tables):
+        df = df.fillna('').astype(str)
+        payload.append({
+            'number': table_number(name, position),
+            'name': name,
+            'columns': [str(col) for col in df.columns],
+            'rows': df.values.tolist(),
+        })
+    return payload
+
+
+def write_document(pdf_file, tables, codes, document_hash=None, specs=None):
+    """Ersetzt Tabellen, Zeilen, Codes und Rad/Reifen-Daten einer PDF in der laufenden Transaktion, ohne Commit
+
+    tables stammt aus table_payload(), specs aus wheel_specs.specs_to_bytes(). Alle Zeilen
+    werden mit je einer executemany-Anweisung geschrieben, die Zahl der Anweisungen hängt
+    nicht von der Tabellengröße ab.
+    """
+    ensure_document_tables()
+    session = db.session
+    pdf_id = os.path.splitext(pdf_file)[0]
+    now = datetime.utcnow()
+    values = {'pdf_file': pdf_file, 'document_hash': document_hash, 'table_count': len(tables), 'updated_at': now}
+
+    document_id = session.execute(select(Document.id).where(Document.pdf_id == pdf_id)).scalar()
+    if document_id is None:
+        result = session.execute(insert(Document.__table__).values(pdf_id=pdf_id, created_at=now, **values))
+        document_id = result.inserted_primary_key[0]
+    else:
+        old_tables = select(ExtractedTable.id).where(ExtractedTable.document_id == document_id)
+        session.execute(delete(TableRow.__table__).where(TableRow.table_id.in_(old_tables)))
+        session.execute(delete(ExtractedTable.__table__).where(ExtractedTable.document_id == document_id))
+        session.execute(delete(DocumentCode.__table__).where(DocumentCode.document_id == document_id))
+        session.execute(delete(ExtractedSpecs.__table__).where(ExtractedSpecs.document_id == document_id))
+        session.execute(update(Document.__table__).where(Document.id == document_id).values(**values))
+
+    if tables:
+        session.execute(insert(ExtractedTable.__table__), [{
+            'document_id': document_id,
+            'table_number': table['number'],
+            'name': table['name'],
+            'columns': json.dumps(table['columns'], ensure_ascii=False),
+            'row_count': len(table['rows']),
+        } for table in tables])
+        table_ids = dict(session.execute(
+            select(ExtractedTable.table_number, ExtractedTable.id).where(ExtractedTable.document_id == document_id)
+        ).all())
+        rows = [
+            {'table_id': table_ids[table['number']], 'row_index': row_index, 'cells': json.dumps(cells, ensure_ascii=False)}
+            for table in tables
+            for row_index, cells in enumerate(table['rows'])
+        ]
+        if rows:
+            session.execute(insert(TableRow.__table__), rows)
+    if codes:
+        session.execute(insert(DocumentCode.__table__), [
+            {'document_id': document_id, 'code': code} for code in sorted(set(codes))
+        ])
+    if specs is not None:
+        session.execute(insert(ExtractedSpecs.__table__).values(
+            document_id=document_id, row_count=specs['row_count'], data=specs['data']
+        ))
+    return document_id
+
+
+def get_document(pdf_id):
+    """Gespeichertes Dokument zur PDF-ID oder None (App-Kontext nötig)"""
+    ensure_document_tables()
+    return Document.query.filter_by(pdf_id=pdf_id).first()
+
+
+def load_tables(pdf_id):
+    """Tabellen einer PDF aus der Datenbank als Liste von (Name, DataFrame) in Tabellenreihenfolge
+
+    Zwei Abfragen über die Indizes auf document_id bzw. (table_id, row_index).
+    """
+    document = get_document(pdf_id)
+    if document is None:
+        return []
+    tables = ExtractedTable.query.filter_by(document_id=document.id).order_by(ExtractedTable.table_number).all()
+    rows = {}
+    statement = (
+        select(TableRow.table_id, TableRow.cells)
+        .join(ExtractedTable, ExtractedTable.id == TableRow.table_id)
+        .where(ExtractedTable.document_id == document.id)
+        .order_by(TableRow.table_id, TableRow.row_index)
+    )
+    for table_id, cells in db.session.execute(statement):
+        rows.setdefault(table_id, []).append(json.loads(cells))
+    return [
+        (table.name, pd.DataFrame(rows.get(table.id, []), columns=json.loads(table.columns), dtype=str))
+        for table in tables
+    ]
+
+
+def table_names(pdf_id):
+    """Namen der gespeicherten Tabellen einer PDF in Tabellenreihenfolge, ohne die Zeilen zu laden"""
+    ensure_document_tables()
+    statement = (
+        select(ExtractedTable.name)
+        .join(Document, Document.id == ExtractedTable.document_id)
+        .where(Document.pdf_id == pdf_id)
+        .order_by(ExtractedTable.table_number)
+    )
+    return list(db.session.execute(statement).scalars())
+
+
+def load_specs(pdf_id):
+    """Gespeichertes Spezifikations-Array einer PDF oder None"""
+    ensure_document_tables()
+    statement = (
+        select(ExtractedSpecs.data)
+        .join(Document, Document.id == ExtractedSpecs.document_id)
+        .where(Document.pdf_id == pdf_id)
+    )
+    return specs_from_bytes(db.session.execute(statement).scalar())
+
+
+def document_codes(pdf_id):
+    """Sortierte Auflagen-Codes aus den Tabellen einer PDF; None, wenn die PDF nicht gespeichert ist"""
+    document = get_document(pdf_id)
+    if document is None:
+        return None
+    statement = select(DocumentCode.code).where(DocumentCode.document_id == document.id).order_by(DocumentCode.code)
+    return list(db.session.execute(statement).scalars())
+
+
+def list_documents():
+    """PDF-IDs aller gespeicherten Dokumente"""
+    ensure_document_tables()
+    return list(db.session.execute(select(Document.pdf_id).order_by(Document.pdf_id)).scalars())
@@ -0,0 +1,345 @@
+import os
+import sys
+import time
+import queue
+import subprocess
+import threading
+from multiprocessing.connection import Connection
+
+import pandas as pd
+
+from deadline import Deadline
+
+POLL_INTERVAL = 0.1
+# Zusätzliche Zeit über das Budget hinaus, bevor ein Kindprozess beendet wird
+# (tabula-Stufen lassen sich nicht unterbrechen, der letzte Ausweg läuft immer)
+DEADLINE_GRACE_SECONDS = 5
+
+
+class ExtractionFailed(Exception):
+    """Extraktion auch nach allen Wiederholungen fehlgeschlagen (Zeitlimit, Speicherlimit, Absturz)"""
+
+
+class _WorkerLost(Exception):
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _encode_tables(tables):
+    # Nur Spaltennamen und Zellwerte als Strings übertragen, keine gepickelten DataFrames
+    return [([str(col) for col in table.columns], table.fillna('').astype(str).values.tolist()) for table in tables]
+
+
+def decode_tables(payload):
+    return [pd.DataFrame(rows, columns=columns, dtype=str) for columns, rows in payload]
+
+
+class _SandboxJVM:
+    """jvm_manager-Ersatz im Kindprozess (eigene JVM pro Worker, bleibt zwischen Aufträgen warm)
+
+    Jeder Worker startet seine eigene TabulaRuntime; die des Web-Prozesses wird nur ohne
+    Sandbox genutzt. Ein Worker bearbeitet einen Auftrag nach dem anderen, daher genügt
+    max_concurrency=1. Aufgewärmt werden die Worker über ExtractionSandbox.warm_up().
+    """
+    def __init__(self):
+        self.runtime = None
+
+    def initialize(self):
+        if self.runtime is None:
+            from tabula_runtime import TabulaRuntime
+            self.runtime = TabulaRuntime(max_concurrency=1)
+        self.runtime.start()
+
+
+def _worker_main(requests, responses, address_space_limit):
+    """Schleife im Kindprozess: Auftrag empfangen, extrahieren, Tabellen zurücksenden"""
+    if address_space_limit:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (address_space_limit, address_space_limit))
+    from pdf_extractor import process_pdf_with_encoding, process_pdf_without_java
+    jvm = _SandboxJVM()
+    while True:
+        try:
+            job = requests.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        pdf_path, output_format, use_java, budget = job
+        deadline = Deadline(budget)
+        try:
+            if use_java:
+                tables = process_pdf_with_encoding(pdf_path, output_format, None, lambda: True, jvm, deadline)
+            else:
+                tables = process_pdf_without_java(pdf_path, output_format, None, deadline)
+            responses.send(('ok', (_encode_tables(tables), deadline.report())))
+        except MemoryError:
+            responses.send(('error', 'Speicherlimit der Extraktion überschritten'))
+        except Exception as e:
+            responses.send(('error', str(e)))
+
+
+def _rss_bytes(pid):
+    """Residenter Speicher eines Prozesses laut /proc (None, wenn nicht lesbar)"""
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Worker:
+    """Ein Extraktions-Kindprozess mit zwei Pipes (Aufträge hin, Tabellen zurück)
+
+    Gestartet als eigener Interpreter über diese Datei: multiprocessing mit spawn würde im
+    Kind das Hauptmodul (app.py) erneut ausführen, ein fork die JVM des Web-Prozesses kopieren.
+    """
+    def __init__(self, address_space_limit):
+        request_read, request_write = os.pipe()
+        response_read, response_write = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), str(request_read), str(response_write),
+                 str(address_space_limit or 0)],
+                pass_fds=(request_read, response_write),
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+        except Exception:
+            for fd in (request_read, request_write, response_read, response_write):
+                os.close(fd)
+            raise
+        os.close(request_read)
+        os.close(response_write)
+        self.requests = Connection(request_write, readable=False)
+        self.responses = Connection(response_read, writable=False)
+        self.jobs = 0
+
+    def run(self, job, timeout, memory_limit):
+        """Sendet einen Auftrag und wartet mit Zeit- und Speicherüberwachung auf das Ergebnis"""
+        try:
+            self.requests.send(job)
+        except OSError:
+            raise _WorkerLost('crashed', "Extraktionsprozess nicht erreichbar")
+        deadline = time.monotonic() + timeout
+        while not self.responses.poll(POLL_INTERVAL):
+            if not self.alive:
+                raise _WorkerLost('crashed', f"Extraktionsprozess beendet (Exit-Code {self.process.returncode})")
+            if memory_limit:
+                rss = _rss_bytes(self.process.pid)
+                if rss is not None and rss > memory_limit:
+                    self.kill()
+                    raise _WorkerLost('memory', f"Speicherlimit überschritten ({rss // (1024 * 1024)} MB)")
+            if time.monotonic() > deadline:
+                self.kill()
+                raise _WorkerLost('timeout', f"Zeitlimit von {timeout} s überschritten")
+        try:
+            result = self.responses.recv()
+        except (EOFError, OSError):
+            raise _WorkerLost('crashed', "Extraktionsprozess während der Antwort beendet")
+        self.jobs += 1
+        return result
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def _close(self):
+        self.requests.close()
+        self.responses.close()
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait(5)
+        self._close()
+
+    def stop(self):
+        try:
+            self.requests.send(None)
+            self.process.wait(2)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        self.kill()
+
+
+class ExtractionSandbox:
+    """Führt PDF-Extraktionen in überwachten Kindprozessen aus
+
+    Ein hängendes tabula/pdfplumber oder eine PDF, die den Speicher sprengt, blockiert damit
+    nicht mehr den Web-Worker: Der Kindprozess wird nach Ablauf des Zeitlimits oder bei
+    Überschreiten des RSS-Limits beendet und durch einen neuen ersetzt. Der Auftrag wird
+    wiederholt, nach einem Abbruch des tabula-Pfads ohne Java (pdfplumber). Worker bleiben
+    zwischen Aufträgen bestehen, damit Interpreter und JVM nicht jedes Mal neu starten.
+    """
+    def __init__(self, logger=None, workers=2, timeout=120, memory_limit_mb=2048, retries=1, address_space_limit_mb=None):
+        self.logger = logger
+        self.workers = max(int(workers), 1)
+        self.timeout = timeout
+        self.memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        # RLIMIT_AS verträgt sich nicht mit der JVM (reserviert viel Adressraum), daher standardmäßig aus
+        self.address_space_limit = address_space_limit_mb * 1024 * 1024 if address_space_limit_mb else None
+        self.retries = retries
+        self.lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._all = set()
+        self.counters = {
+            'jobs': 0,
+            'completed': 0,
+            'failed': 0,
+            'errors': 0,
+            'retries': 0,
+            'killed_timeout': 0,
+            'killed_memory': 0,
+            'crashed': 0,
+            'workers_started': 0,
+            'warmups': 0,
+            'job_ms_total': 0.0,
+        }
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def _count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                worker = self._idle.get_nowait()
+                if worker.alive:
+                    return worker
+                self._discard(worker)
+        except queue.Empty:
+            pass
+        try:
+            worker = _Worker(self.address_space_limit)
+        except Exception:
+            self._slots.release()
+            raise
+        with self.lock:
+            self._all.add(worker)
+            self.counters['workers_started'] += 1
+        return worker
+
+    def _release(self, worker):
+        if worker.alive:
+            self._idle.put(worker)
+        else:
+            self._discard(worker)
+        self._slots.release()
+
+    def _discard(self, worker):
+        with self.lock:
+            self._all.discard(worker)
+
+    def extract(self, pdf_path, output_format='csv', use_java=True, deadline=None):
+        """Extrahiert die Tabellen einer PDF im Kindprozess; liefert eine Liste von DataFrames
+
+        Mit deadline läuft die Fallback-Kette im Kind mit dem verbleibenden Budget, dessen
+        Stufenprotokoll wird in deadline übernommen.
+        """
+        started = time.perf_counter()
+        self._count(jobs=1)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count(retries=1)
+            budget = None
+            timeout = self.timeout
+            if deadline is not None and deadline.budget is not None:
+                budget = deadline.remaining()
+                timeout = min(timeout, budget + DEADLINE_GRACE_SECONDS)
+            worker = self._acquire()
+            try:
+                status, payload = worker.run(
+                    (os.path.abspath(pdf_path), output_format, use_java, budget), timeout, self.memory_limit
+                )
+            except _WorkerLost as e:
+                last_error = str(e)
+                self._count(**{'killed_timeout' if e.reason == 'timeout' else
+                               'killed_memory' if e.reason == 'memory' else 'crashed': 1})
+                self._log('warning', f"Extraktion von {os.path.basename(pdf_path)} abgebrochen "
+                                     f"(Versuch {attempt + 1}): {e}")
+                # Hänger und Speicherprobleme stammen meist aus tabula; erneut ohne Java versuchen
+                use_java = False
+                continue
+            finally:
+                self._release(worker)
+            if status == 'ok':
+                self._count(completed=1, job_ms_total=(time.perf_counter() - started) * 1000)
+                tables, report = payload
+                if deadline is not None:
+                    deadline.merge(report)
+                return decode_tables(tables)
+            # Fehler innerhalb der Extraktion: Wiederholen bringt nichts
+            self._count(errors=1, failed=1)
+            raise ExtractionFailed(payload)
+        self._count(failed=1)
+        raise ExtractionFailed(f"Extraktion von {os.path.basename(pdf_path)} fehlgeschlagen: {last_error}")
+
+    def warm_up(self, pdf_path, use_java=True):
+        """Startet alle Worker und lässt jeden einmal die Aufwärm-PDF extrahieren; liefert die Zahl aufgewärmter Worker
+
+        Jeder Worker hat eine eigene JVM, ein Aufwärmen im Web-Prozess hilft ihnen nicht.
+        Belegt dafür alle Plätze gleichzeitig, damit wirklich jeder Worker einen Auftrag bekommt.
+        """
+        workers = [self._acquire() for _ in range(self.workers)]
+        warmed = []
+
+        def run(worker):
+            try:
+                status, _ = worker.run((os.path.abspath(pdf_path), 'csv', use_java, None), self.timeout, self.memory_limit)
+                if status == 'ok':
+                    warmed.append(worker)
+            except _WorkerLost as e:
+                self._log('warning', f"Aufwärmen eines Extraktionsprozesses fehlgeschlagen: {e}")
+
+        threads = [threading.Thread(target=run, args=(worker,), name='sandbox-warmup') for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for worker in workers:
+            self._release(worker)
+        self._count(warmups=len(warmed))
+        return len(warmed)
+
+    def stop(self):
+        """Beendet alle Worker-Prozesse"""
+        with self.lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.stop()
+
+    def stats(self):
+        """Zähler der Sandbox, u.a. wegen Zeit- oder Speicherlimit beendete Aufträge"""
+        with self.lock:
+            stats = dict(self.counters)
+            running = sum(1 for worker in self._all if worker.alive)
+        completed = stats['completed']
+        stats.update({
+            'killed': stats['killed_timeout'] + stats['killed_memory'],
+            'workers': self.workers,
+            'workers_running': running,
+            'timeout_s': self.timeout,
+            'memory_limit_mb': self.memory_limit // (1024 * 1024) if self.memory_limit else None,
+            'avg_job_ms': round(stats['job_ms_total'] / completed, 1) if completed else 0.0,
+        })
+        stats['job_ms_total'] = round(stats['job_ms_total'], 1)
+        return stats
+
+
+if __name__ == '__main__':
+    # Einstieg des Kindprozesses: Dateideskriptoren der Pipes und optionales Adressraum-Limit
+    _worker_main(
+        Connection(int(sys.argv[1]), writable=False),
+        Connection(int(sys.argv[2]), readable=False),
+        int(sys.argv[3]),
+    )
@@ -0,0 +1,246 @@
+import re
+import threading
+
+import numpy as np
+
+from typed_index import extract_vehicle_records, canonical_type
+from wheel_specs import SPEC_DTYPE, table_number
+
+# "8.5x19", "8,5x19", "8,5Jx19", "85x19"
+RIM_QUERY_PATTERN = re.compile(r'^\s*(\d{1,3}(?:[,.]\d{1,2})?)\s*J?\s*x\s*(\d{2})\s*$', re.IGNORECASE)
+# "5x112", "5/112"
+BOLT_QUERY_PATTERN = re.compile(r'^\s*(\d)\s*[x/]\s*(\d{3}(?:[,.]\d)?)\s*$', re.IGNORECASE)
+# "35-45", "35:45", "45", "35-" (offene Grenze)
+RANGE_QUERY_PATTERN = re.compile(r'^\s*(-?\d+(?:[,.]\d+)?)?\s*(?:([-:])\s*(-?\d+(?:[,.]\d+)?)?)?\s*$')
+
+
+def parse_rim_query(text):
+    """(Breite, Durchmesser) aus einer Felgenangabe; None bei ungültiger Eingabe"""
+    match = RIM_QUERY_PATTERN.match(str(text))
+    if not match:
+        return None
+    width = float(match.group(1).replace(',', '.'))
+    return (width / 10 if width > 13 else width), float(match.group(2))
+
+
+def parse_bolt_query(text):
+    """(Lochzahl, Lochkreis) aus einer Lochbild-Angabe; None bei ungültiger Eingabe"""
+    match = BOLT_QUERY_PATTERN.match(str(text))
+    if not match:
+        return None
+    return float(match.group(1)), float(match.group(2).replace(',', '.'))
+
+
+def parse_range_query(text):
+    """(Minimum, Maximum) aus "35-45", "35:45", "45" oder "35-"; None bei ungültiger Eingabe"""
+    match = RANGE_QUERY_PATTERN.match(str(text))
+    if not match or not (match.group(1) or match.group(3)):
+        return None
+    low = float(match.group(1).replace(',', '.')) if match.group(1) else None
+    high = float(match.group(3).replace(',', '.')) if match.group(3) else None
+    if not match.group(2):
+        high = low
+    return low, high
+
+
+NO_POSITIONS = np.zeros(0, dtype=np.int64)
+# Kandidatenliste gilt als selektiv, wenn sie höchstens 1/SELECTIVE_FRACTION des Korpus umfasst
+SELECTIVE_FRACTION = 8
+
+
+class FitmentIndex:
+    """Index über die Rad/Reifen-Daten aller extrahierten Gutachten für Freigabe-Abfragen
+
+    Die Spezifikations-Arrays aller Dokumente werden zu einem Korpus zusammengefügt:
+    ET ist sortiert (Bereichsabfragen per Binärsuche), Felgengröße, Lochbild und
+    Fahrzeug-Typ sind Hash-Indizes auf Positionen. Der Korpus wird nach Änderungen
+    beim nächsten Query einmal neu aufgebaut.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.lock = threading.Lock()
+        self._corpus = None
+
+    def index_document(self, pdf_id, tables, specs, matcher):
+        """(Re-)indiziert eine PDF; tables ist eine Liste von (Name, DataFrame), specs ihr Spezifikations-Array"""
+        rows = {}
+        for table_name, df in tables:
+            number = table_number(table_name)
+            for record in extract_vehicle_records(pdf_id, table_name, df, matcher):
+                for row in record['rows']:
+                    rows[(number, row['row'])] = (record['types'], row['codes'])
+        types = []
+        codes = []
+        for table, row in zip(specs['table'].tolist(), specs['row'].tolist()):
+            row_types, row_codes = rows.get((table, row), ([], []))
+            types.append(row_types)
+            codes.append(row_codes)
+        with self.lock:
+            self.documents[pdf_id] = {'specs': specs, 'types': types, 'codes': codes}
+            self._corpus = None
+        return len(specs)
+
+    def remove_document(self, pdf_id):
+        with self.lock:
+            if self.documents.pop(pdf_id, None) is not None:
+                self._corpus = None
+
+    def _build_corpus(self):
+        doc_ids = sorted(self.documents)
+        entries = [self.documents[doc_id] for doc_id in doc_ids]
+        specs = np.concatenate([entry['specs'] for entry in entries]) if entries else np.zeros(0, dtype=SPEC_DTYPE)
+        documents = np.repeat(np.arange(len(doc_ids)), [len(entry['specs']) for entry in entries])
+        types = [row_types for entry in entries for row_types in entry['types']]
+        codes = [row_codes for entry in entries for row_codes in entry['codes']]
+
+        # NaN landet beim Sortieren am Ende und wird von searchsorted nie getroffen
+        offset_order = np.argsort(specs['offset'], kind='stable')
+
+        def key_index(keys):
+            index = {}
+            for position, key in enumerate(keys):
+                index.setdefault(_rounded(key), []).append(position)
+            return {key: np.array(positions, dtype=np.int64) for key, positions in index.items()}
+
+        type_positions = {}
+        for position, row_types in enumerate(types):
+            for type_code in row_types:
+                type_positions.setdefault(type_code, []).append(position)
+
+        return {
+            'doc_ids': doc_ids,
+            'specs': specs,
+            'documents': documents,
+            'types': types,
+            'codes': codes,
+            'offset_order': offset_order,
+            'sorted_offsets': specs['offset'][offset_order],
+            'rims': key_index(zip(specs['rim_width'].tolist(), specs['rim_diameter'].tolist())),
+            'bolts': key_index(zip(specs['bolt_count'].tolist(), specs['pcd'].tolist())),
+            'type_index': {key: np.array(value, dtype=np.int64) for key, value in type_positions.items()},
+            'vehicles': np.char.lower(specs['vehicle']),
+        }
+
+    def _get_corpus(self):
+        with self.lock:
+            if self._corpus is None:
+                self._corpus = self._build_corpus()
+            return self._corpus
+
+    def query(self, rim=None, offset=None, bolt=None, vehicle_type=None, vehicle=None, limit=None):
+        """Sucht Fahrzeugzeilen mit passender Felge, ET-Bereich, Lochbild, Typ und Fahrzeugname
+
+        rim und bolt sind Tupel (Breite, Durchmesser) bzw. (Lochzahl, Lochkreis), offset ein
+        Bereich (Minimum, Maximum) mit optionalen Grenzen. Liefert (Anzahl, Treffer).
+        """
+        corpus = self._get_corpus()
+
+        count = len(corpus['specs'])
+        candidates = []
+        if rim is not None:
+            candidates.append(corpus['rims'].get(_rounded(rim), NO_POSITIONS))
+        if bolt is not None:
+            candidates.append(corpus['bolts'].get(_rounded(bolt), NO_POSITIONS))
+        if vehicle_type:
+            candidates.append(corpus['type_index'].get(canonical_type(vehicle_type), NO_POSITIONS))
+        candidates.sort(key=len)
+
+        if candidates and len(candidates[0]) * SELECTIVE_FRACTION <= count:
+            # Hash-Indizes liefern aufsteigend sortierte Positionen: mit der kürzesten Liste
+            # beginnen und nur noch schneiden, statt Masken über den ganzen Korpus aufzubauen
+            positions = candidates[0]
+            for other in candidates[1:]:
+                positions = _intersect_sorted(positions, other)
+            if offset is not None:
+                # ET der wenigen Kandidaten direkt vergleichen (NaN erfüllt keinen Vergleich)
+                low, high = offset
+                offsets = corpus['specs']['offset'][positions]
+                keep = ~np.isnan(offsets)
+                if low is not None:
+                    keep &= offsets >= low
+                if high is not None:
+                    keep &= offsets <= high
+                positions = positions[keep]
+        else:
+            # Kriterien treffen einen Großteil des Korpus: ein linearer Durchlauf je Kriterium ist billiger
+            mask = np.ones(count, dtype=bool)
+
+            def restrict(selection):
+                selected = np.zeros(count, dtype=bool)
+                selected[selection] = True
+                return selected
+
+            for selection in candidates:
+                mask &= restrict(selection)
+            if offset is not None:
+                low, high = offset
+                sorted_offsets = corpus['sorted_offsets']
+                start = 0 if low is None else np.searchsorted(sorted_offsets, low, side='left')
+                end = np.searchsorted(sorted_offsets, np.inf if high is None else high, side='right')
+                mask &= restrict(corpus['offset_order'][start:end])
+            positions = np.flatnonzero(mask)
+
+        if vehicle:
+            positions = positions[np.char.find(corpus['vehicles'][positions], str(vehicle).lower()) >= 0]
+
+        total = len(positions)
+        if limit:
+            positions = positions[:limit]
+        specs = corpus['specs']
+        results = []
+        for position in positions.tolist():
+            item = specs[position]
+            results.append({
+                'document': corpus['doc_ids'][corpus['documents'][position]],
+                'table': int(item['table']),
+                'row': int(item['row']),
+                'vehicle': str(item['vehicle']),
+                'types': corpus['types'][position],
+                'tire': _format_tire(item),
+                'rim': _format_rim(item),
+                'offset': _nan_to_none(item['offset']),
+                'bolt_pattern': _format_bolt(item),
+                'power': [_nan_to_none(item['power_min']), _nan_to_none(item['power_max'])],
+                'codes': corpus['codes'][position],
+            })
+        return total, results
+
+
+def _intersect_sorted(positions, other):
+    """Schnittmenge zweier aufsteigend sortierter Positionslisten (positions die kürzere)"""
+    if not len(positions) or not len(other):
+        return NO_POSITIONS
+    found = np.minimum(np.searchsorted(other, positions), len(other) - 1)
+    return positions[other[found] == positions]
+
+
+def _rounded(key):
+    # float32 im Array vs. float64 in der Anfrage (114.3 != float32(114.3))
+    return tuple(round(float(value), 2) for value in key)
+
+
+def _nan_to_none(value):
+    value = float(value)
+    return None if value != value else round(value, 2)
+
+
+def _format_number(value):
+    return f"{float(value):g}".replace('.', ',')
+
+
+def _format_tire(item):
+    if item['tire_width'] != item['tire_width']:
+        return None
+    return f"{item['tire_width']:.0f}/{item['aspect_ratio']:.0f}R{_format_number(item['tire_diameter'])}"
+
+
+def _format_rim(item):
+    if item['rim_width'] != item['rim_width']:
+        return None
+    return f"{_format_number(item['rim_width'])}x{item['rim_diameter']:.0f}"
+
+
+def _format_bolt(item):
+    if item['bolt_count'] != item['bolt_count']:
+        return None
+    return f"{item['bolt_count']:.0f}x{_format_number(item['pcd'])}"
@@ -0,0 +1,168 @@
+import re
+import math
+import unicodedata
+import threading
+import numpy as np
+
+# Römische Ziffern, wie sie in Modellbezeichnungen vorkommen (Golf VII -> golf 7).
+# Einzelbuchstaben (i, v, x) werden bewusst nicht ersetzt, sonst wird "V-Klasse" zu "5 klasse".
+ROMAN_NUMERALS = {
+    'ii': '2', 'iii': '3', 'iv': '4', 'vi': '6', 'vii': '7',
+    'viii': '8', 'ix': '9', 'xi': '11', 'xii': '12'
+}
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+LETTER_DIGIT_BOUNDARY = re.compile(r'(?<=[a-z])(?=\d)|(?<=\d)(?=[a-z])')
+
+
+def normalize_text(text):
+    """Normalisiert Zelltext für den Trigramm-Vergleich (Kleinschreibung, Leerzeichen, röm. Ziffern)"""
+    text = str(text).lower().replace('ß', 'ss')
+    # Akzente/Umlaute abtrennen (Coupé -> coupe, Käfer -> kafer)
+    text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    # "golf7" und "golf 7" sollen gleich behandelt werden
+    text = LETTER_DIGIT_BOUNDARY.sub(' ', text)
+    tokens = TOKEN_PATTERN.findall(text)
+    return ' '.join(ROMAN_NUMERALS.get(token, token) for token in tokens)
+
+
+def trigrams(normalized):
+    """Bildet Trigramme pro Wort, aufgefüllt wie bei pg_trgm ('  golf ' -> '  g', ' go', ...)"""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """Invertierter Trigramm-Index mit Ranking nach Jaccard-Ähnlichkeit
+
+    Kandidaten werden ausschließlich über die Posting-Listen der Anfrage-Trigramme
+    ermittelt (Prefix-Filter über die seltensten Trigramme), es wird also nie über
+    alle Einträge iteriert.
+    """
+    def __init__(self):
+        self.payloads = []
+        self.tables = {}
+        self._sizes = []
+        self._postings = {}
+        self._frozen = None
+        self._frozen_sizes = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def add(self, text, payload):
+        """Fügt einen Eintrag hinzu; leere Texte werden ignoriert"""
+        grams = trigrams(normalize_text(text))
+        if not grams:
+            return
+        with self.lock:
+            entry_id = len(self.payloads)
+            self.payloads.append(payload)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(entry_id)
+            self._frozen = None
+
+    def _freeze(self):
+        """Wandelt die Posting-Listen in sortierte NumPy-Arrays um (einmal pro Änderung)"""
+        with self.lock:
+            if self._frozen is None:
+                # Einträge werden in aufsteigender ID-Reihenfolge angehängt, die Listen sind also sortiert
+                self._frozen = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in self._postings.items()}
+                self._frozen_sizes = np.asarray(self._sizes, dtype=np.int32)
+            return self._frozen, self._frozen_sizes
+
+    def query(self, text, threshold=0.3, top_k=50):
+        """Liefert ([(payload, score), ...], Gesamtzahl über Schwellwert), absteigend nach Ähnlichkeit"""
+        query_grams = trigrams(normalize_text(text))
+        if not query_grams or not self.payloads:
+            return [], 0
+
+        postings, sizes = self._freeze()
+        n_query = len(query_grams)
+
+        # Jaccard <= overlap / |Q|, daher braucht jeder Treffer mindestens so viele gemeinsame Trigramme
+        min_overlap = max(1, math.ceil(threshold * n_query))
+        ordered = sorted(query_grams, key=lambda gram: len(postings.get(gram, ())))
+        prefix = [postings[gram] for gram in ordered[:n_query - min_overlap + 1] if gram in postings]
+        if not prefix:
+            return [], 0
+        candidates = np.unique(np.concatenate(prefix))
+
+        # Überlappung pro Kandidat per binärer Suche in den sortierten Posting-Listen
+        overlap = np.zeros(candidates.size, dtype=np.int32)
+        for gram in ordered:
+            ids = postings.get(gram)
+            if ids is None:
+                continue
+            pos = np.searchsorted(ids, candidates)
+            pos[pos == ids.size] = ids.size - 1
+            overlap += ids[pos] == candidates
+
+        scores = overlap / (n_query + sizes[candidates] - overlap)
+        keep = scores >= threshold
+        candidates, scores = candidates[keep], scores[keep]
+        total = int(candidates.size)
+        if total == 0:
+            return [], 0
+
+        if top_k and total > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return [(self.payloads[candidates[i]], float(scores[i])) for i in order], total
+
+
+def build_table_index(tables):
+    """Baut einen Trigramm-Index über alle Zellen (zeilenweise je Zellzeile) der Tabellen
+
+    tables ist eine Liste von (Tabellenname, DataFrame); Payload ist (Tabelle, Zeile, Spalte, Text).
+    """
+    index = TrigramIndex()
+    index.tables = dict(tables)  # für die Anzeige der vollständigen Trefferzeile
+    for table_name, df in tables:
+        for col in df.columns:
+            for row_idx, value in df[col].items():
+                if not isinstance(value, str) or not value.strip():
+                    continue
+                # Mehrzeilige Zellen (Handelsbezeichnung/Typ/ABE) getrennt indexieren
+                for line in value.split('\n'):
+                    line = line.strip()
+                    if line:
+                        index.add(line, (table_name, row_idx, col, line))
+    return index
+
+
+class FuzzyIndexRegistry:
+    """Hält einen Trigramm-Index pro Dokument (PDF-ID) und baut ihn bei Bedarf auf"""
+    def __init__(self):
+        self.indexes = {}
+        self.generations = {}
+        # Summe aller Invalidierungen: ändert sich, sobald irgendeine PDF (neu) extrahiert wurde
+        self.corpus_generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, pdf_id, loader):
+        """Gibt den Index der PDF zurück; loader() liefert die Tabellen, falls er fehlt"""
+        with self.lock:
+            index = self.indexes.get(pdf_id)
+            generation = self.generations.get(pdf_id, 0)
+        if index is None:
+            index = build_table_index(loader())
+            with self.lock:
+                # Während des Aufbaus invalidiert: veralteten Index nicht ablegen
+                if generation == self.generations.get(pdf_id, 0):
+                    self.indexes[pdf_id] = index
+        return index
+
+    def invalidate(self, pdf_id):
+        """Verwirft den Index, z.B. nach erneuter Extraktion"""
+        with self.lock:
+            self.indexes.pop(pdf_id, None)
+            self.generations[pdf_id] = self.generations.get(pdf_id, 0) + 1
+            self.corpus_generation += 1
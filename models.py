@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from extensions import db
 
 class AuflagenCode(db.Model):
@@ -6,6 +8,143 @@ class AuflagenCode(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(10), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
         return f'<AuflagenCode {self.code}>'
+
+class AnalysisResult(db.Model):
+    """Gespeichertes Ergebnis der Eintragungsfreiheits-Analyse je (PDF-Hash, Code-Version)"""
+    __tablename__ = 'analysis_results'
+    __table_args__ = (db.UniqueConstraint('document_hash', 'codes_version'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_hash = db.Column(db.String(64), nullable=False, index=True)
+    codes_version = db.Column(db.String(40), nullable=False)
+    pdf_file = db.Column(db.String(255))
+    result = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AnalysisResult {self.pdf_file} {self.document_hash[:12]}>'
+
+class FreedomRule(db.Model):
+    """Bewertung eines Auflagen-Codes für die Eintragungsfreiheit (positive/negative/conditional)"""
+    __tablename__ = 'freedom_rules'
+
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(10), unique=True, nullable=False)
+    category = db.Column(db.String(20), nullable=False)
+    weight = db.Column(db.Integer, nullable=False, default=0)  # Beitrag zum Rating (-100 bis 100)
+
+    def __repr__(self):
+        return f'<FreedomRule {self.code} {self.category} {self.weight:+d}>'
+
+class RuleConflict(db.Model):
+    """Widersprüchliches Code-Paar mit Abzug bei Rating und Zuverlässigkeit"""
+    __tablename__ = 'rule_conflicts'
+    __table_args__ = (db.UniqueConstraint('code_a', 'code_b'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    code_a = db.Column(db.String(10), nullable=False)
+    code_b = db.Column(db.String(10), nullable=False)
+    rating_penalty = db.Column(db.Integer, nullable=False, default=0)
+    confidence_penalty = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.Text, nullable=False)
+
+    def __repr__(self):
+        return f'<RuleConflict {self.code_a}/{self.code_b}>'
+
+class TableVersion(db.Model):
+    """Monoton steigende Version je Tabelle; Schreiber erhöhen sie in derselben Transaktion"""
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TableVersion {self.name}={self.version}>'
+
+class ExtractionLog(db.Model):
+    """Metadaten einer Extraktion (vom Write-Behind-Schreiber gebündelt gespeichert)"""
+    __tablename__ = 'extraction_log'
+
+    id = db.Column(db.Integer, primary_key=True)
+    pdf_file = db.Column(db.String(255), nullable=False, index=True)
+    document_hash = db.Column(db.String(64))
+    table_count = db.Column(db.Integer, nullable=False, default=0)
+    code_count = db.Column(db.Integer, nullable=False, default=0)
+    method = db.Column(db.String(32))
+    elapsed_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ExtractionLog {self.pdf_file} {self.table_count} Tabellen>'
+
+class Document(db.Model):
+    """Extrahierte PDF; Tabellen, Zeilen und Codes hängen über document_id daran"""
+    __tablename__ = 'documents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    pdf_id = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    pdf_file = db.Column(db.String(255), nullable=False)
+    document_hash = db.Column(db.String(64), index=True)
+    table_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Document {self.pdf_file}>'
+
+class ExtractedSpecs(db.Model):
+    """Rad/Reifen-Daten einer PDF als serialisiertes Spezifikations-Array (wheel_specs.SPEC_DTYPE)"""
+    __tablename__ = 'extracted_specs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, unique=True)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)  # .npy
+
+    def __repr__(self):
+        return f'<ExtractedSpecs {self.document_id} {self.row_count} Zeilen>'
+
+class ExtractedTable(db.Model):
+    """Eine extrahierte Tabelle (Spaltenköpfe als JSON-Liste)"""
+    __tablename__ = 'extracted_tables'
+    __table_args__ = (db.UniqueConstraint('document_id', 'table_number'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
+    table_number = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    columns = db.Column(db.Text, nullable=False)  # JSON
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ExtractedTable {self.name}>'
+
+class TableRow(db.Model):
+    """Eine Tabellenzeile (Zellwerte als JSON-Liste in Spaltenreihenfolge)"""
+    __tablename__ = 'table_rows'
+    __table_args__ = (db.Index('ix_table_rows_table_row', 'table_id', 'row_index'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_id = db.Column(db.Integer, db.ForeignKey('extracted_tables.id'), nullable=False)
+    row_index = db.Column(db.Integer, nullable=False)
+    cells = db.Column(db.Text, nullable=False)  # JSON
+
+    def __repr__(self):
+        return f'<TableRow {self.table_id}:{self.row_index}>'
+
+class DocumentCode(db.Model):
+    """In den Tabellen einer PDF gefundener Auflagen-Code"""
+    __tablename__ = 'document_codes'
+    __table_args__ = (db.UniqueConstraint('document_id', 'code'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
+    code = db.Column(db.String(10), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<DocumentCode {self.document_id} {self.code}>'
@@ -8,13 +8,20 @@ import logging
 import tabula
 import pdfplumber
 
-def process_pdf_with_encoding(pdf_path, output_format='csv', logger=None, check_java_func=None, jvm_manager=None):
-    """Verarbeitet PDF-Datei mit Berücksichtigung der Kodierung für 1:1-Extraktion"""
+from deadline import Deadline
+
+def process_pdf_with_encoding(pdf_path, output_format='csv', logger=None, check_java_func=None, jvm_manager=None, deadline=None):
+    """Verarbeitet PDF-Datei mit Berücksichtigung der Kodierung für 1:1-Extraktion
+
+    deadline (Deadline) begrenzt die Gesamtzeit der Fallback-Kette: Stufen, für die das
+    Restbudget nicht reicht, werden übersprungen und im Deadline-Protokoll vermerkt.
+    """
+    deadline = deadline or Deadline()
     # Prüfe, ob Java verfügbar ist
     if check_java_func and not check_java_func():
         if logger:
             logger.warning("Java nicht gefunden. Verwende Fallback-Methode.")
-        return process_pdf_without_java(pdf_path, output_format, logger)
+        return process_pdf_without_java(pdf_path, output_format, logger, deadline)
         
     all_tables = []
     try:
@@ -24,44 +31,52 @@ def process_pdf_with_encoding(pdf_path, output_format='csv', logger=None, check_
         
         # Fokus auf Lattice-Modus (für Tabellen mit sichtbaren Linien)
         # Dies ist am besten für strukturerhaltende 1:1-Extraktion
-        if logger:
-            logger.info("Lattice-Modus für präzise Tabellenextraktion")
-        tables = tabula.read_pdf(
-            pdf_path, 
-            pages='all', 
-            multiple_tables=True,
-            lattice=True,
-            guess=False,
-            silent=True
-        )
+        tables = []
+        if deadline.allows('lattice'):
+            if logger:
+                logger.info("Lattice-Modus für präzise Tabellenextraktion")
+            with deadline.stage('lattice') as stage:
+                tables = tabula.read_pdf(
+                    pdf_path, 
+                    pages='all', 
+                    multiple_tables=True,
+                    lattice=True,
+                    guess=False,
+                    silent=True
+                )
+                stage['tables'] = len(tables)
         
         # Wenn keine Tabellen gefunden wurden oder sie unvollständig erscheinen, 
         # versuchen wir den Stream-Modus als nächstes
-        if not tables or len(tables) == 0:
+        if (not tables or len(tables) == 0) and deadline.allows('stream'):
             if logger:
                 logger.info("Keine Tabellen im Lattice-Modus gefunden. Versuche Stream-Modus.")
-            tables = tabula.read_pdf(
-                pdf_path, 
-                pages='all', 
-                multiple_tables=True,
-                stream=True,
-                guess=False,
-                silent=True
-            )
+            with deadline.stage('stream') as stage:
+                tables = tabula.read_pdf(
+                    pdf_path, 
+                    pages='all', 
+                    multiple_tables=True,
+                    stream=True,
+                    guess=False,
+                    silent=True
+                )
+                stage['tables'] = len(tables)
         
         # Letzte Option: Kombination aus beiden mit Guess-Parameter
-        if not tables or len(tables) == 0:
+        if (not tables or len(tables) == 0) and deadline.allows('guess'):
             if logger:
                 logger.info("Versuche kombinierte Methode mit Guess-Parameter")
-            tables = tabula.read_pdf(
-                pdf_path,
-                pages='all',
-                multiple_tables=True,
-                stream=True,
-                lattice=True,
-                guess=True,
-                silent=True
-            )
+            with deadline.stage('guess') as stage:
+                tables = tabula.read_pdf(
+                    pdf_path,
+                    pages='all',
+                    multiple_tables=True,
+                    stream=True,
+                    lattice=True,
+                    guess=True,
+                    silent=True
+                )
+                stage['tables'] = len(tables)
         
         if logger:
             logger.info(f"Tabula hat insgesamt {len(tables)} potenzielle Tabellen gefunden")
@@ -82,7 +97,7 @@ def process_pdf_with_encoding(pdf_path, output_format='csv', logger=None, check_
         if not all_tables:
             if logger:
                 logger.warning("Keine Tabellen mit tabula gefunden. Versuche Fallback-Methode.")
-            return process_pdf_without_java(pdf_path, output_format, logger)
+            return process_pdf_without_java(pdf_path, output_format, logger, deadline)
             
         return all_tables
 
@@ -90,149 +105,174 @@ def process_pdf_with_encoding(pdf_path, output_format='csv', logger=None, check_
         if logger:
             logger.error(f"Fehler bei der Tabellenextraktion mit tabula: {str(e)}")
             logger.info("Versuche Fallback-Methode.")
-        return process_pdf_without_java(pdf_path, output_format, logger)
+        return process_pdf_without_java(pdf_path, output_format, logger, deadline)
 
-def process_pdf_without_java(pdf_path, output_format='csv', logger=None):
+def process_pdf_without_java(pdf_path, output_format='csv', logger=None, deadline=None):
     """Verarbeitet PDF-Datei ohne Java mit pdfplumber für 1:1-Extraktion"""
+    deadline = deadline or Deadline()
+    if not deadline.allows('pdfplumber'):
+        return extract_text_as_structured_table(pdf_path, logger, deadline)
     if logger:
         logger.info("Verwende pdfplumber für 1:1 PDF-Tabellenextraktion")
     all_tables = []
     
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                if logger:
-                    logger.info(f"Verarbeite Seite {page_num+1} mit pdfplumber")
-                
-                # Standard-Tabelleneinstellungen - am besten für strukturerhaltende Extraktion
-                tables = page.extract_tables()
-                
-                # Nur wenn keine Tabellen gefunden wurden, verwenden wir alternative Einstellungen
-                if not tables:
+        with deadline.stage('pdfplumber') as stage:
+            with pdfplumber.open(pdf_path) as pdf:
+                for page_num, page in enumerate(pdf.pages):
+                    if deadline.expired():
+                        # Budget aufgebraucht: bis hierhin gefundene Tabellen sind das beste Teilergebnis
+                        deadline.mark_partial(stage)
+                        if logger:
+                            logger.warning(f"Zeitbudget erschöpft, pdfplumber endet vor Seite {page_num+1}")
+                        break
                     if logger:
-                        logger.info(f"Keine Standard-Tabellen auf Seite {page_num+1} gefunden. Versuche erweiterte Erkennung.")
-                    tables = page.extract_tables(table_settings={
-                        "vertical_strategy": "text", 
-                        "horizontal_strategy": "text",
-                        "snap_tolerance": 3,
-                        "join_tolerance": 3,
-                        "edge_min_length": 3,
-                        "min_words_vertical": 1,
-                        "min_words_horizontal": 1
-                    })
+                        logger.info(f"Verarbeite Seite {page_num+1} mit pdfplumber")
                 
-                if logger:
-                    logger.info(f"pdfplumber hat {len(tables)} Tabellen auf Seite {page_num+1} gefunden")
+                    # Standard-Tabelleneinstellungen - am besten für strukturerhaltende Extraktion
+                    tables = page.extract_tables()
                 
-                for i, table_data in enumerate(tables):
-                    if not table_data:
+                    # Nur wenn keine Tabellen gefunden wurden, verwenden wir alternative Einstellungen
+                    if not tables:
                         if logger:
-                            logger.info(f"Tabelle {i+1} auf Seite {page_num+1} ist leer")
-                        continue
+                            logger.info(f"Keine Standard-Tabellen auf Seite {page_num+1} gefunden. Versuche erweiterte Erkennung.")
+                        tables = page.extract_tables(table_settings={
+                            "vertical_strategy": "text", 
+                            "horizontal_strategy": "text",
+                            "snap_tolerance": 3,
+                            "join_tolerance": 3,
+                            "edge_min_length": 3,
+                            "min_words_vertical": 1,
+                            "min_words_horizontal": 1
+                        })
+                
+                    if logger:
+                        logger.info(f"pdfplumber hat {len(tables)} Tabellen auf Seite {page_num+1} gefunden")
+                
+                    for i, table_data in enumerate(tables):
+                        if not table_data:
+                            if logger:
+                                logger.info(f"Tabelle {i+1} auf Seite {page_num+1} ist leer")
+                            continue
                     
-                    # Erstellen eines DataFrame mit EXAKT derselben Struktur wie die gefundene Tabelle
-                    headers = [f"Spalte_{j+1}" for j in range(len(table_data[0]))] if table_data[0] else []
+                        # Erstellen eines DataFrame mit EXAKT derselben Struktur wie die gefundene Tabelle
+                        headers = [f"Spalte_{j+1}" for j in range(len(table_data[0]))] if table_data[0] else []
                     
-                    # Wenn die erste Zeile gute Überschriften enthält, nutze diese
-                    if all(str(h).strip() for h in table_data[0]):
-                        df = pd.DataFrame(table_data[1:], columns=table_data[0])
-                    else:
-                        df = pd.DataFrame(table_data, columns=headers)
+                        # Wenn die erste Zeile gute Überschriften enthält, nutze diese
+                        if all(str(h).strip() for h in table_data[0]):
+                            df = pd.DataFrame(table_data[1:], columns=table_data[0])
+                        else:
+                            df = pd.DataFrame(table_data, columns=headers)
                     
-                    # Minimale Nachbearbeitung
-                    df = df.fillna('')
+                        # Minimale Nachbearbeitung
+                        df = df.fillna('')
                     
-                    all_tables.append(df)
-                    if logger:
-                        logger.info(f"Tabelle {i+1} auf Seite {page_num+1} hinzugefügt (1:1 Extraktion)")
+                        all_tables.append(df)
+                        if logger:
+                            logger.info(f"Tabelle {i+1} auf Seite {page_num+1} hinzugefügt (1:1 Extraktion)")
+            stage['tables'] = len(all_tables)
         
         if not all_tables:
             if logger:
                 logger.warning("Keine Tabellen mit pdfplumber gefunden. Extrahiere Text als letzte Option.")
             # Versuche als letzten Ausweg den gesamten Text zu extrahieren
-            return extract_text_as_structured_table(pdf_path, logger)
+            return extract_text_as_structured_table(pdf_path, logger, deadline)
             
         return all_tables
 
     except Exception as e:
         if logger:
             logger.error(f"Fehler bei der pdfplumber Extraktion: {str(e)}")
-        return extract_text_as_structured_table(pdf_path, logger)
+        return extract_text_as_structured_table(pdf_path, logger, deadline)
 
-def extract_text_as_structured_table(pdf_path, logger=None):
+def extract_text_as_structured_table(pdf_path, logger=None, deadline=None):
     """Extrahiert Text und versucht, eine Tabellenstruktur zu erkennen"""
+    deadline = deadline or Deadline()
+    if not deadline.allows('text_structured'):
+        return extract_text_as_simple_table(pdf_path, logger, deadline)
     if logger:
         logger.info("Versuche Text mit Strukturerkennung zu extrahieren")
     try:
         all_tables = []
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if not text:
-                    continue
+        with deadline.stage('text_structured') as stage:
+            with pdfplumber.open(pdf_path) as pdf:
+                for page_num, page in enumerate(pdf.pages):
+                    if deadline.expired():
+                        deadline.mark_partial(stage)
+                        break
+                    text = page.extract_text()
+                    if not text:
+                        continue
                 
-                # Zeilen nach Zeilenumbrüchen trennen
-                lines = [line.strip() for line in text.split('\n') if line.strip()]
+                    # Zeilen nach Zeilenumbrüchen trennen
+                    lines = [line.strip() for line in text.split('\n') if line.strip()]
                 
-                # Versuchen wir, die Tabellenstruktur zu erkennen (suche nach Tabulatoren oder mehreren Leerzeichen)
-                rows = []
-                for line in lines:
-                    # Zuerst nach Tabs suchen
-                    if '\t' in line:
-                        cells = [cell.strip() for cell in line.split('\t')]
-                        rows.append(cells)
-                    else:
-                        # Nach mehreren Leerzeichen suchen (wahrscheinliche Zellentrennungen)
-                        split_pattern = re.compile(r'\s{2,}')
-                        cells = [cell.strip() for cell in split_pattern.split(line) if cell.strip()]
-                        if len(cells) > 1:  # Nur hinzufügen, wenn es wie eine Tabelle aussieht
+                    # Versuchen wir, die Tabellenstruktur zu erkennen (suche nach Tabulatoren oder mehreren Leerzeichen)
+                    rows = []
+                    for line in lines:
+                        # Zuerst nach Tabs suchen
+                        if '\t' in line:
+                            cells = [cell.strip() for cell in line.split('\t')]
                             rows.append(cells)
+                        else:
+                            # Nach mehreren Leerzeichen suchen (wahrscheinliche Zellentrennungen)
+                            split_pattern = re.compile(r'\s{2,}')
+                            cells = [cell.strip() for cell in split_pattern.split(line) if cell.strip()]
+                            if len(cells) > 1:  # Nur hinzufügen, wenn es wie eine Tabelle aussieht
+                                rows.append(cells)
                 
-                if rows:
-                    # Finde die maximale Anzahl von Spalten
-                    max_cols = max(len(row) for row in rows)
+                    if rows:
+                        # Finde die maximale Anzahl von Spalten
+                        max_cols = max(len(row) for row in rows)
                     
-                    # Fülle Zeilen mit weniger Spalten auf
-                    padded_rows = [row + [''] * (max_cols - len(row)) for row in rows]
+                        # Fülle Zeilen mit weniger Spalten auf
+                        padded_rows = [row + [''] * (max_cols - len(row)) for row in rows]
                     
-                    # Versuche zu erkennen, ob die erste Zeile eine Überschriftenzeile ist
-                    has_header = False
-                    if len(padded_rows) > 1:
-                        first_row = padded_rows[0]
-                        # Wenn die erste Zeile kürzer ist oder sich deutlich von den anderen unterscheidet
-                        # (z.B. enthält keine Zahlen, enthält nur Text), dann ist es wahrscheinlich eine Überschrift
-                        if all(not re.search(r'\d', cell) for cell in first_row) and \
-                           any(re.search(r'\d', cell) for row in padded_rows[1:] for cell in row):
-                            has_header = True
+                        # Versuche zu erkennen, ob die erste Zeile eine Überschriftenzeile ist
+                        has_header = False
+                        if len(padded_rows) > 1:
+                            first_row = padded_rows[0]
+                            # Wenn die erste Zeile kürzer ist oder sich deutlich von den anderen unterscheidet
+                            # (z.B. enthält keine Zahlen, enthält nur Text), dann ist es wahrscheinlich eine Überschrift
+                            if all(not re.search(r'\d', cell) for cell in first_row) and \
+                               any(re.search(r'\d', cell) for row in padded_rows[1:] for cell in row):
+                                has_header = True
                     
-                    if has_header:
-                        df = pd.DataFrame(padded_rows[1:], columns=padded_rows[0])
-                    else:
-                        df = pd.DataFrame(padded_rows, columns=[f"Spalte_{i+1}" for i in range(max_cols)])
+                        if has_header:
+                            df = pd.DataFrame(padded_rows[1:], columns=padded_rows[0])
+                        else:
+                            df = pd.DataFrame(padded_rows, columns=[f"Spalte_{i+1}" for i in range(max_cols)])
                     
-                    all_tables.append(df)
-                    if logger:
-                        logger.info(f"Strukturierte Texttabelle von Seite {page_num+1} extrahiert: {len(df)} Zeilen, {len(df.columns)} Spalten")
+                        all_tables.append(df)
+                        if logger:
+                            logger.info(f"Strukturierte Texttabelle von Seite {page_num+1} extrahiert: {len(df)} Zeilen, {len(df.columns)} Spalten")
+        
+            stage['tables'] = len(all_tables)
         
         if not all_tables:
             # Als letzte Option, erstelle eine einfache Texttabelle
-            return extract_text_as_simple_table(pdf_path, logger)
+            return extract_text_as_simple_table(pdf_path, logger, deadline)
             
         return all_tables
         
     except Exception as e:
         if logger:
             logger.error(f"Fehler bei der strukturierten Textextraktion: {str(e)}")
-        return extract_text_as_simple_table(pdf_path, logger)
+        return extract_text_as_simple_table(pdf_path, logger, deadline)
 
-def extract_text_as_simple_table(pdf_path, logger=None):
+def extract_text_as_simple_table(pdf_path, logger=None, deadline=None):
     """Letzte Fallback-Methode: Extrahiert Text als einfache Tabelle"""
+    deadline = deadline or Deadline()
     if logger:
         logger.info("Extrahiere Text als einfache Tabelle (letzte Option)")
     try:
         all_text = []
-        with pdfplumber.open(pdf_path) as pdf:
+        # Läuft immer (letzter Ausweg), endet nach Ablauf des Budgets aber nach der ersten Seite mit Text
+        with deadline.stage('text_simple') as stage, pdfplumber.open(pdf_path) as pdf:
             for page in pdf.pages:
+                if all_text and deadline.expired():
+                    deadline.mark_partial(stage)
+                    break
                 text = page.extract_text()
                 if text:
                     all_text.append(text)
@@ -276,8 +316,9 @@ def extract_auflagen_with_text(pdf_path, app, logger=None):
 
     try:
         with app.app_context():
-            from models import AuflagenCode
-            db_codes = {code.code: code.description for code in AuflagenCode.query.all()}
+            from code_store import code_cache
+            # Versionierter Cache statt Abfrage über die ganze Tabelle
+            db_codes = code_cache.codes()
         
         with pdfplumber.open(pdf_path) as pdf:
             for page in pdf.pages:
@@ -351,127 +392,54 @@ def extract_auflagen_with_text(pdf_path, app, logger=None):
 
     return codes_with_text
 
-def extract_auflagen_codes(tables, app, pdf_path, logger=None):
-    """Extrahiert Auflagen-Codes aus Tabellen und aktualisiert die Datenbank"""
-    codes = set()
-    code_pattern = re.compile(r"""
-        (?:
-            [A-Z][0-9]{1,3}[a-z]?|    # Bsp: A01, B123a
-            [0-9]{2,3}[A-Z]?|          # Bsp: 155, 12A
-            NoH|Lim                     # Spezielle Codes
-        )
-    """, re.VERBOSE)
-    
-    # Explizit erlaubte Spalten
-    allowed_columns = {
-        'reifenbezogene auflagen und hinweise',
-        'auflagen und hinweise',
-        'auflagen'
-    }
+def extract_auflagen_codes(tables, app, pdf_path, logger=None, extracted_texts=None, writer=None):
+    """Extrahiert Auflagen-Codes aus Tabellen und aktualisiert die Datenbank
 
-    # Explizit ausgeschlossene Spalten
-    excluded_columns = {
-        'handelsbezeichnung',
-        'fahrzeug-typ',
-        'abe/ewg-nr',
-        'fahrzeugtyp',
-        'typ',
-        'abe',
-        'ewg-nr'
-    }
+    extracted_texts kann übergeben werden, wenn die Auflagen-Texte der PDF schon vorliegen.
+    Mit writer (WriteBehindQueue) wird der Upsert nur eingereiht statt auf den Commit zu warten.
+    """
+    from utils import find_codes_in_columns
+    from column_roles import columns_with_role, CONDITIONS, TIRE_CONDITIONS
+
+    codes = set()
 
     for table in tables:
-        # Konvertiere alle Werte zu Strings und normalisiere Spaltennamen
+        # Konvertiere alle Werte zu Strings
         table_str = table.astype(str)
         
-        # Normalisiere Spaltennamen (zu Kleinbuchstaben und ohne Sonderzeichen)
-        normalized_columns = {
-            col: col.strip().lower().replace('/', '').replace('-', '').replace(' ', '')
-            for col in table_str.columns
-        }
-
-        for original_col, normalized_col in normalized_columns.items():
-            # Überspringe explizit ausgeschlossene Spalten
-            if any(excl in normalized_col for excl in excluded_columns):
-                continue
-                
-            # Prüfe nur erlaubte Spalten
-            if any(allowed in normalized_col for allowed in allowed_columns):
-                for value in table_str[original_col]:
-                    matches = code_pattern.findall(str(value))
-                    codes.update(matches)
+        # Nur Auflagen-Spalten; Fahrzeug-, Typ- und ABE-Spalten haben eine andere Rolle
+        code_columns = columns_with_role(table_str, CONDITIONS, TIRE_CONDITIONS)
+        # Ein Regex-Durchlauf pro Tabelle statt findall pro Zelle
+        codes.update(find_codes_in_columns(table_str, code_columns))
     
     # Extrahiere auch die Auflagen-Texte aus der PDF
-    extracted_texts = extract_auflagen_with_text(pdf_path, app, logger)
+    if extracted_texts is None:
+        extracted_texts = extract_auflagen_with_text(pdf_path, app, logger)
     if logger:
         logger.info(f"Gefundene Auflagen-Texte: {len(extracted_texts)}")
         for code, text in extracted_texts.items():
             logger.info(f"Code {code}: {text[:100]}...")
     
-    # Modifizierte Logik für das Speichern der Codes mit Texten
-    with app.app_context():
-        from models import AuflagenCode
-        from extensions import db
-        
-        # Lade AUFLAGEN_TEXTE für Fallback
-        from utils import AUFLAGEN_TEXTE
-        
-        existing_codes = set(code.code for code in AuflagenCode.query.all())
-        new_codes = codes - existing_codes
-        
-        for code in new_codes:
-            description = extracted_texts.get(code)  # Versuche zuerst den extrahierten Text
-            if not description:  # Falls nicht gefunden, verwende Standard-Text
-                description = AUFLAGEN_TEXTE.get(code, "Keine Beschreibung verfügbar")
-            
-            new_code = AuflagenCode(
-                code=code,
-                description=description
-            )
-            db.session.add(new_code)
-        
-        db.session.commit()
-
     # Kombiniere gefundene Codes mit ihren Texten
-    codes_with_text = {}
-    for code in codes:
-        # Stelle sicher, dass AUFLAGEN_TEXTE auch hier verfügbar ist
-        from utils import AUFLAGEN_TEXTE
-        description = extracted_texts.get(code, AUFLAGEN_TEXTE.get(code, "Keine Beschreibung verfügbar"))
-        codes_with_text[code] = description
-    
-    # Speichere in der Datenbank
+    from utils import AUFLAGEN_TEXTE
+    codes_with_text = {
+        code: extracted_texts.get(code, AUFLAGEN_TEXTE.get(code, "Keine Beschreibung verfügbar"))
+        for code in codes
+    }
+
+    if writer is not None:
+        writer.enqueue_codes(codes_with_text)
+        return sorted(list(codes))
+
+    # Ein Bulk-Upsert (INSERT ... ON CONFLICT DO UPDATE) in einer Transaktion
     try:
         with app.app_context():
-            from models import AuflagenCode
-            from extensions import db
-            
-            for code, description in codes_with_text.items():
-                # Prüfe, ob der Code bereits existiert
-                existing_code = AuflagenCode.query.filter_by(code=code).first()
-                
-                if existing_code:
-                    # Aktualisiere nur, wenn der Text sich geändert hat
-                    if existing_code.description != description:
-                        existing_code.description = description
-                        if logger:
-                            logger.info(f"Aktualisiere Code {code} in der Datenbank")
-                else:
-                    # Füge neuen Code hinzu
-                    new_code = AuflagenCode(code=code, description=description)
-                    db.session.add(new_code)
-                    if logger:
-                        logger.info(f"Füge neuen Code {code} zur Datenbank hinzu")
-            
-            db.session.commit()
+            from code_store import upsert_codes
+            upsert_codes(codes_with_text)
             if logger:
-                logger.info("Datenbank erfolgreich aktualisiert")
-            
+                logger.info(f"Datenbank erfolgreich aktualisiert ({len(codes_with_text)} Codes)")
     except Exception as e:
         if logger:
             logger.error(f"Fehler beim Speichern in der Datenbank: {str(e)}")
-        with app.app_context():
-            from extensions import db
-            db.session.rollback()
     
     return sorted(list(codes))
@@ -0,0 +1,108 @@
+import numpy as np
+
+from column_roles import (
+    classify_header, CONDITIONS, TIRE_CONDITIONS, TIRE_SIZE, VEHICLE_ROLES, CONDITION_ROLES
+)
+
+
+def column_code_rows(series, matcher):
+    """Ein Automaten-Durchlauf pro Spalte; liefert (Zeilenindex, Code)-Paare aller Treffer"""
+    values = series.tolist()
+    # Startoffset jeder Zelle im zeilengetrennten Puffer
+    lengths = np.fromiter((len(value) + 1 for value in values), dtype=np.int64, count=len(values))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    hits = list(matcher.scan('\n'.join(values)))
+    if not hits:
+        return np.empty(0, dtype=np.int64), []
+    positions = np.fromiter((start for start, _ in hits), dtype=np.int64, count=len(hits))
+    rows = np.searchsorted(starts, positions, side='right') - 1
+    return rows, [code for _, code in hits]
+
+
+def _code_matrix(df, columns, matcher, vocabulary):
+    """Boolesche Matrix Zeilen × Codes für die angegebenen Spalten (Vokabular wird erweitert)"""
+    entries = []
+    for col in columns:
+        rows, codes = column_code_rows(df[col], matcher)
+        entries.append((rows, [vocabulary.setdefault(code, len(vocabulary)) for code in codes]))
+    matrix = np.zeros((len(df), max(len(vocabulary), 1)), dtype=bool)
+    for rows, code_ids in entries:
+        matrix[rows, code_ids] = True
+    return matrix
+
+
+def analyze_table_rows(table_name, df, matcher, rules):
+    """Bewertet jede Fahrzeugzeile einer Tabelle auf einmal (Matrix-Operationen statt Schleife pro Zeile)
+
+    Reifenbezogene Auflagen gelten für die eigene Zeile, allgemeine Auflagen für alle
+    Zeilen des Fahrzeugs (im Gutachten stehen sie nur in der ersten Zeile).
+    """
+    roles = {col: classify_header(col) for col in df.columns}
+    vehicle_cols = [col for col in df.columns if roles[col] & VEHICLE_ROLES]
+    condition_cols = [col for col in df.columns if roles[col] & CONDITION_ROLES]
+    if not vehicle_cols or not condition_cols or df.empty:
+        return []
+    row_cols = [col for col in condition_cols if TIRE_CONDITIONS in roles[col]]
+    general_cols = [col for col in condition_cols if CONDITIONS in roles[col]]
+    tire_cols = [col for col in df.columns if TIRE_SIZE in roles[col]]
+
+    df = df.fillna('').astype(str)
+    vehicle_cells = df[vehicle_cols[0]]
+    block_ids = (vehicle_cells.str.strip() != '').cumsum().to_numpy()
+
+    vocabulary = {}
+    row_matrix = _code_matrix(df, row_cols, matcher, vocabulary)
+    general_matrix = _code_matrix(df, general_cols, matcher, vocabulary)
+    width = max(len(vocabulary), 1)
+    row_matrix = np.pad(row_matrix, ((0, 0), (0, width - row_matrix.shape[1])))
+
+    # Allgemeine Auflagen je Fahrzeug-Block zusammenfassen und auf alle Zeilen des Blocks verteilen
+    block_matrix = np.zeros((block_ids.max() + 1, width), dtype=bool)
+    np.logical_or.at(block_matrix, block_ids, general_matrix)
+    matrix = row_matrix | block_matrix[block_ids]
+
+    # Regeln als Vektoren über das Vokabular
+    codes = np.array(sorted(vocabulary, key=vocabulary.get) or [''], dtype=object)
+    weights = np.array([rules.rules[code][3] if code in rules.rules else 0 for code in codes], dtype=np.int64)
+    code_counts = matrix.sum(axis=1)
+    rating = matrix @ weights - 10 * (code_counts == 0)
+    confidence = 70 + np.minimum(code_counts * 5, 20)
+
+    # Konfliktpaare, deren beide Codes in der Tabelle vorkommen
+    conflicts = [(code_a, code_b, rating_penalty, confidence_penalty)
+                 for code_a in vocabulary for code_b, rating_penalty, confidence_penalty, _ in rules.conflicts.get(code_a, ())
+                 if code_b in vocabulary]
+    for code_a, code_b, rating_penalty, confidence_penalty in conflicts:
+        if code_a in vocabulary and code_b in vocabulary:
+            both = matrix[:, vocabulary[code_a]] & matrix[:, vocabulary[code_b]]
+            rating -= rating_penalty * both
+            confidence -= confidence_penalty * both
+    confidence = np.clip(confidence, 0, 100)
+
+    block_starts = {}
+    for row_idx in np.flatnonzero(vehicle_cells.str.strip() != ''):
+        block_starts[block_ids[row_idx]] = vehicle_cells.iloc[row_idx]
+
+    results = []
+    for position in np.flatnonzero(block_ids > 0):
+        vehicle_text = block_starts[block_ids[position]].strip()
+        results.append({
+            'table': table_name,
+            'row': int(df.index[position]),
+            'vehicle': vehicle_text.split('\n')[0],
+            'vehicle_details': vehicle_text,
+            'tire': ' '.join(df[col].iloc[position] for col in tire_cols).strip(),
+            'codes': sorted(codes[matrix[position]].tolist()),
+            'rating': int(rating[position]),
+            'confidence': int(confidence[position]),
+            'is_free': bool(rating[position] > 0),
+        })
+    return results
+
+
+def analyze_rows(tables, matcher, rules):
+    """Bewertung pro Fahrzeugzeile über alle Tabellen; tables ist eine Liste von (Name, DataFrame)"""
+    results = []
+    for table_name, df in tables:
+        results.extend(analyze_table_rows(table_name, df, matcher, rules))
+    return results
@@ -0,0 +1,183 @@
+import hashlib
+import threading
+
+from sqlalchemy import event, select, update, insert, text
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import FreedomRule, RuleConflict, TableVersion
+
+# Ausgangsregeln, mit denen eine leere Regel-Tabelle befüllt wird (entspricht der bisherigen Logik)
+DEFAULT_RULES = [
+    ('A02', 'positive', 40), ('A08', 'positive', 40),  # bestätigen Eintragungsfreiheit
+    ('A01', 'negative', -50), ('A03', 'negative', -50),  # erfordern Eintragung
+] + [(code, 'conditional', 0) for code in ('A04', 'A05', 'A06', 'A07', 'A09', 'A10', 'A11', 'A14', 'A15')]
+
+DEFAULT_CONFLICTS = [
+    ('A02', 'A03', 30, 20,
+     "Widersprüchliche Codes gefunden (A02 und A03) - im Zweifelsfall ist Eintragung erforderlich"),
+]
+
+# Begründungstext und Auswirkung je Kategorie
+CATEGORY_REASONS = {
+    'positive': ('positive', 'positive', "Code {code} weist auf Eintragungsfreiheit hin: {description}"),
+    'negative': ('negative', 'negative', "Code {code} weist auf Eintragungspflicht hin: {description}"),
+    'conditional': ('neutral', 'neutral', "Code {code} benötigt weitere Bewertung: {description}"),
+}
+UNKNOWN_RULE = ('neutral', 'neutral', "Code {code} konnte nicht bewertet werden: {description}", 0)
+
+
+class CompiledRuleSet:
+    """Unveränderlicher, kompilierter Regelsatz: Hash-Lookup pro Code, vorberechnete Konfliktpaare"""
+    def __init__(self, rules, conflicts):
+        rules = [tuple(rule) for rule in rules]
+        conflicts = [tuple(conflict) for conflict in conflicts]
+        # Prüfsumme des Regelsatzes, z.B. als Teil von Cache-Schlüsseln
+        self.version = hashlib.sha1(repr((sorted(rules), sorted(conflicts))).encode('utf-8')).hexdigest()
+        # code -> (impact, Reason-Typ, Vorlage, Gewicht)
+        self.rules = {}
+        for code, category, weight in rules:
+            impact, reason_type, template = CATEGORY_REASONS.get(category, UNKNOWN_RULE[:3])
+            self.rules[code] = (impact, reason_type, template, weight)
+        # code_a -> [(code_b, Rating-Abzug, Zuverlässigkeits-Abzug, Meldung), ...]
+        self.conflicts = {}
+        for code_a, code_b, rating_penalty, confidence_penalty, message in conflicts:
+            self.conflicts.setdefault(code_a, []).append((code_b, rating_penalty, confidence_penalty, message))
+
+    def evaluate_codes(self, codes, auflagen_db):
+        """Bewertet Codes einzeln; liefert (Rating, Begründungen, condition_codes)"""
+        rating = 0
+        reasons = []
+        condition_codes = []
+        rules = self.rules
+        for code in codes:
+            description = auflagen_db.get(code, "Keine Beschreibung verfügbar")
+            impact, reason_type, template, weight = rules.get(code, UNKNOWN_RULE)
+            rating += weight
+            reasons.append({"type": reason_type, "text": template.format(code=code, description=description)})
+            condition_codes.append({"code": code, "description": description, "impact": impact})
+        return rating, reasons, condition_codes
+
+    def find_conflicts(self, codes):
+        """Alle Konflikte, deren beide Codes vorkommen (O(Anzahl Codes))"""
+        code_set = codes if isinstance(codes, (set, frozenset)) else set(codes)
+        found = []
+        for code in code_set:
+            for other, rating_penalty, confidence_penalty, message in self.conflicts.get(code, ()):
+                if other in code_set:
+                    found.append((code, other, rating_penalty, confidence_penalty, message))
+        # Reihenfolge unabhängig von der Iteration über das Set
+        found.sort(key=lambda conflict: (conflict[0], conflict[1]))
+        return found
+
+
+# Schlüssel der Regel-Tabellen in table_versions (gemeinsame Version beider Tabellen)
+RULES_VERSION_NAME = 'rules'
+
+# Der kompilierte Satz wird ersetzt, sobald die Versionszeile in der Datenbank steigt
+_compiled = None
+_compiled_version = None
+_tables_ready = False
+# Wiedereintrittsfähig: get_rule_set() legt unter der Sperre Tabellen an und befüllt sie
+_lock = threading.RLock()
+
+
+def _ensure_version_row(connection):
+    """Legt Regel-Tabellen, Versionszeile und (SQLite) Trigger an, falls sie fehlen"""
+    FreedomRule.__table__.create(connection, checkfirst=True)
+    RuleConflict.__table__.create(connection, checkfirst=True)
+    TableVersion.__table__.create(connection, checkfirst=True)
+    exists = connection.execute(
+        select(TableVersion.version).where(TableVersion.name == RULES_VERSION_NAME)
+    ).first()
+    if exists is None:
+        connection.execute(insert(TableVersion.__table__).values(name=RULES_VERSION_NAME, version=0))
+    if connection.dialect.name == 'sqlite':
+        # Trigger erfassen auch Änderungen direkt in der Datenbank (sqlite3, andere Prozesse ohne ORM)
+        for table in (FreedomRule.__tablename__, RuleConflict.__tablename__):
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                connection.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_version_{operation.lower()} "
+                    f"AFTER {operation} ON {table} BEGIN "
+                    f"UPDATE {TableVersion.__tablename__} SET version = version + 1 "
+                    f"WHERE name = '{RULES_VERSION_NAME}'; END"
+                ))
+
+
+def bump_rules_version(connection):
+    """Erhöht die Version der Regel-Tabellen auf der übergebenen Verbindung (also in deren Transaktion)"""
+    connection.execute(
+        update(TableVersion.__table__)
+        .where(TableVersion.name == RULES_VERSION_NAME)
+        .values(version=TableVersion.version + 1)
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    # ORM-Schreiber ohne SQLite-Trigger (z.B. PostgreSQL) erhöhen die Version im selben Flush
+    if any(isinstance(obj, (FreedomRule, RuleConflict)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        connection = session.connection()
+        if connection.dialect.name != 'sqlite':
+            bump_rules_version(connection)
+
+
+def _ensure_tables():
+    global _tables_ready
+    # init_db() läuft nur beim direkten Start von app.py
+    if not _tables_ready:
+        with _lock:
+            if not _tables_ready:
+                with db.engine.begin() as connection:
+                    _ensure_version_row(connection)
+                _tables_ready = True
+
+
+def rules_version():
+    """Aktuelle Version der Regel-Tabellen laut Datenbank (eine Primärschlüssel-Abfrage)"""
+    global _tables_ready
+    _ensure_tables()
+    version = db.session.execute(
+        select(TableVersion.version).where(TableVersion.name == RULES_VERSION_NAME)
+    ).scalar()
+    if version is None:
+        # Zeile wurde entfernt (z.B. Datenbank ersetzt); beim nächsten Zugriff neu anlegen
+        _tables_ready = False
+        return -1
+    return version
+
+
+def seed_default_rules():
+    """Legt Regel-Tabellen an und befüllt sie mit den Ausgangsregeln, falls leer"""
+    _ensure_tables()
+    if FreedomRule.query.first() is None and RuleConflict.query.first() is None:
+        db.session.add_all(FreedomRule(code=code, category=category, weight=weight)
+                           for code, category, weight in DEFAULT_RULES)
+        db.session.add_all(RuleConflict(code_a=code_a, code_b=code_b, rating_penalty=rating_penalty,
+                                        confidence_penalty=confidence_penalty, message=message)
+                           for code_a, code_b, rating_penalty, confidence_penalty, message in DEFAULT_CONFLICTS)
+        db.session.commit()
+
+
+def get_rule_set():
+    """Aktueller kompilierter Regelsatz (App-Kontext nötig); Leser halten eine feste Referenz"""
+    global _compiled, _compiled_version
+    version = rules_version()
+    compiled = _compiled
+    if compiled is not None and _compiled_version == version:
+        return compiled
+    with _lock:
+        if _compiled is None:
+            # Nur ein Thread befüllt leere Regel-Tabellen
+            seed_default_rules()
+            version = rules_version()
+        if _compiled is None or _compiled_version != version:
+            rules = db.session.query(FreedomRule.code, FreedomRule.category, FreedomRule.weight).order_by(FreedomRule.id)
+            conflicts = db.session.query(
+                RuleConflict.code_a, RuleConflict.code_b, RuleConflict.rating_penalty,
+                RuleConflict.confidence_penalty, RuleConflict.message
+            ).order_by(RuleConflict.id)
+            # Neuen Satz vollständig bauen und dann in einem Schritt austauschen
+            _compiled = CompiledRuleSet(rules.all(), conflicts.all())
+            _compiled_version = version
+        return _compiled
@@ -0,0 +1,146 @@
+import re
+import subprocess
+import threading
+import time
+
+# "openjdk version "17.0.8" 2023-07-18", "java version "1.8.0_381""
+JAVA_VERSION_PATTERN = re.compile(r'version\s+"([^"]+)"')
+
+
+class RuntimeProbe:
+    """Prüft die Java-Laufzeit einmal beim Start und danach periodisch im Hintergrund
+
+    Routen lesen nur den zwischengespeicherten Status, statt bei jeder Anfrage
+    "java -version" zu starten. Nach der ersten Prüfung wird die JVM mit einer kleinen
+    mitgelieferten PDF aufgewärmt (tabula lädt dabei seine Klassen); erst danach
+    meldet die Probe "bereit". Mit sandbox werden statt der JVM des Web-Prozesses die
+    Extraktions-Kindprozesse aufgewärmt, in denen die Extraktionen tatsächlich laufen.
+    """
+    def __init__(self, logger=None, interval=300, warmup_pdf=None, jvm_manager=None, timeout=10, sandbox=None):
+        self.logger = logger
+        self.interval = interval
+        self.warmup_pdf = warmup_pdf
+        self.jvm_manager = jvm_manager
+        self.sandbox = sandbox
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.status = {
+            'java_available': False,
+            'java_version': None,
+            'checked_at': None,
+            'check_ms': None,
+            'checks': 0,
+            'warmed_up': False,
+            'warmup_ms': None,
+            'warmup_error': None,
+        }
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    @property
+    def java_available(self):
+        """Zwischengespeichertes Ergebnis der letzten Prüfung (kein Prozessstart)"""
+        return self.status['java_available']
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def check(self):
+        """Startet "java -version" und aktualisiert den Status; liefert True, wenn Java verfügbar ist"""
+        started = time.perf_counter()
+        version = None
+        try:
+            output = subprocess.check_output(['java', '-version'], stderr=subprocess.STDOUT, timeout=self.timeout)
+            match = JAVA_VERSION_PATTERN.search(output.decode('utf-8', errors='replace'))
+            version = match.group(1) if match else 'unbekannt'
+            available = True
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError, OSError):
+            available = False
+        with self.lock:
+            changed = available != self.status['java_available']
+            self.status.update({
+                'java_available': available,
+                'java_version': version,
+                'checked_at': time.time(),
+                'check_ms': round((time.perf_counter() - started) * 1000, 1),
+                'checks': self.status['checks'] + 1,
+            })
+        if changed or self.status['checks'] == 1:
+            if available:
+                self._log('info', f"Java ist installiert und funktioniert (Version {version})")
+            else:
+                self._log('error', "Java ist nicht installiert oder der 'java' Befehl ist nicht im PATH.")
+        return available
+
+    def warm_up(self):
+        """Startet die JVM und lässt tabula einmal über die Aufwärm-PDF laufen"""
+        # Ohne Java lohnt sich nur das Aufwärmen der Kindprozesse (Interpreter, pdfplumber)
+        if not self.warmup_pdf or (self.sandbox is None and not self.java_available):
+            return False
+        started = time.perf_counter()
+        try:
+            if self.sandbox is not None:
+                if not self.sandbox.warm_up(self.warmup_pdf, use_java=self.java_available):
+                    raise RuntimeError("Kein Extraktionsprozess aufgewärmt")
+            else:
+                if self.jvm_manager:
+                    self.jvm_manager.initialize()
+                import tabula
+                tabula.read_pdf(self.warmup_pdf, pages=1, multiple_tables=True, lattice=True, silent=True)
+            error = None
+        except Exception as e:
+            error = str(e)
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        with self.lock:
+            self.status.update({'warmed_up': error is None, 'warmup_ms': elapsed, 'warmup_error': error})
+        if error:
+            self._log('warning', f"JVM-Aufwärmen fehlgeschlagen: {error}")
+        else:
+            self._log('info', f"JVM aufgewärmt ({elapsed} ms)")
+        return error is None
+
+    def start(self):
+        """Erste Prüfung sofort, Aufwärmen und weitere Prüfungen im Hintergrund-Thread"""
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='runtime-probe', daemon=True)
+        self.check()
+        self._thread.start()
+
+    def _run(self):
+        self.warm_up()
+        # Ohne Java ist die App trotzdem bereit (Fallback-Extraktion mit pdfplumber)
+        self._ready.set()
+        while not self._stopping.wait(self.interval):
+            was_available = self.java_available
+            if self.check() and not was_available:
+                # Java wurde nachträglich installiert
+                self.warm_up()
+
+    def refresh(self):
+        """Sofortige Neuprüfung, z.B. nach einer Java-Installation"""
+        was_available = self.java_available
+        available = self.check()
+        if available and not was_available:
+            threading.Thread(target=self.warm_up, name='runtime-probe-warmup', daemon=True).start()
+        return available
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def stop(self):
+        self._stopping.set()
+
+    def snapshot(self):
+        with self.lock:
+            status = dict(self.status)
+        status['ready'] = self.ready
+        return status
@@ -0,0 +1,163 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import jpype
+import jpype.imports  # noqa: F401 (aktiviert "import java..." und "import technology...")
+
+# Entspricht den Optionen, mit denen tabula-py die JVM selbst starten würde
+JAVA_OPTIONS = (
+    '-Djava.awt.headless=true',
+    '-Dfile.encoding=UTF8',
+    '-Dorg.slf4j.simpleLogger.defaultLogLevel=off',
+    '-Dorg.apache.commons.logging.Log=org.apache.commons.logging.impl.NoOpLog',
+)
+
+
+class TabulaRuntime:
+    """Thread-sichere Ausführung von tabula-java in der einen JVM des Prozesses (JPype)
+
+    Die JVM wird genau einmal gestartet, mit tabula-java im Klassenpfad. Wird sie ohne
+    tabula-java gestartet, findet tabula-py die Klassen nicht und startet für jeden
+    Aufruf einen eigenen "java"-Prozess. Aufrufende Threads werden für die Dauer der
+    Extraktion an die JVM angehängt und danach wieder gelöst; gleichzeitige tabula-Aufrufe
+    werden auf max_concurrency begrenzt (1 = streng nacheinander).
+    """
+    def __init__(self, logger=None, max_concurrency=1, java_options=JAVA_OPTIONS):
+        self.logger = logger
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.java_options = list(java_options)
+        self.lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._started = False
+        self.in_process = False
+        self.error = None
+        self._active = 0
+        self.counters = {
+            'calls': 0,
+            'errors': 0,
+            'attached_threads': 0,
+            'max_parallel': 0,
+            'wait_ms_total': 0.0,
+            'call_ms_total': 0.0,
+        }
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def start(self):
+        """Startet die JVM (einmal pro Prozess) und installiert das In-Process-Backend; liefert True bei Erfolg"""
+        if self._started:
+            return self.in_process
+        with self.lock:
+            if self._started:
+                return self.in_process
+            try:
+                import tabula.io as tabula_io
+                from tabula.backend import jar_path
+                if not jpype.isJVMStarted():
+                    # Der Klassenpfad lässt sich nach dem Start nicht mehr erweitern
+                    jpype.addClassPath(jar_path())
+                    jpype.startJVM(*self.java_options, convertStrings=False)
+                import technology.tabula as tabula_java
+                from java.lang import StringBuilder
+                from org.apache.commons.cli import DefaultParser
+                # tabula-py ruft alle Extraktionen über dieses Modul-Attribut auf
+                tabula_io._tabula_vm = _ThreadSafeTabulaVm(self, tabula_java, StringBuilder, DefaultParser)
+                self.in_process = True
+                self._log('info', f"tabula-java läuft in der Prozess-JVM (max. {self.max_concurrency} gleichzeitig)")
+                self._started = True
+            except Exception as e:
+                self.error = str(e)
+                self._log('warning', f"tabula-java nicht in der Prozess-JVM verfügbar, tabula-py startet Java-Prozesse: {e}")
+                # Ohne laufende JVM (z.B. Java fehlt noch) beim nächsten Aufruf erneut versuchen
+                self._started = jpype.isJVMStarted()
+        return self.in_process
+
+    @contextmanager
+    def attached(self):
+        """Hängt den aufrufenden Thread an die JVM an und löst ihn danach wieder, wenn er vorher nicht angehängt war"""
+        thread = jpype.JClass('java.lang.Thread')
+        attach = not thread.isAttached()
+        if attach:
+            # Als Daemon, damit ein hängender Worker das Beenden der JVM nicht blockiert
+            thread.attachAsDaemon()
+            with self.lock:
+                self.counters['attached_threads'] += 1
+        try:
+            yield
+        finally:
+            # Der Haupt-Thread bleibt angehängt (er hat die JVM gestartet)
+            if attach and threading.current_thread() is not threading.main_thread():
+                thread.detach()
+
+    @contextmanager
+    def slot(self):
+        """Begrenzt gleichzeitige tabula-Aufrufe und zählt Warte- und Laufzeiten"""
+        waiting = time.perf_counter()
+        with self._slots:
+            started = time.perf_counter()
+            with self.lock:
+                self._active += 1
+                self.counters['max_parallel'] = max(self.counters['max_parallel'], self._active)
+                self.counters['wait_ms_total'] += (started - waiting) * 1000
+            try:
+                yield
+            finally:
+                with self.lock:
+                    self._active -= 1
+                    self.counters['calls'] += 1
+                    self.counters['call_ms_total'] += (time.perf_counter() - started) * 1000
+
+    def read_pdf(self, pdf_path, **kwargs):
+        """tabula.read_pdf über die Prozess-JVM (startet sie bei Bedarf)"""
+        self.start()
+        import tabula
+        return tabula.read_pdf(pdf_path, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            active = self._active
+        calls = stats['calls']
+        stats.update({
+            'in_process': self.in_process,
+            'jvm_started': jpype.isJVMStarted(),
+            'max_concurrency': self.max_concurrency,
+            'active': active,
+            'avg_call_ms': round(stats['call_ms_total'] / calls, 1) if calls else 0.0,
+            'avg_wait_ms': round(stats['wait_ms_total'] / calls, 1) if calls else 0.0,
+            'error': self.error,
+        })
+        stats['call_ms_total'] = round(stats['call_ms_total'], 1)
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 1)
+        return stats
+
+
+class _ThreadSafeTabulaVm:
+    """Ersatz für tabula.backend.TabulaVm mit eigenem Kommandozeilen-Parser je Aufruf
+
+    TabulaVm teilt sich einen DefaultParser (commons-cli, nicht thread-sicher) zwischen
+    allen Aufrufen und hängt Threads nicht explizit an.
+    """
+    def __init__(self, runtime, tabula_java, string_builder, parser_class):
+        self.runtime = runtime
+        self.tabula = tabula_java
+        self.string_builder = string_builder
+        self.parser_class = parser_class
+
+    def call_tabula_java(self, options, path=None):
+        args = options.build_option_list()
+        if path:
+            args.insert(0, path)
+        with self.runtime.slot(), self.runtime.attached():
+            try:
+                output = self.string_builder()
+                command = self.parser_class().parse(self.tabula.CommandLineApp.buildOptions(), args)
+                self.tabula.CommandLineApp(output, command).extractTables(command)
+                return str(output.toString())
+            except Exception:
+                with self.runtime.lock:
+                    self.runtime.counters['errors'] += 1
+                raise
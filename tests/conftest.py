@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+
+
+class StatementCounter:
+    """Zählt die an die Datenbank gesendeten Anweisungen (executemany zählt einmal)"""
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+@pytest.fixture
+def app():
+    """Flask-App mit SQLite-Datenbank im Speicher, die produktive auflagen.db bleibt unberührt"""
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def statements(app):
+    return StatementCounter(db.engine)
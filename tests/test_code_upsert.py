@@ -0,0 +1,67 @@
+"""Anzahl der SQL-Anweisungen für Code-Upsert (Extraktion) und Code-Abfrage (/results)
+
+Die Zahl der Anweisungen darf nicht mit der Zahl der gefundenen Codes wachsen.
+"""
+import pandas as pd
+import pytest
+
+from extensions import db
+from models import AuflagenCode
+from code_store import fetch_codes, IN_CHUNK_SIZE
+from document_store import write_document, document_codes
+from pdf_extractor import extract_auflagen_codes
+
+# Bulk-Upsert: ein INSERT ... ON CONFLICT für alle Codes (executemany) plus
+# Versionszeile der Code-Tabelle (Existenzprüfung, SELECT, UPDATE)
+UPSERT_BUDGET = 5
+# /results: Dokument und seine Codes (document_codes), Beschreibungen (fetch_codes je Block)
+RESULTS_BUDGET = 3
+
+
+def condition_tables(count):
+    """Tabelle mit count verschiedenen Codes in der Auflagen-Spalte"""
+    codes = [f"Z{i:03d}" for i in range(count)] + ['A12', 'A14', 'T89']
+    return [pd.DataFrame({
+        'Fahrzeug': [f"Fahrzeug {i}" for i in range(len(codes))],
+        'Auflagen und Hinweise': codes,
+    })]
+
+
+def seed(count=50):
+    db.session.add_all(AuflagenCode(code=f"Y{i:03d}", description=f"Seed {i}") for i in range(count))
+    # Ein Teil der gefundenen Codes existiert bereits mit abweichendem Text
+    db.session.add_all(AuflagenCode(code=code, description='veraltet') for code in ('A12', 'T89'))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('count', [10, 400])
+def test_extract_codes_upserts_with_constant_statements(app, statements, count):
+    seed()
+    extracted_texts = {'A12': 'Text aus dem Gutachten'}
+
+    before = statements.count
+    codes = extract_auflagen_codes(condition_tables(count), app, None, None, extracted_texts, writer=None)
+    used = statements.count - before
+
+    assert len(codes) == count + 3
+    assert used <= UPSERT_BUDGET, f"{used} Anweisungen für {len(codes)} Codes"
+    stored = dict(db.session.query(AuflagenCode.code, AuflagenCode.description))
+    assert stored['A12'] == 'Text aus dem Gutachten'
+    assert stored['T89'] != 'veraltet'
+    assert set(codes) <= set(stored)
+
+
+@pytest.mark.parametrize('count', [10, 400])
+def test_results_loads_codes_with_constant_statements(app, statements, count):
+    codes = extract_auflagen_codes(condition_tables(count), app, None, None, {}, writer=None)
+    write_document('gutachten.pdf', [], codes, document_hash='0' * 64)
+    db.session.commit()
+
+    before = statements.count
+    found = document_codes('gutachten')
+    descriptions = fetch_codes(found)
+    used = statements.count - before
+
+    assert found == sorted(codes)
+    assert sorted(descriptions) == sorted(codes)
+    assert used <= RESULTS_BUDGET + (len(codes) - 1) // IN_CHUNK_SIZE, f"{used} Anweisungen für {len(codes)} Codes"
@@ -0,0 +1,239 @@
+import re
+import bisect
+import threading
+
+from column_roles import (
+    classify_header, VEHICLE, VEHICLE_TYPE, APPROVAL, CONDITIONS, VEHICLE_ROLES, CONDITION_ROLES
+)
+
+# EG-Typgenehmigungsnummer, z.B. e1*2001/116*0242*05 (Erweiterung optional, ".." = beliebig)
+APPROVAL_PATTERN = re.compile(r"""
+    \be\s?(\d{1,2})                             # Mitgliedstaat (e1 = Deutschland)
+    \*(\d{2,4}/\d{1,4}(?:/(?:eg|ewg|ec|eu))?)   # Richtlinie/Verordnung
+    \*(\d{1,5})                                 # Basisnummer
+    (?:\*(\d{1,2}|\.\.))?                       # Erweiterung
+""", re.VERBOSE | re.IGNORECASE)
+
+# Nationale ABE/KBA-Nummern, z.B. "ABE 52767" oder "KBA 48123"
+NATIONAL_APPROVAL_PATTERN = re.compile(r'\b(?:abe|kba)\s*(?:nr\.?)?\s*(\d{4,6})\b', re.IGNORECASE)
+
+# Zeilenumbrüche und Leerzeichen um "*" (z.B. "e1*2001/116*\n0430") zusammenziehen
+STAR_SPACING = re.compile(r'\s*\*\s*')
+
+
+def parse_approval_numbers(text):
+    """Parst alle Typgenehmigungsnummern eines Textes in kanonische Form
+
+    Liefert eine Liste von (Schlüssel, Erweiterung), Schlüssel z.B. "e1*2001/116*0430".
+    """
+    text = STAR_SPACING.sub('*', str(text))
+    approvals = []
+    for state, directive, base, extension in APPROVAL_PATTERN.findall(text):
+        key = f"e{int(state)}*{directive.lower()}*{int(base):04d}"
+        approvals.append((key, extension or None))
+    for number in NATIONAL_APPROVAL_PATTERN.findall(text):
+        approvals.append((f"kba*{number}", None))
+    return approvals
+
+
+def canonical_approval(query, prefix=False):
+    """Bringt eine Nutzereingabe in die Schlüsselform des Index"""
+    if not prefix:
+        parsed = parse_approval_numbers(query)
+        if parsed:
+            return parsed[0][0]
+    # Präfixe sind meist unvollständig und lassen sich nicht voll parsen
+    return STAR_SPACING.sub('*', str(query).strip().lower()).replace(' ', '')
+
+
+def canonical_type(value):
+    """Kanonische Form eines Fahrzeug-Typs (Großschreibung, ohne Leerzeichen)"""
+    return re.sub(r'\s+', '', str(value)).upper()
+
+
+def split_type_codes(value):
+    """Zerlegt eine Typ-Angabe wie "639/2, 639/4" in einzelne kanonische Typen"""
+    return [canonical_type(part) for part in re.split(r'[,;]', str(value)) if part.strip()]
+
+
+class SortedKeyIndex:
+    """Sortierte Schlüsselliste mit exakter und Präfix-Suche per Binärsuche (O(log n))"""
+    def __init__(self):
+        self._entries = {}
+        self._keys = []
+        self._dirty = False
+
+    def add(self, key, entry):
+        self._entries.setdefault(key, []).append(entry)
+        self._dirty = True
+
+    def remove_where(self, predicate):
+        """Entfernt alle Einträge, für die predicate(entry) zutrifft"""
+        for key in list(self._entries):
+            kept = [entry for entry in self._entries[key] if not predicate(entry)]
+            if kept:
+                self._entries[key] = kept
+            else:
+                del self._entries[key]
+        self._dirty = True
+
+    def _sorted_keys(self):
+        if self._dirty:
+            self._keys = sorted(self._entries)
+            self._dirty = False
+        return self._keys
+
+    def exact(self, key):
+        keys = self._sorted_keys()
+        pos = bisect.bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            return list(self._entries[key])
+        return []
+
+    def prefix(self, prefix, limit=None):
+        keys = self._sorted_keys()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff')
+        results = []
+        for key in keys[start:end]:
+            results.extend(self._entries[key])
+            if limit and len(results) >= limit:
+                return results[:limit]
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _codes_in(values, matcher):
+    """Findet bekannte Auflagen-Codes in einer Liste von Zellwerten (sortiert, dedupliziert)"""
+    return sorted(matcher.find_codes('\n'.join(v for v in values if isinstance(v, str))))
+
+
+def extract_vehicle_records(pdf_id, table_name, df, matcher):
+    """Zerlegt eine Fahrzeugtabelle in Fahrzeug-Blöcke mit Typ, Genehmigungen, Zeilen und Codes
+
+    Zeilen mit leerer Fahrzeugzelle gehören zum vorherigen Fahrzeug (Folgezeilen im Gutachten).
+    matcher ist der CodeMatcher aus get_code_matcher(), damit /lookup dieselben Codes liefert
+    wie /results (Zahlen wie Traglast oder ET sind keine Codes).
+    """
+    roles = {col: classify_header(col) for col in df.columns}
+    vehicle_cols = [col for col in df.columns if roles[col] & VEHICLE_ROLES]
+    if not vehicle_cols:
+        return []
+    condition_cols = [col for col in df.columns if roles[col] & CONDITION_ROLES]
+    general_cols = [col for col in condition_cols if CONDITIONS in roles[col]]
+
+    records = []
+    current = None
+    for row_idx, row in df.iterrows():
+        vehicle_text = '\n'.join(str(row[col]) for col in vehicle_cols if str(row[col]).strip())
+        if vehicle_text.strip():
+            current = _parse_vehicle_cell(vehicle_text, vehicle_cols, row, roles)
+            current.update({
+                'document': pdf_id,
+                'table': table_name,
+                'general_codes': _codes_in([row[col] for col in general_cols], matcher),
+                'rows': [],
+            })
+            records.append(current)
+        if current is None:
+            continue
+        row_codes = _codes_in([row[col] for col in condition_cols], matcher)
+        current['rows'].append({
+            'row': int(row_idx),
+            'values': {str(col): row[col] for col in df.columns},
+            'codes': sorted(set(row_codes) | set(current['general_codes'])),
+        })
+    return records
+
+
+def _parse_vehicle_cell(vehicle_text, vehicle_cols, row, roles):
+    """Trennt Handelsbezeichnung, Typ und Genehmigungsnummern einer Fahrzeugzelle"""
+    approvals = parse_approval_numbers(vehicle_text)
+    types = []
+    name_lines = []
+
+    # Eigene Typ-Spalte hat Vorrang vor der Heuristik für kombinierte Spalten
+    type_cols = [col for col in vehicle_cols if VEHICLE_TYPE in roles[col]
+                 and not roles[col] & {VEHICLE, APPROVAL}]
+    if type_cols:
+        for col in type_cols:
+            types.extend(split_type_codes(row[col]))
+        name_lines = [str(row[col]).strip() for col in vehicle_cols
+                      if VEHICLE in roles[col] and str(row[col]).strip()]
+    else:
+        # Kombinierte Zelle: Name (ggf. mehrzeilig), dann Typ, dann Genehmigungen
+        lines = [line.strip() for line in vehicle_text.split('\n') if line.strip()]
+        approval_line = next((i for i, line in enumerate(lines) if re.match(r'e\s?\d{1,2}\s*\*', line, re.IGNORECASE)), None)
+        if approval_line is not None and approval_line > 0:
+            types = split_type_codes(lines[approval_line - 1])
+            name_lines = lines[:approval_line - 1]
+        elif lines:
+            name_lines = lines[:1]
+
+    return {
+        'vehicle': ' '.join(name_lines),
+        'types': types,
+        'approvals': [{'number': key, 'extension': extension} for key, extension in approvals],
+    }
+
+
+class TypedLookupIndex:
+    """Typisierter Index über Genehmigungsnummern und Fahrzeug-Typen aller extrahierten PDFs"""
+    def __init__(self):
+        self.approvals = SortedKeyIndex()
+        self.types = SortedKeyIndex()
+        self.documents = set()
+        # Automat, mit dem die Codes eines Dokuments erkannt wurden (neuer Automat = Code-Tabelle geändert)
+        self.matchers = {}
+        self.lock = threading.Lock()
+
+    def index_document(self, pdf_id, tables, matcher):
+        """(Re-)indiziert alle Fahrzeugtabellen einer PDF; matcher erkennt die Auflagen-Codes"""
+        records = []
+        for table_name, df in tables:
+            records.extend(extract_vehicle_records(pdf_id, table_name, df, matcher))
+        with self.lock:
+            self._remove(pdf_id)
+            for record in records:
+                for approval in record['approvals']:
+                    self.approvals.add(approval['number'], record)
+                for type_code in record['types']:
+                    self.types.add(type_code, record)
+            self.documents.add(pdf_id)
+            self.matchers[pdf_id] = matcher
+        return len(records)
+
+    def is_current(self, pdf_id, matcher):
+        """Dokument ist indiziert, und zwar mit dem aktuellen Code-Automaten"""
+        with self.lock:
+            return pdf_id in self.documents and self.matchers.get(pdf_id) is matcher
+
+    def remove_document(self, pdf_id):
+        with self.lock:
+            self._remove(pdf_id)
+
+    def _remove(self, pdf_id):
+        if pdf_id in self.documents:
+            self.approvals.remove_where(lambda record: record['document'] == pdf_id)
+            self.types.remove_where(lambda record: record['document'] == pdf_id)
+            self.documents.discard(pdf_id)
+            self.matchers.pop(pdf_id, None)
+
+    def lookup(self, query, kind='approval', mode='exact', limit=None):
+        """Sucht Fahrzeuge nach Genehmigungsnummer oder Typ; liefert (kanonischer Schlüssel, Treffer)"""
+        if kind == 'approval':
+            key = canonical_approval(query, prefix=(mode == 'prefix'))
+            index = self.approvals
+        else:
+            key = canonical_type(query)
+            index = self.types
+        with self.lock:
+            if mode == 'prefix':
+                matches = index.prefix(key, limit)
+            else:
+                matches = index.exact(key)[:limit] if limit else index.exact(key)
+        # Ein Fahrzeug kann über mehrere Schlüssel gefunden werden
+        unique = list({id(record): record for record in matches}.values())
+        return key, unique
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Größe der Blöcke beim Lesen des Request-Bodys (WSGI-Pfad)
+CHUNK_SIZE = 256 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Upload überschreitet die zulässige Größe (MAX_CONTENT_LENGTH)"""
+
+
+class UploadWriter:
+    """Schreibt einen Upload blockweise in den Upload-Ordner und berechnet dabei den SHA-256
+
+    Geschrieben wird in eine .part-Datei in staging_folder, erst commit() verschiebt sie an
+    ihren Platz. Ein abgebrochener Upload hinterlässt so keine halbe PDF, die eine Extraktion
+    aufgreifen könnte; staging_folder muss auf demselben Dateisystem liegen wie folder.
+    """
+    def __init__(self, folder, filename, max_bytes=None, staging_folder=None):
+        self.filename = filename
+        self.path = os.path.join(folder, filename)
+        self.part_path = os.path.join(staging_folder or folder, f"{filename}.{uuid.uuid4().hex[:8]}.part")
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._file = open(self.part_path, 'wb')
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload größer als {self.max_bytes // (1024 * 1024)} MB")
+        self.digest.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self):
+        """Schließt die Datei und ersetzt eine vorhandene PDF gleichen Namens; liefert den SHA-256"""
+        self._file.close()
+        os.replace(self.part_path, self.path)
+        return self.digest.hexdigest()
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+
+class UploadJobs:
+    """Extraktionsaufträge gestreamter Uploads; Status wird abgefragt statt auf die Antwort zu warten"""
+    def __init__(self, workers=2, max_jobs=500):
+        self.executor = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix='upload-job')
+        self.max_jobs = max_jobs
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'bytes_received': 0}
+
+    def submit(self, filename, document_hash, size, task):
+        """Reiht task() ein; task liefert ein JSON-fähiges Ergebnis mit 'status'"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'document': filename,
+            'sha256': document_hash,
+            'size': size,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'result': None,
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+            # Älteste Aufträge verwerfen, damit das Register nicht unbegrenzt wächst
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+            self.counters['submitted'] += 1
+            self.counters['bytes_received'] += size
+        self.executor.submit(self._run, job, task)
+        return dict(job)
+
+    def _run(self, job, task):
+        job['status'] = 'running'
+        started = time.perf_counter()
+        try:
+            result = task()
+        except Exception as e:
+            result = {'document': job['document'], 'status': 'error', 'error': str(e)}
+        job['elapsed_ms'] = round((time.perf_counter() - started) * 1000)
+        job['result'] = result
+        job['status'] = 'done' if result.get('status') == 'success' else 'error'
+        with self.lock:
+            self.counters['completed' if job['status'] == 'done' else 'failed'] += 1
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            states = [job['status'] for job in self.jobs.values()]
+        stats.update({state: states.count(state) for state in ('queued', 'running')})
+        return stats
+
+    def stop(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -6,8 +6,13 @@ import os
 import pandas as pd
 import numpy as np
 import logging
+from collections import OrderedDict
 from functools import lru_cache
 
+from column_roles import (
+    column_roles, VEHICLE, VEHICLE_TYPE, MANUFACTURER, TIRE_SIZE, RIM_SIZE, OFFSET, LOAD, SPEED
+)
+
 # Constants - Auflagen codes and texts
 AUFLAGEN_CODES = [
     "155", 
@@ -38,6 +43,15 @@ AUFLAGEN_TEXTE = {
     "NoH": "Die Verwendung an Fahrzeugen mit Niveauregulierung ist nicht zulässig."
 }
 
+# Muster für Auflagen-Codes in Tabellenzellen und PDF-Text
+CODE_PATTERN = re.compile(r"""
+    (?:
+        [A-Z][0-9]{1,3}[a-z]?|    # Bsp: A01, B123a
+        [0-9]{2,3}[A-Z]?|          # Bsp: 155, 12A
+        NoH|Lim                     # Spezielle Codes
+    )
+""", re.VERBOSE)
+
 # Required packages definition
 required_packages = {
     'flask': 'Flask',
@@ -101,6 +115,61 @@ class TemporaryStorage:
         except Exception as e:
             print(f"Fehler bei der Bereinigung: {e}")
 
+class DocumentLRUCache:
+    """Begrenzter LRU-Cache, dessen Schlüssel mit der PDF-ID beginnen (für Invalidierung pro Dokument)"""
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def generation(self, pdf_id):
+        """Aktueller Stand eines Dokuments; vor der Berechnung abfragen und an put() übergeben"""
+        with self.lock:
+            return self.generations.get(pdf_id, 0)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation=None):
+        """Speichert einen Eintrag, sofern das Dokument seit generation nicht invalidiert wurde"""
+        with self.lock:
+            if generation is not None and generation != self.generations.get(key[0], 0):
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, pdf_id):
+        """Verwirft alle Einträge eines Dokuments, z.B. nach erneuter Extraktion"""
+        with self.lock:
+            self.generations[pdf_id] = self.generations.get(pdf_id, 0) + 1
+            for key in [key for key in self.entries if key[0] == pdf_id]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
 @lru_cache(maxsize=32)
 def is_valid_table(df, logger=None):
     """Überprüft, ob ein DataFrame eine echte Tabelle ist (mit Caching)"""
@@ -137,86 +206,166 @@ def convert_table_to_html(df):
         na_rep=''
     )
 
+def list_table_files(upload_folder, pdf_id, extensions=('.csv',)):
+    """Listet die extrahierten Tabellendateien einer PDF, sortiert nach Tabellennummer"""
+    table_files = [
+        filename for filename in os.listdir(upload_folder)
+        if filename.startswith(f"{pdf_id}_table_") and filename.endswith(extensions)
+    ]
+    table_files.sort(key=lambda f: int(f.rsplit('_table_', 1)[1].split('.')[0]))
+    return table_files
+
+def list_document_ids(upload_folder):
+    """Liefert die PDF-IDs aller Dokumente mit extrahierten CSV-Tabellen"""
+    return sorted({
+        filename.rsplit('_table_', 1)[0] for filename in os.listdir(upload_folder)
+        if '_table_' in filename and filename.endswith('.csv')
+    })
+
+def load_document_tables(upload_folder, pdf_id):
+    """Lädt alle CSV-Tabellen einer PDF als Liste von (Dateiname, DataFrame mit String-Werten)"""
+    tables = []
+    for table_file in list_table_files(upload_folder, pdf_id):
+        filepath = os.path.join(upload_folder, table_file)
+        try:
+            df = pd.read_csv(filepath, sep=';', encoding='utf-8-sig')
+        except Exception as e:
+            print(f"Error processing {table_file}: {str(e)}")
+            continue
+        tables.append((table_file, df.fillna('').astype(str)))
+    return tables
+
+def build_search_pattern(search_term):
+    """Kompiliert einen escapten, case-insensitiven Ausdruck für die Tabellensuche"""
+    return re.compile(re.escape(search_term), re.IGNORECASE)
+
+def highlight_matches(df, pattern):
+    """Markiert Treffer spaltenweise mit einem einzigen kompilierten Regex (ohne apply pro Zelle)"""
+    highlighted = df.copy()
+    for col in highlighted.columns:
+        highlighted[col] = highlighted[col].str.replace(pattern, r'<mark>\g<0></mark>', regex=True)
+    return highlighted
+
+def paginate_matches(matches, offset, limit):
+    """Schneidet eine Seite (offset/limit) aus den Treffern mehrerer Tabellen heraus
+    
+    matches ist eine Liste von (Tabellenname, DataFrame) in Anzeigereihenfolge.
+    """
+    page = []
+    skip = offset
+    remaining = limit
+    for name, df in matches:
+        if remaining <= 0:
+            break
+        if skip >= len(df):
+            skip -= len(df)
+            continue
+        part = df.iloc[skip:skip + remaining]
+        skip = 0
+        remaining -= len(part)
+        page.append((name, part))
+    return page
+
+# Spaltenrollen je Fahrzeug-Angabe (siehe column_roles)
+VEHICLE_KEY_ROLES = {
+    'Fahrzeug': (VEHICLE, VEHICLE_TYPE),
+    'Hersteller': (MANUFACTURER,),
+    'Typ': (VEHICLE_TYPE,),
+}
+
+# Spaltenrollen für Rad/Reifen-Angaben, die nicht per Muster in den Werten gefunden wurden
+WHEEL_TIRE_KEY_ROLES = {
+    'Reifengröße': (TIRE_SIZE,),
+    'Felgengröße': (RIM_SIZE,),
+    'Einpresstiefe': (OFFSET,),
+    'Hersteller': (MANUFACTURER,),
+    'Tragfähigkeit': (LOAD,),
+    'Geschwindigkeitsindex': (SPEED,),
+}
+
+# Direkte Werterkennung durch Muster
+WHEEL_TIRE_VALUE_PATTERNS = {
+    'Reifengröße': r'\d{3}/\d{2}[R]\d{2}',  # z.B. 205/55R16
+    'Felgengröße': r'\d{1,2}[,.]\d{1}[Jx]?\d{2}',  # z.B. 7J16 oder 7,5x16
+    'Einpresstiefe': r'ET\s*\d{1,2}',  # z.B. ET35
+}
+WHEEL_TIRE_GROUPS = {'Reifengröße': 'tire', 'Felgengröße': 'rim', 'Einpresstiefe': 'et'}
+
+# Trennt Zellen im Spaltenpuffer; wird von keinem Muster (auch nicht von \s) gematcht
+CELL_SEPARATOR = '\x00'
+
+@lru_cache(maxsize=8)
+def wheel_tire_value_pattern(keys):
+    """Kombinierter Ausdruck mit einer benannten Gruppe je noch gesuchtem Feld
+
+    Die Alternativen stehen in einem Lookahead, damit sich Treffer verschiedener Felder
+    nicht gegenseitig verbrauchen. Die Muster können nicht an derselben Stelle beginnen
+    (drei Ziffern + "/", ein bis zwei Ziffern + "," bzw. ".", "ET"), daher findet die
+    Alternation für jedes Feld denselben ersten Treffer wie eine Einzelsuche.
+    """
+    alternatives = '|'.join(
+        f"(?P<{WHEEL_TIRE_GROUPS[key]}>{WHEEL_TIRE_VALUE_PATTERNS[key]})" for key in keys
+    )
+    return re.compile(f"(?=(?:{alternatives}))", re.IGNORECASE)
+
+def _first_valid_value(df, col, cache):
+    """Erster verwertbarer Wert einer Spalte (Länge > 2, nicht "nan"), je Spalte nur einmal berechnet"""
+    if col not in cache:
+        value = None
+        for val in df[col].unique():
+            if isinstance(val, str) and len(val) > 2 and val.lower() not in ('nan', 'none'):
+                value = val
+                break
+        cache[col] = value
+    return cache[col]
+
+def _values_by_role(df, key_roles, info):
+    """Ergänzt info um den ersten verwertbaren Wert der ersten Spalte mit passender Rolle"""
+    first_values = {}
+    roles_by_column = column_roles(df)
+    for target, roles in key_roles.items():
+        if target in info:
+            continue
+        for col in [col for col, col_roles in roles_by_column.items() if col_roles.intersection(roles)]:
+            value = _first_valid_value(df, col, first_values)
+            if value is not None:
+                info[target] = value
+                break
+    return info
+
 def extract_vehicle_info(df):
     """Extrahiert Fahrzeuginformationen aus DataFrame"""
-    vehicle_info = {}
-    
-    # Typische Spalten und ihre normalisierte Form
-    key_columns = {
-        'fahrzeug': ['fzg', 'fahrzeugtyp', 'typ', 'modell', 'vehicle'],
-        'hersteller': ['manufacturer', 'marke', 'fabrikat'],
-        'typ': ['type', 'fahrzeugtyp', 'typen', 'modell']
-    }
-    
-    # Normalisiere Spaltennamen
-    normalized_columns = {col.lower().strip(): col for col in df.columns}
-    
-    # Suche nach relevanten Spalten
-    for target, alternatives in key_columns.items():
-        for alt in [target] + alternatives:
-            for col in normalized_columns:
-                if alt in col:
-                    # Versuche, einen sinnvollen Wert zu finden
-                    values = df[normalized_columns[col]].unique()
-                    for val in values:
-                        if isinstance(val, str) and len(val) > 2 and val.lower() != 'nan':
-                            vehicle_info[target.capitalize()] = val
-                            break
-    
-    return vehicle_info
+    return _values_by_role(df, VEHICLE_KEY_ROLES, {})
 
 def extract_wheel_tire_info(df):
     """Extrahiert Rad/Reifen-Informationen aus DataFrame mit verbesserter Zuverlässigkeit"""
     wheel_tire_info = {}
     
-    # Erweiterte Erkennungsmuster für relevante Spalten
-    key_patterns = {
-        'Reifengröße': ['reifen', 'tire', 'dimension', 'größe', 'size', 'reifentyp'],
-        'Felgengröße': ['felge', 'rim', 'wheel', 'alufelge', 'räder', 'zoll'],
-        'Einpresstiefe': ['et', 'offset', 'einpress', 'einpresstiefe'],
-        'Hersteller': ['hersteller', 'manufacturer', 'producer', 'marke', 'brand'],
-        'Tragfähigkeit': ['load', 'traglast', 'tragfähigkeit', 'last', 'gewicht', 'kg'],
-        'Geschwindigkeitsindex': ['speed', 'geschwindigkeit', 'index', 'km/h', 'si']
-    }
-    
-    # Verbesserte Normalisierung von Spaltennamen
-    normalized_columns = {col.lower().strip().replace('-', '').replace('_', ''): col for col in df.columns}
-    
-    # Direkte Werterkennung durch Muster
-    patterns = {
-        'Reifengröße': r'(\d{3}/\d{2}[R]\d{2})', # z.B. 205/55R16
-        'Felgengröße': r'(\d{1,2}[,.]\d{1}[Jx]?\d{2})', # z.B. 7J16 oder 7,5x16
-        'Einpresstiefe': r'ET\s*(\d{1,2})', # z.B. ET35
-    }
-    
-    # Zuerst direkte Suche in den Werten aller Spalten
-    for key, pattern in patterns.items():
-        if key not in wheel_tire_info:
-            for col in df.columns:
-                for value in df[col].astype(str):
-                    match = re.search(pattern, value, re.IGNORECASE)
-                    if match:
-                        wheel_tire_info[key] = match.group(0)
-                        break
-                if key in wheel_tire_info:
+    # Zuerst direkte Suche in den Werten: ein kombinierter Regex-Durchlauf pro Spalte,
+    # Abbruch sobald alle Felder gefunden sind
+    missing = list(WHEEL_TIRE_VALUE_PATTERNS)
+    for col in df.columns:
+        if not missing:
+            break
+        buffer = CELL_SEPARATOR.join(df[col].astype(str).tolist())
+        pos = 0
+        while missing:
+            match = wheel_tire_value_pattern(tuple(missing)).search(buffer, pos)
+            if match is None:
+                break
+            for key in missing:
+                value = match.group(WHEEL_TIRE_GROUPS[key])
+                if value is not None:
+                    wheel_tire_info[key] = value
+                    missing.remove(key)
                     break
+            pos = match.start() + 1
     
-    # Dann Suche nach relevanten Spalten
-    for target, pats in key_patterns.items():
-        if target not in wheel_tire_info:  # Nur suchen wenn noch nicht gefunden
-            for pattern in pats:
-                for col in normalized_columns:
-                    if pattern in col:
-                        # Werte prüfen
-                        values = df[normalized_columns[col]].astype(str).unique()
-                        for val in values:
-                            if len(val) > 2 and val.lower() not in ['nan', '', 'none']:
-                                wheel_tire_info[target] = val
-                                break
-                        if target in wheel_tire_info:
-                            break
-                if target in wheel_tire_info:
-                    break
+    # Ergebnisse in der Reihenfolge der Muster (wie bei der Einzelsuche)
+    wheel_tire_info = {key: wheel_tire_info[key] for key in WHEEL_TIRE_VALUE_PATTERNS if key in wheel_tire_info}
+    
+    # Dann Suche nach relevanten Spalten (nur für noch nicht gefundene Angaben)
+    _values_by_role(df, WHEEL_TIRE_KEY_ROLES, wheel_tire_info)
     
     # Nachbearbeitung: Formatierung standardisieren
     if 'Einpresstiefe' in wheel_tire_info:
@@ -229,25 +378,31 @@ def extract_wheel_tire_info(df):
     
     return wheel_tire_info
 
+def join_cell_text(df, columns=None):
+    """Verbindet die String-Zellen (ausgewählter) Spalten zu einem zeilengetrennten Puffer"""
+    buffers = []
+    for i, col in enumerate(df.columns):
+        if columns is not None and col not in columns:
+            continue
+        series = df.iloc[:, i]
+        if isinstance(series.dtype, pd.StringDtype):
+            # String-Spalten: fehlende Werte überspringt str.cat selbst
+            buffers.append(series.str.cat(sep='\n'))
+        else:
+            buffers.append('\n'.join(value for value in series.tolist() if isinstance(value, str)))
+    return '\n'.join(buffers)
+
+def find_codes_in_columns(df, columns=None):
+    """Findet Auflagen-Codes in (ausgewählten) Spalten mit einem einzigen Regex-Durchlauf
+
+    Da CODE_PATTERN keine Zeilenumbrüche matcht, entstehen am Zelltrenner keine
+    zellübergreifenden Treffer.
+    """
+    return set(CODE_PATTERN.findall(join_cell_text(df, columns)))
+
 def find_condition_codes(df):
     """Findet Auflagen-Codes in einem DataFrame"""
-    codes = set()
-    code_pattern = re.compile(r"""
-        (?:
-            [A-Z][0-9]{1,3}[a-z]?|    # Bsp: A01, B123a
-            [0-9]{2,3}[A-Z]?|          # Bsp: 155, 12A
-            NoH|Lim                     # Spezielle Codes
-        )
-    """, re.VERBOSE)
-    
-    # Suche in allen String-Spalten
-    for col in df.columns:
-        for value in df[col]:
-            if isinstance(value, str):
-                matches = code_pattern.findall(value)
-                codes.update(matches)
-    
-    return list(codes)
+    return list(find_codes_in_columns(df))
 
 def analyze_freedom(codes, auflagen_db, vehicle_info, wheel_tire_info):
     """Analysiert, ob eine Rad/Reifenkombination eintragungsfrei ist"""
@@ -365,8 +520,8 @@ def extract_auflagen_with_text(pdf_path, app):
 
     try:
         with app.app_context():
-            from models import AuflagenCode
-            db_codes = {code.code: code.description for code in AuflagenCode.query.all()}
+            from code_store import code_cache
+            db_codes = code_cache.codes()
         
         with pdfplumber.open(pdf_path) as pdf:
             for page in pdf.pages:
@@ -436,34 +591,14 @@ def extract_auflagen_with_text(pdf_path, app):
     return codes_with_text
 
 def save_to_database(codes_with_text, app):
-    """Speichert oder aktualisiert Auflagen-Codes und Texte in der Datenbank"""
+    """Speichert oder aktualisiert Auflagen-Codes und Texte in der Datenbank (ein Bulk-Upsert)"""
     try:
         with app.app_context():
-            from models import AuflagenCode
-            for code, description in codes_with_text.items():
-                # Prüfe, ob der Code bereits existiert
-                existing_code = AuflagenCode.query.filter_by(code=code).first()
-                
-                if existing_code:
-                    # Aktualisiere nur, wenn der Text sich geändert hat
-                    if existing_code.description != description:
-                        existing_code.description = description
-                        print(f"Aktualisiere Code {code} in der Datenbank")
-                else:
-                    # Füge neuen Code hinzu
-                    new_code = AuflagenCode(code=code, description=description)
-                    from extensions import db
-                    db.session.add(new_code)
-                    print(f"Füge neuen Code {code} zur Datenbank hinzu")
-            
-            from extensions import db
-            db.session.commit()
+            from code_store import upsert_codes
+            upsert_codes(codes_with_text)
             print("Datenbank erfolgreich aktualisiert")
-            
     except Exception as e:
         print(f"Fehler beim Speichern in der Datenbank: {str(e)}")
-        from extensions import db
-        db.session.rollback()
 
 def extract_auflagen_codes(tables, app, request, logger):
     """Extrahiert Auflagen-Codes aus Tabellen und aktualisiert die Datenbank"""
@@ -525,27 +660,6 @@ def extract_auflagen_codes(tables, app, request, logger):
     for code, text in extracted_texts.items():
         logger.info(f"Code {code}: {text[:100]}...")  # Debug-Ausgabe
     
-    # Modifizierte Logik für das Speichern der Codes mit Texten
-    with app.app_context():
-        from models import AuflagenCode
-        existing_codes = set(code.code for code in AuflagenCode.query.all())
-        new_codes = codes - existing_codes
-        
-        for code in new_codes:
-            description = extracted_texts.get(code)  # Versuche zuerst den extrahierten Text
-            if not description:  # Falls nicht gefunden, verwende Standard-Text
-                description = AUFLAGEN_TEXTE.get(code, "Keine Beschreibung verfügbar")
-            
-            new_code = AuflagenCode(
-                code=code,
-                description=description
-            )
-            from extensions import db
-            db.session.add(new_code)
-        
-        from extensions import db
-        db.session.commit()
-
     # Kombiniere gefundene Codes mit ihren Texten
     codes_with_text = {}
     for code in codes:
@@ -0,0 +1,254 @@
+import io
+import re
+
+import numpy as np
+
+from column_roles import (
+    column_roles, VEHICLE_ROLES, TIRE_SIZE, RIM_SIZE, OFFSET, BOLT_PATTERN, CENTER_BORE, LOAD, POWER
+)
+
+# Eine Zeile je Fahrzeug/Reifen-Kombination; fehlende Zahlenwerte sind NaN
+SPEC_DTYPE = np.dtype([
+    ('table', np.int16),             # Tabellennummer (1-basiert wie in "<pdf_id>_table_<n>.csv")
+    ('row', np.int32),               # Zeilenindex in der Tabelle, -1 = nur Raddaten
+    ('vehicle', 'U64'),              # erste Zeile der Fahrzeugzelle
+    ('tire_width', np.float32),      # mm, 225/40R19 -> 225
+    ('aspect_ratio', np.float32),    # %, 225/40R19 -> 40
+    ('tire_diameter', np.float32),   # Zoll, 225/40R19 -> 19
+    ('load_index', np.float32),      # 95W -> 95
+    ('speed_index', 'U1'),           # 95W -> "W"
+    ('max_speed', np.float32),       # km/h laut Geschwindigkeitsindex
+    ('rim_width', np.float32),       # Zoll, 8,5x19 -> 8.5
+    ('rim_diameter', np.float32),    # Zoll, 8,5x19 -> 19
+    ('offset', np.float32),          # Einpresstiefe (mm)
+    ('bolt_count', np.float32),      # 5x112 -> 5
+    ('pcd', np.float32),             # Lochkreis (mm), 5x112 -> 112
+    ('center_bore', np.float32),     # Mittenloch (mm)
+    ('wheel_load', np.float32),      # Radlast (kg)
+    ('power_min', np.float32),       # kW-Bereich 88-195 -> 88
+    ('power_max', np.float32),       # kW-Bereich 88-195 -> 195
+])
+
+TIRE_PATTERN = re.compile(
+    r'(\d{3})\s*/\s*(\d{2})\s*Z?R\s*F?\s*(\d{2}(?:[,.]\d)?)'   # 225/40 ZR 19
+    r'(?:\s*C?\s*(\d{2,3})(?:/\d{2,3})?\s*([A-Y])\b)?',        # Lastindex/Geschwindigkeitsindex
+    re.IGNORECASE
+)
+RIM_PATTERN = re.compile(r'(\d{1,2}(?:[,.]\d{1,2})?)\s*[Jx]\s*(\d{2})\b', re.IGNORECASE)
+OFFSET_PATTERN = re.compile(r'\bET\s*(-?\d{1,3})', re.IGNORECASE)
+# "5x112", "5/112" und "5/112/66,6" (Lochzahl/Lochkreis/Mittenloch)
+BOLT_PATTERN_RE = re.compile(r'\b([3-8])\s*[x/]\s*(\d{3}(?:[,.]\d)?)(?:\s*/\s*(\d{2,3}(?:[,.]\d)?))?')
+NUMBER_PATTERN = re.compile(r'-?\d+(?:[,.]\d+)?')
+# Dateinamen wie "DM08-85x19-5x112-ET45-666.pdf" (Felgenbreite ohne Komma)
+FILENAME_RIM_PATTERN = re.compile(r'(?<![\dx])(\d{1,3})x(\d{2})(?!\d)', re.IGNORECASE)
+
+SPEED_INDEX_KMH = {
+    'L': 120, 'M': 130, 'N': 140, 'P': 150, 'Q': 160, 'R': 170, 'S': 180,
+    'T': 190, 'U': 200, 'H': 210, 'V': 240, 'W': 270, 'Y': 300,
+}
+
+# Felder, die für das ganze Rad gelten (aus der Radtabelle bzw. dem Dateinamen)
+WHEEL_FIELDS = ('rim_width', 'rim_diameter', 'offset', 'bolt_count', 'pcd', 'center_bore', 'wheel_load')
+
+
+def _number(text):
+    return float(text.replace(',', '.'))
+
+
+def parse_tire(text):
+    """Parst eine Reifengröße wie "225/40R19 95W" in Breite, Querschnitt, Durchmesser, Last- und Speed-Index"""
+    match = TIRE_PATTERN.search(str(text))
+    if not match:
+        return None
+    width, aspect, diameter, load_index, speed_index = match.groups()
+    speed_index = (speed_index or '').upper()
+    return {
+        'tire_width': float(width),
+        'aspect_ratio': float(aspect),
+        'tire_diameter': _number(diameter),
+        'load_index': float(load_index) if load_index else np.nan,
+        'speed_index': speed_index,
+        'max_speed': SPEED_INDEX_KMH.get(speed_index, np.nan),
+    }
+
+
+def parse_power(text):
+    """Parst einen kW-Bereich ("88-195", "66, 80") in (Minimum, Maximum)"""
+    values = [_number(value) for value in NUMBER_PATTERN.findall(str(text).replace('-', ' '))]
+    if not values:
+        return np.nan, np.nan
+    return min(values), max(values)
+
+
+def parse_wheel_text(text, wheel=None):
+    """Ergänzt wheel um Felgengröße, ET und Lochbild aus einem Freitext (fehlende Felder werden gefüllt)"""
+    wheel = {} if wheel is None else wheel
+    text = str(text)
+    match = RIM_PATTERN.search(text)
+    if match and 'rim_width' not in wheel:
+        wheel['rim_width'], wheel['rim_diameter'] = _number(match.group(1)), float(match.group(2))
+    match = OFFSET_PATTERN.search(text)
+    if match and 'offset' not in wheel:
+        wheel['offset'] = float(match.group(1))
+    match = BOLT_PATTERN_RE.search(text)
+    if match and 'bolt_count' not in wheel:
+        wheel['bolt_count'], wheel['pcd'] = float(match.group(1)), _number(match.group(2))
+        if match.group(3) and 'center_bore' not in wheel:
+            wheel['center_bore'] = _number(match.group(3))
+    return wheel
+
+
+def parse_filename(pdf_id, wheel=None):
+    """Felgengröße, Lochbild und ET aus einem Dateinamen wie "DM08-85x19-5x112-ET45-666" """
+    wheel = {} if wheel is None else wheel
+    name = str(pdf_id)
+    match = BOLT_PATTERN_RE.search(name.replace('-', ' '))
+    bolt_span = None
+    if match and 'bolt_count' not in wheel:
+        wheel['bolt_count'], wheel['pcd'] = float(match.group(1)), _number(match.group(2))
+        bolt_span = match.span()
+    for match in FILENAME_RIM_PATTERN.finditer(name.replace('-', ' ')):
+        if 'rim_width' in wheel or match.span() == bolt_span or len(match.group(1)) > 3:
+            continue
+        width = float(match.group(1))
+        # "85x19" steht für 8,5x19; Felgenbreiten liegen zwischen 4 und 13 Zoll
+        wheel['rim_width'] = width / 10 if width > 13 else width
+        wheel['rim_diameter'] = float(match.group(2))
+    match = OFFSET_PATTERN.search(name.replace('-', ' '))
+    if match and 'offset' not in wheel:
+        wheel['offset'] = float(match.group(1))
+    return wheel
+
+
+def _first_value(series):
+    for value in series:
+        if isinstance(value, str) and value.strip() and value.lower() not in ('nan', 'none'):
+            return value
+    return None
+
+
+def extract_wheel_data(tables):
+    """Raddaten (Felge, ET, Lochbild, Mittenloch, Radlast) aus den Tabellen mit passenden Spalten"""
+    wheel = {}
+    for _, df in tables:
+        roles = column_roles(df)
+        for col, col_roles in roles.items():
+            value = _first_value(df[col])
+            if value is None:
+                continue
+            if col_roles & {BOLT_PATTERN, CENTER_BORE} or RIM_SIZE in col_roles:
+                parse_wheel_text(value, wheel)
+            if OFFSET in col_roles and 'offset' not in wheel:
+                numbers = NUMBER_PATTERN.findall(value)
+                if numbers:
+                    wheel['offset'] = _number(numbers[0])
+            if LOAD in col_roles and 'wheel_load' not in wheel:
+                numbers = NUMBER_PATTERN.findall(value)
+                if numbers:
+                    wheel['wheel_load'] = _number(numbers[0])
+    return wheel
+
+
+def table_number(table_name, position=0):
+    """Tabellennummer aus "<pdf_id>_table_<n>.csv" (sonst Position + 1)"""
+    match = re.search(r'_table_(\d+)', str(table_name))
+    return int(match.group(1)) if match else position + 1
+
+
+def build_spec_array(pdf_id, tables):
+    """Typisiertes Spezifikations-Array einer PDF aus ihren Tabellen (Liste von (Name, DataFrame))
+
+    Reifengröße, kW-Bereich und Fahrzeug stammen aus der jeweiligen Zeile, die Raddaten
+    gelten für alle Zeilen und werden aus der Radtabelle bzw. dem Dateinamen ergänzt.
+    """
+    wheel = parse_filename(pdf_id, extract_wheel_data(tables))
+
+    records = []
+    for position, (table_name, df) in enumerate(tables):
+        roles = column_roles(df)
+        tire_cols = [col for col, col_roles in roles.items() if TIRE_SIZE in col_roles]
+        if not tire_cols:
+            continue
+        vehicle_cols = [col for col, col_roles in roles.items() if col_roles & VEHICLE_ROLES]
+        power_cols = [col for col, col_roles in roles.items() if POWER in col_roles]
+        table = table_number(table_name, position)
+        vehicle = ''
+        for row_idx, row in df.iterrows():
+            if vehicle_cols:
+                # Folgezeilen ohne Fahrzeug gehören zum vorherigen Fahrzeug
+                cell = str(row[vehicle_cols[0]]).strip()
+                if cell and cell.lower() != 'nan':
+                    vehicle = cell.split('\n')[0][:64]
+            tire = None
+            for col in tire_cols:
+                tire = parse_tire(row[col])
+                if tire:
+                    break
+            if tire is None:
+                continue
+            power_min, power_max = parse_power(row[power_cols[0]]) if power_cols else (np.nan, np.nan)
+            records.append((table, int(row_idx), vehicle, tire, power_min, power_max))
+
+    specs = np.zeros(max(len(records), 1), dtype=SPEC_DTYPE)
+    for name in SPEC_DTYPE.names:
+        if specs.dtype[name].kind == 'f':
+            specs[name] = np.nan
+    if not records:
+        # Nur Raddaten, z.B. wenn keine Fahrzeugtabelle erkannt wurde
+        if not wheel:
+            return specs[:0]
+        specs['row'] = -1
+    for i, (table, row_idx, vehicle, tire, power_min, power_max) in enumerate(records):
+        specs[i]['table'] = table
+        specs[i]['row'] = row_idx
+        specs[i]['vehicle'] = vehicle
+        for key, value in tire.items():
+            specs[i][key] = value
+        specs[i]['power_min'] = power_min
+        specs[i]['power_max'] = power_max
+    for key in WHEEL_FIELDS:
+        if key in wheel:
+            specs[key] = wheel[key]
+    return specs
+
+
+def specs_to_bytes(specs):
+    """Serialisiert das Array im .npy-Format (für die Spalte extracted_specs.data)"""
+    buffer = io.BytesIO()
+    np.save(buffer, specs, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def specs_from_bytes(data):
+    """Array aus specs_to_bytes(); None, wenn nichts gespeichert ist oder das Format veraltet ist"""
+    if not data:
+        return None
+    specs = np.load(io.BytesIO(data), allow_pickle=False)
+    return specs if specs.dtype == SPEC_DTYPE else None
+
+
+def filter_specs(specs, **ranges):
+    """Vektorisierter Filter, z.B. filter_specs(specs, offset=(35, 45), rim_diameter=(19, 19))
+
+    Jeder Bereich ist (Minimum, Maximum), None lässt eine Grenze offen; NaN erfüllt keinen Bereich.
+    """
+    mask = np.ones(len(specs), dtype=bool)
+    for field, (low, high) in ranges.items():
+        values = specs[field]
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    return specs[mask]
+
+
+def specs_to_records(specs):
+    """JSON-fähige Liste von Dicts (NaN wird zu None)"""
+    records = []
+    for item in specs.tolist():
+        records.append({
+            # float32 auf zwei Nachkommastellen runden (66.5999... -> 66.6)
+            name: (None if value != value else round(value, 2)) if isinstance(value, float) else value
+            for name, value in zip(SPEC_DTYPE.names, item)
+        })
+    return records
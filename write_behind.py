@@ -0,0 +1,294 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from extensions import db
+from models import AnalysisResult, ExtractionLog
+from code_store import write_codes, insert_with_conflict
+from document_store import write_document
+from wheel_specs import specs_to_bytes
+
+
+def configure_sqlite(engine, busy_timeout_ms=5000):
+    """WAL-Modus und Busy-Timeout für jede neue SQLite-Verbindung der Engine
+
+    WAL lässt Leser parallel zum Schreiber arbeiten; der Busy-Timeout lässt konkurrierende
+    Schreiber (andere Worker-Prozesse) warten, statt sofort "database is locked" zu melden.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        # Im WAL-Modus sicher und deutlich schneller als FULL
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    # Bereits offene Verbindungen im Pool verwenden sonst noch die alten Einstellungen
+    engine.dispose()
+    return True
+
+
+class WriteBehindQueue:
+    """Puffert Schreibzugriffe (Codes, Dokumente, Extraktions-Metadaten, Analyse-Ergebnisse) und schreibt sie gebündelt
+
+    Anfragen legen Aufträge nur in die Warteschlange; ein einzelner Schreib-Thread pro Prozess
+    fasst sie periodisch zu einer Transaktion zusammen. Mehrfach gemeldete Codes werden vor
+    dem Schreiben zusammengeführt (letzte Beschreibung gewinnt).
+    """
+    def __init__(self, app, logger=None, interval=0.5, max_batch=500, max_retries=5):
+        self.app = app
+        self.logger = logger
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._tables_ready = False
+        self.started_at = time.time()
+        self.counters = {
+            'enqueued': 0,
+            'written': 0,
+            'codes_written': 0,
+            'extractions_written': 0,
+            'documents_written': 0,
+            'analyses_written': 0,
+            'transactions': 0,
+            'retries': 0,
+            'errors': 0,
+            'dropped': 0,
+            'split_batches': 0,
+            'commit_ms_total': 0.0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+        }
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def _count(self, **increments):
+        with self.lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def start(self):
+        with self.lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+    def _put(self, kind, payload):
+        self.queue.put((kind, payload))
+        self._count(enqueued=1)
+        self.start()
+
+    def enqueue_codes(self, codes_with_text):
+        """Code-Upsert vormerken ({Code: Beschreibung})"""
+        if codes_with_text:
+            self._put('codes', dict(codes_with_text))
+
+    def enqueue_extraction(self, pdf_file, table_count, code_count=0, method=None, elapsed_ms=None, document_hash=None):
+        """Metadaten einer Extraktion vormerken"""
+        self._put('extraction', {
+            'pdf_file': pdf_file, 'table_count': table_count, 'code_count': code_count,
+            'method': method, 'elapsed_ms': elapsed_ms, 'document_hash': document_hash,
+        })
+
+    def enqueue_document(self, pdf_file, tables, codes, document_hash=None, specs=None):
+        """Tabellen, Zeilen, Codes und Rad/Reifen-Daten einer PDF vormerken
+
+        tables aus document_store.table_payload, specs ist das Spezifikations-Array oder None.
+        """
+        self._put('document', {
+            'pdf_file': pdf_file, 'tables': tables, 'codes': sorted(set(codes)), 'document_hash': document_hash,
+            'specs': None if specs is None else {'row_count': len(specs), 'data': specs_to_bytes(specs)},
+        })
+
+    def enqueue_analysis(self, key, pdf_file, result):
+        """Analyse-Ergebnis je (PDF-Hash, Version) vormerken; vorhandene Einträge bleiben bestehen"""
+        self._put('analysis', {
+            'document_hash': key[0], 'codes_version': key[1], 'pdf_file': pdf_file, 'result': json.dumps(result),
+        })
+
+    def barrier(self):
+        """Event, das gesetzt wird, sobald alle bisher eingereihten Aufträge geschrieben (oder verworfen) sind"""
+        done = threading.Event()
+        self.queue.put(('barrier', done))
+        self.start()
+        return done
+
+    def _drain(self):
+        """Wartet auf den ersten Auftrag und sammelt dann alles, was bis zum Intervallende eintrifft"""
+        try:
+            batch = [self.queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 and self.queue.empty():
+                break
+            try:
+                batch.append(self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while not (self._stopping.is_set() and self.queue.empty()):
+                batch = self._drain()
+                if batch:
+                    jobs = [job for job in batch if job[0] != 'barrier']
+                    if jobs:
+                        self._write(jobs)
+                        # Verbindung zwischen den Batches an den Pool zurückgeben
+                        db.session.remove()
+                    # Die Warteschlange ist FIFO: alles vor der Barriere ist jetzt geschrieben
+                    for kind, payload in batch:
+                        if kind == 'barrier':
+                            payload.set()
+                        self.queue.task_done()
+
+    def _ensure_tables(self):
+        # init_db() läuft nur beim direkten Start von app.py
+        if not self._tables_ready:
+            ExtractionLog.__table__.create(db.engine, checkfirst=True)
+            AnalysisResult.__table__.create(db.engine, checkfirst=True)
+            self._tables_ready = True
+
+    def _write(self, batch):
+        """Schreibt den Batch in einer Transaktion; schlägt sie fehl, wird jeder Auftrag einzeln versucht
+
+        So verwirft ein fehlerhafter Auftrag (z.B. ein Dokument mit ungültigen Daten) nicht die
+        übrigen des Batches; gezählt und protokolliert werden nur die tatsächlich fehlgeschlagenen.
+        """
+        error = self._commit(batch)
+        if error is None:
+            return
+        if isinstance(error, OperationalError) or len(batch) == 1:
+            # Datenbank trotz Wiederholungen gesperrt bzw. einzelner Auftrag ungültig
+            self._count(errors=1, dropped=len(batch))
+            kinds = ', '.join(sorted({kind for kind, _ in batch}))
+            self._log('error', f"Write-Behind: {len(batch)} Aufträge ({kinds}) verworfen: {error}")
+            return
+        self._count(split_batches=1)
+        self._log('warning', f"Write-Behind: Batch mit {len(batch)} Aufträgen fehlgeschlagen ({error}), schreibe einzeln")
+        for job in batch:
+            self._write([job])
+
+    def _commit(self, batch):
+        """Eine Transaktion für den ganzen Batch; liefert None oder die Ausnahme des letzten Versuchs"""
+        codes = {}
+        extractions = []
+        documents = {}
+        analyses = {}
+        for kind, payload in batch:
+            if kind == 'codes':
+                codes.update(payload)
+            elif kind == 'extraction':
+                extractions.append(payload)
+            elif kind == 'document':
+                # Mehrfach extrahierte PDF: nur der letzte Stand wird geschrieben
+                documents[payload['pdf_file']] = payload
+            else:
+                analyses[(payload['document_hash'], payload['codes_version'])] = payload
+
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                self._ensure_tables()
+                write_codes(codes)
+                for document in documents.values():
+                    write_document(**document)
+                if extractions:
+                    db.session.execute(ExtractionLog.__table__.insert(), extractions)
+                self._write_analyses(list(analyses.values()))
+                db.session.commit()
+            except OperationalError as e:
+                # "database is locked" trotz Busy-Timeout: mit Backoff erneut versuchen
+                db.session.rollback()
+                if attempt < self.max_retries:
+                    self._count(retries=1)
+                    time.sleep(min(0.1 * 2 ** attempt, 2.0))
+                    continue
+                return e
+            except Exception as e:
+                db.session.rollback()
+                return e
+            with self.lock:
+                self.counters['commit_ms_total'] += (time.perf_counter() - started) * 1000
+                self.counters['transactions'] += 1
+                self.counters['written'] += len(batch)
+                self.counters['codes_written'] += len(codes)
+                self.counters['extractions_written'] += len(extractions)
+                self.counters['documents_written'] += len(documents)
+                self.counters['analyses_written'] += len(analyses)
+                self.counters['last_batch_size'] = len(batch)
+                self.counters['max_batch_size'] = max(self.counters['max_batch_size'], len(batch))
+            return None
+
+    def _write_analyses(self, analyses):
+        if not analyses:
+            return
+        dialect_insert = insert_with_conflict(db.engine.dialect.name)
+        if dialect_insert is not None:
+            statement = dialect_insert(AnalysisResult.__table__).on_conflict_do_nothing(
+                index_elements=[AnalysisResult.document_hash, AnalysisResult.codes_version]
+            )
+            db.session.execute(statement, analyses)
+            return
+        for analysis in analyses:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(AnalysisResult(**analysis))
+            except IntegrityError:
+                # Ein anderer Prozess hat dasselbe Ergebnis bereits gespeichert
+                pass
+
+    def flush(self, timeout=None):
+        """Wartet, bis alle bisher eingereihten Aufträge geschrieben (oder verworfen) sind"""
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=10):
+        """Schreibt ausstehende Aufträge und beendet den Schreib-Thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Durchsatz-Zähler (Aufträge, Transaktionen, Batch-Größen, Commit-Zeiten)"""
+        with self.lock:
+            stats = dict(self.counters)
+        uptime = max(time.time() - self.started_at, 1e-9)
+        transactions = stats['transactions']
+        stats.update({
+            'queue_depth': self.queue.qsize(),
+            'avg_batch_size': round(stats['written'] / transactions, 2) if transactions else 0.0,
+            'avg_commit_ms': round(stats['commit_ms_total'] / transactions, 2) if transactions else 0.0,
+            'writes_per_second': round(stats['written'] / uptime, 2),
+            'uptime_s': round(uptime, 1),
+        })
+        stats['commit_ms_total'] = round(stats['commit_ms_total'], 2)
+        return stats